@@ -1,6 +1,6 @@
 """
 CHECK CV - Version Production
-Supporte jusqu'à 100 CV, Export PDF structuré selon le modèle officiel.
+Supporte des lots de CV de toute taille, Export PDF structuré selon le modèle officiel.
 """
 
 from dotenv import load_dotenv
@@ -13,6 +13,19 @@ import json
 from typing import List, Dict, Any
 import io
 from datetime import datetime
+from analysis_cache import AnalysisCache, make_analysis_key
+from batch_journal import make_batch_id, make_cv_key
+from batch_waves import DEFAULT_WAVE_SIZE, ResultSpool, preselect_in_waves
+from extraction_cache import ExtractionCache
+from mistral_client import RateLimitedClient
+from report_builder import ReportBuilder, make_report_key
+from cv_context import DEFAULT_TOKEN_BUDGET, build_cv_context
+from job_distillation import distill_job_offer, open_offer_cache
+from json_response import JSON_RESPONSE_FORMAT, decode_analysis, request_analysis
+from semantic_ranking import HashingEmbedder, MistralEmbedder
+from live_ranking import LiveRanking
+from text_extraction import extract_text as extract_text_from_bytes, extractor_version
+from token_ledger import TokenLedger, make_offer_id
 
 # Import pour la génération PDF (ReportLab)
 from reportlab.lib.pagesizes import A4
@@ -69,29 +82,74 @@ st.markdown("""
 
 # --- LOGIQUE MISTRAL ---
 
+MISTRAL_MODEL = "mistral-large-latest"
+TEMPERATURE = 0.2
+# À incrémenter à chaque modification du prompt pour invalider le cache d'analyses
+PROMPT_VERSION = "checkcv-pro2-3"
+# Nombre de candidats affichés dans le classement provisoire
+LIVE_RANKING_SIZE = 20
+
 @st.cache_resource
 def init_mistral():
     api_key = os.getenv("MISTRAL_API_KEY")
     if not api_key:
         st.error("Clé API Mistral manquante.")
         st.stop()
-    return MistralClient(api_key=api_key)
+    # Client partagé par toutes les sessions : un seul seau à jetons pour le quota de l'API
+    return RateLimitedClient(MistralClient(api_key=api_key))
+
+@st.cache_resource
+def init_analysis_cache():
+    return AnalysisCache()
+
+@st.cache_resource
+def init_offer_cache():
+    return open_offer_cache()
+
+@st.cache_resource
+def init_extraction_cache():
+    return ExtractionCache()
+
+@st.cache_resource
+def init_token_ledger():
+    return TokenLedger()
+
+@st.cache_resource
+def init_report_builder():
+    return ReportBuilder()
 
 def extract_text(file) -> str:
+    data = file.getvalue()
+    extraction_cache = init_extraction_cache()
+    version = extractor_version(file.type)
+    cached = extraction_cache.get(data, version)
+    if cached is not None:
+        return cached
     try:
-        if file.type == "application/pdf":
-            import PyPDF2
-            reader = PyPDF2.PdfReader(io.BytesIO(file.getvalue()))
-            return "\n".join([p.extract_text() for p in reader.pages if p.extract_text()])
-        elif file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            import docx
-            doc = docx.Document(io.BytesIO(file.getvalue()))
-            return "\n".join([p.text for p in doc.paragraphs])
-        return file.getvalue().decode("utf-8")
+        text = extract_text_from_bytes(data, file.type)
     except Exception:
         return ""
+    extraction_cache.put(data, version, text)
+    return text
 
-def analyze_cv(client, job_txt, cv_txt, name):
+def summarize_job(client, job_txt, ledger=None):
+    # Synthèse unique de l'offre en exigences compactes, réutilisée dans chaque prompt de CV
+    def complete(prompt):
+        from mistralai.models.chat_completion import ChatMessage
+        resp = client.chat(model=MISTRAL_MODEL, messages=[ChatMessage(role="user", content=prompt)], temperature=0,
+                           response_format=JSON_RESPONSE_FORMAT)
+        if ledger is not None:
+            ledger.record(MISTRAL_MODEL, resp, kind="synthese")
+        return resp.choices[0].message.content
+    return distill_job_offer(complete, job_txt, MISTRAL_MODEL, init_offer_cache())
+
+def analyze_cv(client, job_txt, cv_txt, name, cache=None, ledger=None):
+    cache_key = make_analysis_key(job_txt, cv_txt, MISTRAL_MODEL, PROMPT_VERSION, TEMPERATURE)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
     # Prompt optimisé pour la stabilité du JSON avec plusieurs CV
     prompt = f"""Tu es un expert RH. Analyse ce CV par rapport à l'offre d'emploi.
     Réponds EXCLUSIVEMENT en JSON valide.
@@ -102,20 +160,36 @@ def analyze_cv(client, job_txt, cv_txt, name):
       "points_amelioration": ["point 1", "point 2"],
       "recommandations": ["point 1", "point 2"]
     }}
-    Offre : {job_txt[:2000]}
-    CV ({name}) : {cv_txt[:4000]}"""
+    Exigences du poste : {job_txt}
+    CV ({name}) : {cv_txt}"""
     
-    try:
+    def complete(messages):
         from mistralai.models.chat_completion import ChatMessage
-        resp = client.chat(model="mistral-large-latest", messages=[ChatMessage(role="user", content=prompt)], temperature=0.2)
-        content = resp.choices[0].message.content
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].strip()
-        return json.loads(content)
-    except:
+        resp = client.chat(model=MISTRAL_MODEL, messages=[ChatMessage(**m) for m in messages], temperature=TEMPERATURE,
+                           response_format=JSON_RESPONSE_FORMAT)
+        # Tokens facturés enregistrés dans le registre de consommation partagé avec les autres apps
+        if ledger is not None:
+            ledger.record(MISTRAL_MODEL, resp)
+        return resp.choices[0].message.content
+    
+    repaired = False
+    
+    def parse(content):
+        nonlocal repaired
+        analysis, repaired = decode_analysis(content)
+        return analysis
+    
+    try:
+        # Réponse réparée localement si besoin ; une seule relance ciblée si elle est irréparable
+        result = request_analysis(complete, prompt, parse)
+    except Exception as e:
+        st.warning(f"Analyse impossible pour {name} : {e}")
         return None
+    
+    # Une analyse réparée (réponse tronquée) est utilisée, mais jamais mise en cache
+    if cache is not None and not repaired:
+        cache.put(cache_key, result)
+    return result
 
 # --- GÉNÉRATION DU RAPPORT PDF (MODÈLE OFFICIEL) ---
 
@@ -202,8 +276,18 @@ def format_item(item: Any) -> str:
 # --- APPLICATION ---
 
 def main():
-    st.markdown('<div class="professional-header"><h1>CHECK CV</h1><p>Analyse de Masse & Pipeline RAG (jusqu\'à 100 CV)</p></div>', unsafe_allow_html=True)
+    st.markdown('<div class="professional-header"><h1>CHECK CV</h1><p>Analyse de Masse & Pipeline RAG</p></div>', unsafe_allow_html=True)
     client = init_mistral()
+    analysis_cache = init_analysis_cache()
+    token_ledger = init_token_ledger()
+
+    with st.sidebar:
+        top_k = st.number_input("Pré-sélection RAG (top-K, 0 = tous)", min_value=0, max_value=1000, value=0, step=5)
+        use_mistral_embed = st.toggle("Embeddings Mistral (sinon local)", value=False)
+        token_budget = st.number_input("Budget de tokens par CV (0 = complet)", min_value=0, max_value=32000, value=DEFAULT_TOKEN_BUDGET, step=250)
+        cache_stats = st.empty()
+        cache_stats.caption(analysis_cache.summary())
+        st.caption(token_ledger.summary())
 
     c1, c2 = st.columns(2, gap="large")
     with c1:
@@ -211,29 +295,64 @@ def main():
         job_f = st.file_uploader("Upload Job", type=["pdf", "txt", "docx"], label_visibility="collapsed")
         st.markdown('</div>', unsafe_allow_html=True)
     with c2:
-        st.markdown('<div class="upload-card"><h3>👥 CV Candidats (Max 100)</h3>', unsafe_allow_html=True)
+        st.markdown('<div class="upload-card"><h3>👥 CV Candidats</h3>', unsafe_allow_html=True)
         cv_fs = st.file_uploader("Upload CVs", type=["pdf", "txt", "docx"], accept_multiple_files=True, label_visibility="collapsed")
-        if cv_fs and len(cv_fs) > 100:
-            st.warning("⚠️ Limite de 100 CV dépassée. Seuls les 100 premiers seront analysés.")
-            cv_fs = cv_fs[:100]
         st.markdown('</div>', unsafe_allow_html=True)
 
     if st.button("🚀 LANCER L'ANALYSE") and job_f and cv_fs:
         job_text = extract_text(job_f)
-        results = []
         bar = st.progress(0)
         status = st.empty()
         
-        for i, f in enumerate(cv_fs):
-            status.info(f"Analyse du candidat {i+1}/{len(cv_fs)} : {f.name}")
-            res = analyze_cv(client, job_text, extract_text(f), f.name)
+        # Tokens facturés de chaque appel (embeddings, synthèse, analyses), rattachés au lot et à l'offre
+        batch_usage = token_ledger.batch(
+            make_batch_id(job_text, [make_cv_key(f.getvalue()) for f in cv_fs], top_k, token_budget),
+            make_offer_id(job_text)
+        )
+        # Les textes ne sont pas gardés en mémoire : chaque CV est relu (cache d'extraction) au moment de son analyse
+        load = lambda f: (f.name, extract_text(f))
+        selected = list(cv_fs)
+        st.session_state['non_retenus'] = []
+        # Pré-sélection sémantique : seuls les top-K CV les plus proches de l'offre partent chez Mistral
+        if top_k and len(cv_fs) > top_k:
+            status.info(f"Pré-classement sémantique de {len(cv_fs)} CV...")
+            embedder = MistralEmbedder(client, ledger=batch_usage) if use_mistral_embed else HashingEmbedder()
+            try:
+                selected, rejected = preselect_in_waves(job_text, cv_fs, load, top_k, embedder, DEFAULT_WAVE_SIZE)
+            except Exception:
+                selected, rejected = preselect_in_waves(job_text, cv_fs, load, top_k, HashingEmbedder(), DEFAULT_WAVE_SIZE)
+            st.session_state['non_retenus'] = [f"{r['filename']} ({r['similarite']:.0f}%)" for r in rejected]
+        
+        status.info("Synthèse des exigences de l'offre...")
+        job_requirements = summarize_job(client, job_text, batch_usage)
+        
+        # Classement provisoire mis à jour à chaque candidat analysé
+        live_ranking = LiveRanking()
+        live_board = st.empty()
+        # Chaque résultat est écrit sur disque dès qu'il est disponible
+        spool = ResultSpool()
+        
+        for n, f in enumerate(selected):
+            status.info(f"Analyse du candidat {n+1}/{len(selected)} : {f.name}")
+            # Contexte CV borné : les blocs les plus pertinents pour l'offre, dans la limite du budget
+            cv_context = build_cv_context(extract_text(f), job_requirements, token_budget)
+            res = analyze_cv(client, job_requirements, cv_context, f.name, cache=analysis_cache, ledger=batch_usage)
             if res:
                 res['filename'] = f.name
-                results.append(res)
-            bar.progress((i + 1) / len(cv_fs))
+                spool.add(res, n)
+                live_ranking.add(res)
+                live_board.markdown("".join(f"""
+                <div class="result-card">
+                    <div style="display: flex; justify-content: space-between; align-items: center;">
+                        <div><b>#{rank + 1} {r['nom_complet']}</b> <small style="color:#666;">{r['filename']}</small></div>
+                        <div class="score-number">{r['score']}%</div>
+                    </div>
+                </div>""" for rank, r in enumerate(live_ranking.top(LIVE_RANKING_SIZE))), unsafe_allow_html=True)
+            bar.progress((n + 1) / len(selected))
         
-        status.success(f"Analyse terminée ! {len(results)} candidats traités.")
-        st.session_state['results'] = sorted(results, key=lambda x: x['score'], reverse=True)
+        spool.close()
+        status.success(f"Analyse terminée ! {len(spool)} candidats traités.")
+        st.session_state['results'] = spool.ranked()
         st.rerun()
 
     if 'results' in st.session_state:
@@ -243,13 +362,20 @@ def main():
         st.markdown('<div class="export-container">', unsafe_allow_html=True)
         col_ex1, col_ex2 = st.columns(2)
         with col_ex1:
-            pdf_report = generate_pdf_report(res_list)
+            # Rapport construit au clic seulement, puis mémoïsé pour ces résultats
+            report_builder = init_report_builder()
+            report_key = make_report_key(res_list)
+            pdf_report = lambda: report_builder.get(report_key, lambda: generate_pdf_report(res_list).getvalue())
             st.download_button("📥 Télécharger Rapport PDF (Modèle Officiel)", data=pdf_report, file_name=f"check_cv_rapport_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf", mime="application/pdf")
         with col_ex2:
             json_str = json.dumps(res_list, indent=2, ensure_ascii=False)
             st.download_button("📦 Exporter Données JSON", data=json_str, file_name="Analyse_Candidats.json", mime="application/json")
         st.markdown('</div>', unsafe_allow_html=True)
 
+        if st.session_state.get('non_retenus'):
+            with st.expander(f"{len(st.session_state['non_retenus'])} CV écartés par la pré-sélection RAG"):
+                st.write(", ".join(st.session_state['non_retenus']))
+
         # AFFICHAGE DES CARTES CANDIDATS
         for r in res_list:
             st.markdown(f"""
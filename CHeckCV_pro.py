@@ -10,17 +10,33 @@ import streamlit as st
 import os
 from mistralai import Mistral
 import json
-from typing import List, Dict
-import io
+from typing import Callable, List, Dict, Optional, Tuple
+import threading
 from datetime import datetime
-import time
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from analysis_cache import AnalysisCache
+from batch_journal import BatchJournal, load_keyed_wave, make_batch_id, make_cv_key
+from batch_waves import DEFAULT_WAVE_SIZE, iter_prefetched_waves, preselect_in_waves
+from extraction_cache import ExtractionCache
+from mistral_client import RateLimitedClient
+from parallel_extraction import ParallelExtractor
+from fast_screening import ScreeningProfile, screen_cvs
+from live_ranking import LiveRanking
+from cv_context import DEFAULT_TOKEN_BUDGET, build_cv_context
+from cv_pipeline import (DEFAULT_CASCADE_BAND, DEFAULT_CASCADE_THRESHOLD, MISTRAL_MODEL, PROMPT_VERSION,
+                         SCREENING_MODEL, CascadePolicy, analyze_cv, analyze_cvs_concurrently as run_analyses,
+                         build_result, distill_offer, estimate_batch_tokens, estimate_embedding_tokens)
+from job_distillation import open_offer_cache
+from pdf_report import write_pdf_report
+from pipeline_metrics import STAGES, PipelineMetrics
+from report_builder import ReportBuilder, make_report_key
+from semantic_ranking import HashingEmbedder, MistralEmbedder
+from talent_pool import TalentPool
+from text_extraction import extractor_version
+from top_k_ranking import DEFAULT_PRESCORE_MARGIN, TopKRanking, prescore_in_waves
+from token_ledger import (DEFAULT_BATCH_TOKEN_BUDGET, DEFAULT_DAILY_TOKEN_BUDGET, OVER_BUDGET_REDUCE,
+                          OVER_BUDGET_SCREENING, OVER_BUDGET_STOP, BatchUsage, TokenLedger, fit_batch_to_budget,
+                          make_offer_id)
 
 # Configuration de la page
 st.set_page_config(
@@ -413,6 +429,23 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+# Nombre de candidats affichés dans le classement provisoire
+LIVE_RANKING_SIZE = 20
+# Au-delà, le rapport PDF ne détaille par défaut que les premiers candidats
+PDF_DETAIL_LIMIT = 50
+
+# Modes d'analyse proposés dans la barre latérale
+MODE_AI = "🤖 Analyse IA (Mistral)"
+MODE_CASCADE = "🪜 Cascade (petit puis grand modèle)"
+MODE_SCREENING = "⚡ Criblage rapide (local)"
+
+# Conduites proposées pour un lot dont l'estimation dépasse le budget de tokens
+OVER_BUDGET_CHOICES = {
+    OVER_BUDGET_REDUCE: "Réduire le contexte des CV",
+    OVER_BUDGET_SCREENING: "Basculer en criblage local",
+    OVER_BUDGET_STOP: "Ne pas lancer le lot",
+}
+
 # Initialisation de Mistral AI
 @st.cache_resource
 def init_mistral():
@@ -421,190 +454,193 @@ def init_mistral():
     if not api_key:
         st.error("⚠️ Clé API Mistral non trouvée. Veuillez configurer MISTRAL_API_KEY dans le fichier .env")
         st.stop()
-    return Mistral(api_key=api_key)
+    # Client partagé par toutes les sessions : un seul seau à jetons pour le quota de l'API
+    return RateLimitedClient(Mistral(api_key=api_key))
+
+@st.cache_resource
+def init_analysis_cache():
+    """Ouvre le cache persistant des analyses"""
+    return AnalysisCache()
+
+@st.cache_resource
+def init_talent_pool():
+    """Ouvre le vivier de talents persistant (index vectoriel des CV déjà reçus)"""
+    return TalentPool()
+
+@st.cache_resource
+def init_token_ledger():
+    """Ouvre le registre persistant de consommation de tokens"""
+    return TokenLedger()
+
+@st.cache_resource
+def init_offer_cache():
+    """Ouvre le cache persistant des synthèses d'offres"""
+    return open_offer_cache()
 
-def extract_text_from_file(uploaded_file) -> str:
-    """Extrait le texte d'un fichier uploadé"""
+@st.cache_resource
+def init_extraction_cache():
+    """Ouvre le cache persistant des textes extraits"""
+    return ExtractionCache()
+
+@st.cache_resource
+def init_extractor():
+    """Pool de processus d'extraction des PDF et DOCX, partagé par toutes les sessions"""
+    return ParallelExtractor()
+
+@st.cache_resource
+def init_report_builder():
+    """Constructeur de rapports PDF partagé (mémoïsé par empreinte des résultats)"""
+    return ReportBuilder()
+
+def extract_text_from_file(uploaded_file, metrics: Optional[PipelineMetrics] = None) -> str:
+    """Extrait le texte d'un fichier uploadé (mis en cache par empreinte du contenu)"""
+    data = uploaded_file.getvalue()
+    extraction_cache = init_extraction_cache()
+    version = extractor_version(uploaded_file.type)
+    cached = extraction_cache.get(data, version)
+    if cached is not None:
+        # Texte arrivé en cache après le prefetch (autre session, autre processus) : extraction abandonnée
+        init_extractor().discard([(data, uploaded_file.type)])
+        return cached
+    
     try:
-        if uploaded_file.type == "text/plain":
-            return uploaded_file.getvalue().decode("utf-8")
-        elif uploaded_file.type == "application/pdf":
-            import PyPDF2
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(uploaded_file.getvalue()))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-            return text
-        elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            import docx
-            doc = docx.Document(io.BytesIO(uploaded_file.getvalue()))
-            return "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        else:
-            return uploaded_file.getvalue().decode("utf-8")
+        # Attend l'extraction lancée par prefetch_uploaded_cvs, ou la lance dans le pool
+        metrics = metrics if metrics is not None else PipelineMetrics()
+        with metrics.timer("extraction_ms", uploaded_file.name):
+            text = init_extractor().extract(data, uploaded_file.type)
     except Exception as e:
         st.error(f"Erreur lors de la lecture du fichier {uploaded_file.name}: {str(e)}")
         return ""
-
-def analyze_cv_with_mistral(client: Mistral, job_description: str, cv_content: str, cv_name: str) -> Dict:
-    """Analyse un CV avec Mistral AI"""
     
-    prompt = f"""Tu es un expert en recrutement. Analyse ce CV par rapport à l'offre d'emploi et réponds UNIQUEMENT avec un JSON valide (sans markdown, sans backticks).
+    extraction_cache.put(data, version, text)
+    return text
+
+def prefetch_uploaded_cvs(sources: List[Tuple[str, object]]) -> None:
+    """Lance en parallèle l'extraction des CV uploadés (couples empreinte, fichier) absents du cache"""
+    extraction_cache = init_extraction_cache()
+    extractor = init_extractor()
+    for _, uploaded_file in sources:
+        data = uploaded_file.getvalue()
+        if not extraction_cache.contains(data, extractor_version(uploaded_file.type)):
+            extractor.submit(data, uploaded_file.type)
 
-Offre d'emploi:
-{job_description}
+def discard_uploaded_cvs(sources: List[Tuple[str, object]]) -> None:
+    """Abandonne les extractions lancées pour des CV uploadés (couples empreinte, fichier) qui ne seront pas lus"""
+    init_extractor().discard((uploaded_file.getvalue(), uploaded_file.type) for _, uploaded_file in sources)
 
-CV du candidat ({cv_name}):
-{cv_content}
+def summarize_job_offer(client: Mistral, job_description: str, ledger: Optional[BatchUsage] = None) -> str:
+    """Synthétise l'offre en exigences compactes (un seul appel Mistral par offre, mis en cache)"""
+    return distill_offer(client, job_description, init_offer_cache(), ledger)
 
-Analyse le CV et fournis:
-1. Le NOM et PRÉNOM complet du candidat (extrait du CV)
-2. Un score de 0 à 100 représentant l'adéquation du candidat avec le poste
-3. 3 à 5 points forts du candidat
-4. 3 à 5 points à améliorer
-5. 3 à 5 recommandations concrètes pour améliorer le CV
+def report_analysis_error(cv_name: str, error: Exception) -> None:
+    """Affiche l'échec de l'analyse d'un CV"""
+    st.error(f"Erreur lors de l'analyse de {cv_name}: {str(error)}")
 
-Format de réponse (JSON strict, sans texte avant ou après):
-{{
-  "nom_complet": "Prénom NOM du candidat",
-  "score": <nombre entre 0 et 100>,
-  "points_forts": ["point1", "point2", "point3"],
-  "points_amelioration": ["point1", "point2", "point3"],
-  "recommandations": ["rec1", "rec2", "rec3"]
-}}"""
+def analyze_cv_with_mistral(client: Mistral, job_description: str, cv_content: str, cv_name: str,
+                            cache: Optional[AnalysisCache] = None, metrics: Optional[PipelineMetrics] = None,
+                            ledger: Optional[BatchUsage] = None) -> Dict:
+    """Analyse un CV avec Mistral AI (ou le renvoie depuis le cache)"""
+    return analyze_cv(client, job_description, cv_content, cv_name, cache, on_error=report_analysis_error,
+                      metrics=metrics, ledger=ledger)
 
+def analyze_cvs_concurrently(client: Mistral, job_description: str, cv_items: List[Tuple[str, str]],
+                             max_workers: int, on_done: Optional[Callable[[int, Optional[Dict], int], None]] = None,
+                             cache: Optional[AnalysisCache] = None,
+                             metrics: Optional[PipelineMetrics] = None,
+                             ledger: Optional[BatchUsage] = None,
+                             cascade: Optional[CascadePolicy] = None,
+                             should_dispatch: Optional[Callable[[int], bool]] = None) -> List[Optional[Dict]]:
+    """Analyse plusieurs CV en gardant au plus max_workers requêtes Mistral en vol.
+
+    cv_items est une liste de tuples (nom du fichier, contenu). Le résultat est
+    renvoyé dans l'ordre d'entrée ; on_done(index, analyse, nb_terminés) est appelé
+    dans le thread du script à chaque CV terminé. should_dispatch(index) peut arrêter
+    l'envoi des CV suivants (mode top-K).
+    """
+    # Les threads du pool héritent du contexte Streamlit pour que st.error reste affiché
+    ctx = get_script_run_ctx()
+    return run_analyses(client, job_description, cv_items, max_workers, on_done, cache,
+                        on_error=report_analysis_error,
+                        initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx), metrics=metrics,
+                        ledger=ledger, cascade=cascade, should_dispatch=should_dispatch)
+
+def load_uploaded_cv(cv_file, metrics: Optional[PipelineMetrics] = None) -> Optional[Tuple[str, str]]:
+    """Lit un CV uploadé : (nom du fichier, texte) ou None si aucun texte"""
+    cv_content = extract_text_from_file(cv_file, metrics)
+    return (cv_file.name, cv_content) if cv_content else None
+
+def preselect_cvs(client: Mistral, job_description: str, sources: List, load: Callable,
+                  top_k: int, backend: str, wave_size: int, on_wave: Optional[Callable] = None,
+                  prefetch: Optional[Callable] = None, ledger: Optional[BatchUsage] = None) -> Tuple[List, List[Dict]]:
+    """Pré-classe les CV par similarité sémantique avec l'offre, vague par vague.
+
+    Renvoie les top_k sources (du plus proche au moins proche de l'offre) et la liste
+    des CV écartés avec leur similarité en pourcentage. Les appels d'embeddings Mistral
+    sont inscrits dans ledger.
+    """
+    embedder = MistralEmbedder(client, ledger=ledger) if backend == "Mistral embed" else HashingEmbedder()
     try:
-        response = client.chat.complete(
-            model="mistral-large-latest",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            max_tokens=1500
-        )
-        
-        content = response.choices[0].message.content.strip()
-        if content.startswith("```json"):
-            content = content.replace("```json", "").replace("```", "").strip()
-        elif content.startswith("```"):
-            content = content.replace("```", "").strip()
-        
-        result = json.loads(content)
-        
-        return {
-            "nom_complet": result.get("nom_complet", "Nom non trouvé"),
-            "score": result.get("score", 0),
-            "points_forts": result.get("points_forts", []),
-            "points_amelioration": result.get("points_amelioration", []),
-            "recommandations": result.get("recommandations", [])
-        }
-        
-    except json.JSONDecodeError:
-        return {
-            "nom_complet": "Nom non trouvé",
-            "score": 50,
-            "points_forts": ["Profil intéressant"],
-            "points_amelioration": ["CV à approfondir"],
-            "recommandations": ["Détailler davantage les expériences"]
-        }
+        return preselect_in_waves(job_description, sources, load, top_k, embedder, wave_size, on_wave, prefetch)
     except Exception as e:
-        st.error(f"Erreur lors de l'analyse de {cv_name}: {str(e)}")
-        return None
-
-def generate_pdf_report(results: List[Dict], job_description: str) -> bytes:
-    """Génère un rapport PDF des résultats"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, 
-                           topMargin=2*cm, bottomMargin=2*cm)
-    
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Style personnalisé pour le titre
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#00b4db'),
-        spaceAfter=30,
-        alignment=1  # Centré
-    )
-    
-    # Style pour les en-têtes
-    header_style = ParagraphStyle(
-        'CustomHeader',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#0083b0'),
-        spaceAfter=12,
-        spaceBefore=12
-    )
-    
-    # Titre du rapport
-    story.append(Paragraph("🎯 CHECK CV - RAPPORT D'ANALYSE", title_style))
-    story.append(Paragraph(f"Date: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
-    story.append(Spacer(1, 0.5*cm))
-    
-    # Résumé
-    story.append(Paragraph("RÉSUMÉ DE L'ANALYSE", header_style))
-    summary_data = [
-        ['Nombre de candidats analysés:', str(len(results))],
-        ['Excellent (80%+):', str(sum(1 for r in results if r['score'] >= 80))],
-        ['Bon (60-79%):', str(sum(1 for r in results if 60 <= r['score'] < 80))],
-        ['Moyen (40-59%):', str(sum(1 for r in results if 40 <= r['score'] < 60))],
-        ['Faible (<40%):', str(sum(1 for r in results if r['score'] < 40))],
-    ]
-    
-    summary_table = Table(summary_data, colWidths=[12*cm, 4*cm])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f9ff')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#00b4db'))
-    ]))
-    
-    story.append(summary_table)
-    story.append(Spacer(1, 1*cm))
-    
-    # Détails des candidats
-    for idx, result in enumerate(results):
-        if idx > 0:
-            story.append(PageBreak())
-        
-        # Rang et nom
-        story.append(Paragraph(f"CANDIDAT #{idx + 1}", header_style))
-        story.append(Paragraph(f"<b>Nom:</b> {result['nom_complet']}", styles['Normal']))
-        story.append(Paragraph(f"<b>Fichier:</b> {result['filename']}", styles['Normal']))
-        story.append(Spacer(1, 0.3*cm))
-        
-        # Score
-        score_color = '#28a745' if result['score'] >= 80 else '#17a2b8' if result['score'] >= 60 else '#ffc107' if result['score'] >= 40 else '#dc3545'
-        score_text = f"<b>Score d'adéquation: <font color='{score_color}'>{result['score']}%</font></b>"
-        story.append(Paragraph(score_text, styles['Normal']))
-        story.append(Spacer(1, 0.5*cm))
-        
-        # Points forts
-        story.append(Paragraph("✅ <b>POINTS FORTS</b>", header_style))
-        for point in result['points_forts']:
-            story.append(Paragraph(f"• {point}", styles['Normal']))
-        story.append(Spacer(1, 0.3*cm))
-        
-        # Points à améliorer
-        story.append(Paragraph("⚠️ <b>POINTS À AMÉLIORER</b>", header_style))
-        for point in result['points_amelioration']:
-            story.append(Paragraph(f"• {point}", styles['Normal']))
-        story.append(Spacer(1, 0.3*cm))
-        
-        # Recommandations
-        story.append(Paragraph("💡 <b>RECOMMANDATIONS</b>", header_style))
-        for rec in result['recommandations']:
-            story.append(Paragraph(f"• {rec}", styles['Normal']))
-        story.append(Spacer(1, 0.5*cm))
-    
-    # Générer le PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer.getvalue()
+        st.warning(f"Embeddings Mistral indisponibles ({str(e)}), utilisation de l'embedder local")
+        return preselect_in_waves(job_description, sources, load, top_k, HashingEmbedder(), wave_size, on_wave,
+                                  prefetch)
+
+def render_live_ranking(ranking: List[Dict]) -> str:
+    """HTML du classement provisoire affiché pendant l'analyse"""
+    cards = []
+    for idx, result in enumerate(ranking):
+        top_strength = result['points_forts'][0] if result['points_forts'] else ""
+        cards.append(f"""
+        <div class="result-card" style="padding: 20px 30px; margin: 12px 0;">
+            <div class="result-header" style="margin-bottom: 10px; padding-bottom: 10px;">
+                <div class="candidate-info">
+                    <div class="rank-badge">#{idx + 1}</div>
+                    <div>
+                        <h3 class="candidate-name">{result['nom_complet']}</h3>
+                        <p class="candidate-file">📄 {result['filename']}</p>
+                    </div>
+                </div>
+                <div class="score-display">
+                    <div class="score-number">{result['score']}%</div>
+                    <div class="score-label">Adéquation</div>
+                </div>
+            </div>
+            <div>{get_score_badge(result['score'])} <span style="color: #555; margin-left: 10px;">✅ {top_strength}</span></div>
+        </div>
+        """)
+    return "".join(cards)
+
+def format_number(value: float) -> str:
+    """Nombre entier avec espaces entre les milliers (12 345)"""
+    return f"{value:,.0f}".replace(",", " ")
+
+def render_stage_metrics(metrics: PipelineMetrics) -> str:
+    """Tableau markdown des agrégats par étape (somme, p50, p95)"""
+    lines = ["| Étape | n | Somme | p50 | p95 |", "|---|---:|---:|---:|---:|"]
+    for stage, aggregate in metrics.summary().items():
+        lines.append(f"| {STAGES.get(stage, stage)} | {aggregate['n']} | {format_number(aggregate['somme'])} | "
+                     f"{format_number(aggregate['p50'])} | {format_number(aggregate['p95'])} |")
+    return "\n".join(lines)
+
+def render_token_usage(ledger: TokenLedger, job_description: Optional[str]) -> str:
+    """Tableau markdown de la consommation des derniers jours (et de l'offre courante)"""
+    lines = ["| Jour | Appels | Tokens | Coût ($) |", "|---|---:|---:|---:|"]
+    for day in ledger.by_day():
+        lines.append(f"| {day['jour']} | {day['appels']} | {format_number(day['tokens'])} | {day['cout']:.2f} |")
+    if job_description:
+        offer = ledger.totals(offer_id=make_offer_id(job_description))
+        lines.append(f"| **Offre actuelle** | {offer['appels']} | {format_number(offer['tokens'])} | {offer['cout']:.2f} |")
+    return "\n".join(lines)
+
+def render_tier(result: Dict) -> str:
+    """Mention du niveau d'analyse d'un résultat du mode cascade (vide sinon)"""
+    if 'niveau' not in result:
+        return ""
+    detail = f" • score rapide {result['score_rapide']}%" if 'score_rapide' in result else ""
+    if 'repli' in result:
+        detail += " • ↩️ repli sur l'analyse rapide"
+    return f" • 🪜 {result['niveau']} ({result['modele']}){detail}"
 
 def get_score_badge(score: int) -> str:
     """Retourne le badge HTML selon le score"""
@@ -627,6 +663,9 @@ def main():
     """, unsafe_allow_html=True)
     
     client = init_mistral()
+    analysis_cache = init_analysis_cache()
+    talent_pool = init_talent_pool()
+    token_ledger = init_token_ledger()
     
     # Sidebar professionnel
     with st.sidebar:
@@ -645,6 +684,118 @@ def main():
         st.markdown("---")
         st.markdown("### ⚙️ CONFIGURATION")
         st.success("✓ API Mistral connectée")
+        analysis_mode = st.radio(
+            "Mode d'analyse",
+            [MODE_AI, MODE_CASCADE, MODE_SCREENING],
+            help="Cascade : un petit modèle note chaque CV, seuls les meilleurs et les cas limites sont repris "
+                 "par le grand modèle • Criblage rapide : notation locale (compétences de l'offre), sans appel Mistral"
+        )
+        cascade_policy = None
+        if analysis_mode == MODE_CASCADE:
+            cascade_threshold = st.slider(
+                "Seuil d'approfondissement",
+                min_value=0,
+                max_value=100,
+                value=DEFAULT_CASCADE_THRESHOLD,
+                help=f"Les CV notés au moins à ce score par {SCREENING_MODEL} sont repris par {MISTRAL_MODEL}"
+            )
+            cascade_band = st.slider(
+                "Zone limite (points sous le seuil)",
+                min_value=0,
+                max_value=50,
+                value=DEFAULT_CASCADE_BAND,
+                help="Les CV juste sous le seuil sont aussi repris, la note du petit modèle pouvant varier"
+            )
+            cascade_policy = CascadePolicy(cascade_threshold, cascade_band)
+        max_workers = st.slider(
+            "Requêtes Mistral simultanées",
+            min_value=1,
+            max_value=16,
+            value=4,
+            help="Nombre d'analyses envoyées en parallèle à Mistral"
+        )
+        top_k = st.number_input(
+            "Pré-sélection sémantique (top-K)",
+            min_value=0,
+            max_value=1000,
+            value=0,
+            step=5,
+            help="Seuls les K CV les plus proches de l'offre sont analysés par Mistral (0 = tous)"
+        )
+        best_k = st.number_input(
+            "Meilleurs candidats recherchés (top-K, arrêt anticipé)",
+            min_value=0,
+            max_value=1000,
+            value=0,
+            step=5,
+            help="Les CV sont analysés par pré-score local décroissant ; l'analyse s'arrête dès qu'aucun CV "
+                 "restant ne peut entrer dans les K meilleurs (0 = tous les CV sont analysés)"
+        )
+        prescore_margin = DEFAULT_PRESCORE_MARGIN
+        if best_k:
+            prescore_margin = st.slider(
+                "Marge du pré-score",
+                min_value=0,
+                max_value=100,
+                value=DEFAULT_PRESCORE_MARGIN,
+                help="Points ajoutés au pré-score local pour borner le score Mistral d'un CV : "
+                     "plus la marge est grande, plus l'arrêt est prudent (100 = aucun arrêt)"
+            )
+        embedding_backend = st.selectbox(
+            "Embeddings",
+            ["Local (hachage)", "Mistral embed"],
+            help="Local : hors-ligne et gratuit • Mistral embed : plus précis, via l'API"
+        )
+        pool_k = st.number_input(
+            "Candidats du vivier à analyser",
+            min_value=1,
+            max_value=500,
+            value=20,
+            help="Nombre de CV de l'historique, les plus proches de l'offre, analysés par Mistral"
+        )
+        wave_size = st.number_input(
+            "CV par vague",
+            min_value=1,
+            max_value=500,
+            value=DEFAULT_WAVE_SIZE,
+            step=5,
+            help="Les CV sont lus, analysés puis libérés par vagues : la mémoire utilisée dépend de cette taille, pas du nombre de CV"
+        )
+        token_budget = st.number_input(
+            "Budget de tokens par CV",
+            min_value=0,
+            max_value=32000,
+            value=DEFAULT_TOKEN_BUDGET,
+            step=250,
+            help="Les passages du CV les plus pertinents pour l'offre sont conservés dans cette limite (0 = CV complet)"
+        )
+        batch_token_budget = st.number_input(
+            "Budget de tokens par lot (0 = illimité)",
+            min_value=0,
+            value=DEFAULT_BATCH_TOKEN_BUDGET,
+            step=10000,
+            help="Estimé localement avant le lancement : un lot plus coûteux n'est pas envoyé tel quel à Mistral"
+        )
+        daily_token_budget = st.number_input(
+            "Budget quotidien de tokens (0 = illimité)",
+            min_value=0,
+            value=DEFAULT_DAILY_TOKEN_BUDGET,
+            step=100000,
+            help="Tokens déjà consommés aujourd'hui (registre local) déduits du budget"
+        )
+        over_budget_policy = st.selectbox(
+            "Lot hors budget",
+            list(OVER_BUDGET_CHOICES),
+            format_func=OVER_BUDGET_CHOICES.get,
+            help="Réduire : le contexte de chaque CV est raccourci pour tenir dans le budget"
+        )
+        cache_stats = st.empty()
+        cache_stats.caption(analysis_cache.summary())
+        ledger_stats = st.empty()
+        ledger_stats.caption(token_ledger.summary())
+        with st.expander("🪙 Consommation de tokens"):
+            st.markdown(render_token_usage(token_ledger, st.session_state.get('job_description')))
+        st.caption(f"🗂️ Vivier de talents : {len(talent_pool)} CV")
         
         if 'results' in st.session_state and st.session_state.results:
             st.markdown("---")
@@ -670,6 +821,10 @@ def main():
             with col2:
                 st.metric("Bon", bon, delta=None)
                 st.metric("Faible", faible, delta=None)
+            
+            if st.session_state.get('mesures'):
+                with st.expander("⏱️ Mesures par étape"):
+                    st.markdown(render_stage_metrics(st.session_state.mesures))
     
     # Main content area
     col1, col2 = st.columns(2, gap="large")
@@ -717,18 +872,16 @@ def main():
         """, unsafe_allow_html=True)
         
         cv_files = st.file_uploader(
-            "Charger les CV (max 100)",
+            "Charger les CV",
             type=["txt", "pdf", "docx"],
             accept_multiple_files=True,
             key="cv_upload",
             label_visibility="collapsed"
         )
         
+        # Seul le nombre de CV est conservé : les fichiers restent dans l'uploader
+        st.session_state['cv_count'] = len(cv_files) if cv_files else 0
         if cv_files:
-            if len(cv_files) > 100:
-                st.error("⚠️ Maximum 100 CV autorisés")
-                cv_files = cv_files[:100]
-            st.session_state['cv_files'] = cv_files
             st.markdown(f"""
             <div class="success-box">
                 <div style='display: flex; align-items: center;'>
@@ -750,47 +903,189 @@ def main():
         analyze_button = st.button(
             "🚀 LANCER L'ANALYSE",
             use_container_width=True,
-            disabled=not (st.session_state.get('job_description') and st.session_state.get('cv_files'))
+            disabled=not (st.session_state.get('job_description') and st.session_state.get('cv_count'))
+        )
+        pool_button = st.button(
+            f"🗂️ CHERCHER DANS LE VIVIER ({len(talent_pool)} CV)",
+            use_container_width=True,
+            disabled=not (st.session_state.get('job_description') and len(talent_pool))
         )
     
     # Analysis process
-    if analyze_button:
+    if analyze_button or pool_button:
         job_description = st.session_state.get('job_description')
-        cv_files = st.session_state.get('cv_files')
         
         st.markdown("---")
         st.markdown("### 🔄 ANALYSE EN COURS...")
         
-        results = []
         progress_bar = st.progress(0)
         status_container = st.empty()
         
-        for idx, cv_file in enumerate(cv_files):
-            status_container.markdown(f"""
-            <div style='background: white; padding: 20px; border-radius: 15px; text-align: center; box-shadow: 0 5px 15px rgba(0,0,0,0.1);'>
-                <h4 style='color: #00b4db; margin: 0;'>Analyse de {cv_file.name}</h4>
-                <p style='color: #888; margin: 10px 0 0 0;'>Candidat {idx + 1} sur {len(cv_files)}</p>
-            </div>
-            """, unsafe_allow_html=True)
+        rejected = []
+        not_evaluated = []
+        # Durées et volumes de chaque étape, par CV (barre latérale et export JSON)
+        metrics = PipelineMetrics()
+        st.session_state['mesures'] = metrics
+        # Les CV uploadés sont ajoutés au vivier au moment de leur lecture (une seule fois)
+        pool_pending = not pool_button
+        if pool_button:
+            # Les CV du vivier sont déjà extraits : une seule requête top-K sur tout l'historique
+            status_container.info(f"🔎 Recherche dans le vivier de {len(talent_pool)} CV...")
+            matches = talent_pool.search(job_description, pool_k)
+            sources = [(make_cv_key(match['text'].encode("utf-8")), (match['filename'], match['text'])) for match in matches]
+            load = lambda item: item
+            prefetch = None
+        else:
+            # Les CV sont lus vague par vague au moment de leur analyse ; seule leur empreinte est calculée ici
+            sources = [(make_cv_key(cv_file.getvalue()), cv_file) for cv_file in cv_files or []]
+            load = lambda cv_file: load_uploaded_cv(cv_file, metrics)
+            # L'extraction de la vague suivante tourne dans le pool de processus pendant l'analyse de la vague courante
+            prefetch = prefetch_uploaded_cvs
+        
+        # Budget : le lot est estimé localement (contexte des CV borné par le budget par CV), avant tout appel ;
+        # la pré-sélection par embeddings Mistral y est comptée, en mode criblage comme en mode IA
+        preselect_with_mistral = (embedding_backend == "Mistral embed" and not pool_button and top_k
+                                  and len(sources) > top_k)
+        analyses = analysis_mode != MODE_SCREENING
+        if sources and (analyses or preselect_with_mistral):
+            cv_count = min(len(sources), top_k) if top_k and not pool_button else len(sources)
+            embedding_tokens = estimate_embedding_tokens(job_description, len(sources)) if preselect_with_mistral else 0
+            # En cascade, chaque CV peut coûter deux analyses (petit puis grand modèle)
+            calls_per_cv = 2 if cascade_policy else 1
+            estimate = lambda budget: embedding_tokens + (
+                estimate_batch_tokens(job_description, cv_count, budget, calls_per_cv) if analyses else 0)
+            decision, fitted_budget = fit_batch_to_budget(
+                estimate, token_budget, token_ledger.allowance(batch_token_budget, daily_token_budget),
+                over_budget_policy
+            )
+            if decision == OVER_BUDGET_STOP:
+                status_container.error(f"⛔ Lot non lancé : environ {format_number(estimate(token_budget))} tokens "
+                                       f"estimés, au-delà du budget")
+                st.stop()
+            elif decision == OVER_BUDGET_SCREENING:
+                st.warning(f"🪙 Budget dépassé (≈ {format_number(estimate(token_budget))} tokens) : "
+                           f"criblage local sans appel Mistral")
+                analysis_mode = MODE_SCREENING
+                embedding_backend = "Local (hachage)"
+                cascade_policy = None
+            elif decision == OVER_BUDGET_REDUCE:
+                st.warning(f"🪙 Budget dépassé : contexte réduit à {fitted_budget} tokens par CV "
+                           f"(≈ {format_number(estimate(fitted_budget))} tokens pour le lot)")
+                token_budget = fitted_budget
+        
+        # Journal du lot : relancer le même lot (même offre, mêmes CV, mêmes réglages) reprend là où il s'est arrêté
+        journal = BatchJournal(make_batch_id(
+            job_description, [key for key, _ in sources], analysis_mode, MISTRAL_MODEL, PROMPT_VERSION,
+            token_budget, top_k, embedding_backend, pool_k if pool_button else None,
+            cascade_policy.settings() if cascade_policy else None
+        ))
+        # Tokens facturés de chaque appel, rattachés au lot et à l'offre
+        batch_usage = token_ledger.batch(journal.batch_id, make_offer_id(job_description))
+        st.session_state['consommation'] = batch_usage
+        
+        # Pré-classement sémantique : seuls les top-K CV partent à l'analyse Mistral
+        if not pool_button and top_k and len(sources) > top_k:
+            status_container.info(f"🔎 Pré-classement sémantique de {len(sources)} CV...")
+            sources, rejected = preselect_cvs(client, job_description, sources, lambda pair: load(pair[1]), top_k,
+                                              embedding_backend, wave_size, on_wave=talent_pool.add, prefetch=prefetch,
+                                              ledger=batch_usage)
+            pool_pending = False
+        st.session_state['non_retenus'] = rejected
+        
+        # Classement provisoire : chaque candidat apparaît à sa place dès que son analyse est terminée
+        live_ranking = LiveRanking()
+        live_container = st.empty()
+        for result in journal.results():
+            live_ranking.add(result)
+        pending = [(key, source) for key, source in sources if key not in journal]
+        # Position de chaque CV dans l'entrée : départage les scores égaux dans le classement final
+        positions = {key: position for position, (key, _) in enumerate(sources)}
+        done_before = len(sources) - len(pending)
+        if done_before:
+            st.info(f"♻️ Reprise du lot : {done_before} CV déjà analysés sur {len(sources)}")
+            live_container.markdown(render_live_ranking(live_ranking.top(LIVE_RANKING_SIZE)), unsafe_allow_html=True)
+        
+        # Mode top-K : les CV partent à l'analyse par pré-score local décroissant, jusqu'à l'arrêt anticipé
+        ranking = None
+        if best_k and analysis_mode != MODE_SCREENING and pending:
+            status_container.info(f"🏁 Pré-notation locale de {len(pending)} CV...")
+            pending, prescores = prescore_in_waves(job_description, pending, load, wave_size,
+                                                   on_wave=talent_pool.add if pool_pending else None,
+                                                   prefetch=prefetch)
+            pool_pending = False
+            ranking = TopKRanking(best_k, prescores, prescore_margin)
+            for result in journal.results():
+                ranking.add(result['score'])
+        
+        if analysis_mode == MODE_SCREENING:
+            profile = ScreeningProfile(job_description)
+        elif pending:
+            # L'offre est synthétisée une seule fois ; chaque prompt de CV ne porte que sa forme compacte
+            status_container.info("📝 Synthèse des exigences de l'offre...")
+            job_requirements = summarize_job_offer(client, job_description, batch_usage)
+        
+        for wave in iter_prefetched_waves(pending, wave_size, prefetch):
+            if ranking is not None and not ranking.can_enter(wave[0][0]):
+                # Aucun CV restant ne peut entrer dans le top K : les vagues suivantes ne sont pas lues
+                break
+            cv_keys, cv_items = load_keyed_wave(wave, load)
+            if pool_pending:
+                talent_pool.add(cv_items)
             
-            cv_content = extract_text_from_file(cv_file)
-            if cv_content:
-                analysis = analyze_cv_with_mistral(client, job_description, cv_content, cv_file.name)
+            def on_cv_done(idx, analysis, done, sync=True):
                 if analysis:
-                    results.append({
-                        'filename': cv_file.name,
-                        'nom_complet': analysis['nom_complet'],
-                        'score': analysis['score'],
-                        'points_forts': analysis['points_forts'],
-                        'points_amelioration': analysis['points_amelioration'],
-                        'recommandations': analysis['recommandations']
-                    })
+                    if ranking is not None:
+                        ranking.add(analysis['score'])
+                    result = build_result(cv_items[idx][0], analysis)
+                    if 'repli' in analysis:
+                        st.warning(f"↩️ {cv_items[idx][0]} : {analysis['repli']}, analyse rapide gardée")
+                    # Le résultat est sur disque avant d'être affiché
+                    journal.record(cv_keys[idx], result, positions[cv_keys[idx]], sync=sync)
+                    live_ranking.add(result)
+                    live_container.markdown(render_live_ranking(live_ranking.top(LIVE_RANKING_SIZE)),
+                                            unsafe_allow_html=True)
+                status_container.markdown(f"""
+                <div style='background: white; padding: 20px; border-radius: 15px; text-align: center; box-shadow: 0 5px 15px rgba(0,0,0,0.1);'>
+                    <h4 style='color: #00b4db; margin: 0;'>Analyse de {cv_items[idx][0]} terminée</h4>
+                    <p style='color: #888; margin: 10px 0 0 0;'>Candidat {done_before + done} sur {len(sources)}</p>
+                </div>
+                """, unsafe_allow_html=True)
+                progress_bar.progress(min(1.0, (done_before + done) / len(sources)))
             
-            progress_bar.progress((idx + 1) / len(cv_files))
-            time.sleep(0.1)
+            if analysis_mode == MODE_SCREENING:
+                # Criblage local : aucune requête Mistral, une seule synchronisation du journal par vague
+                for idx, analysis in enumerate(screen_cvs(job_description, cv_items, profile)):
+                    on_cv_done(idx, analysis, idx + 1, sync=False)
+                journal.sync()
+            else:
+                # Contexte CV borné : les blocs les plus pertinents pour l'offre, dans la limite du budget
+                cv_items = [(name, build_cv_context(content, job_requirements, token_budget)) for name, content in cv_items]
+                analyze_cvs_concurrently(client, job_requirements, cv_items, max_workers, on_cv_done,
+                                         cache=analysis_cache, metrics=metrics, ledger=batch_usage,
+                                         cascade=cascade_policy,
+                                         should_dispatch=(lambda idx: ranking.should_dispatch(cv_keys[idx]))
+                                         if ranking is not None else None)
+                cache_stats.caption(analysis_cache.summary())
+                ledger_stats.caption(token_ledger.summary())
+            # Les textes de la vague sont libérés avant de lire la suivante
+            done_before += len(wave)
+            del cv_items
         
-        results.sort(key=lambda x: x['score'], reverse=True)
+        journal.close()
+        if ranking is not None:
+            if prefetch is not None:
+                # Arrêt anticipé : la vague en cours et la suivante ont pu être lancées par prefetch sans être lues
+                discard_uploaded_cvs(ranking.skipped(pending)[:2 * wave_size])
+            not_evaluated = ranking.not_evaluated([key for key, _ in pending])
+            if not_evaluated:
+                st.info(f"🏁 Top {best_k} atteint : {len(not_evaluated)} CV non évalués "
+                        f"(score envisageable ≤ {ranking.threshold()}%)")
+        st.session_state['non_evalues'] = not_evaluated
+        progress_bar.progress(1.0)
+        results = journal.ranked()
         st.session_state['results'] = results
+        # Les cartes détaillées ci-dessous remplacent le classement provisoire
+        live_container.empty()
         
         status_container.success("✅ Analyse terminée avec succès!")
         st.balloons()
@@ -814,7 +1109,7 @@ def main():
                         <div class="rank-badge">#{idx + 1}</div>
                         <div>
                             <h3 class="candidate-name">{result['nom_complet']}</h3>
-                            <p class="candidate-file">📄 {result['filename']}</p>
+                            <p class="candidate-file">📄 {result['filename']}{render_tier(result)}</p>
                         </div>
                     </div>
                     <div class="score-display">
@@ -860,6 +1155,17 @@ def main():
                     st.markdown(f'<li><span class="bullet" style="color: #17a2b8;">●</span> {rec}</li>', unsafe_allow_html=True)
                 st.markdown("</ul></div>", unsafe_allow_html=True)
         
+        if st.session_state.get('non_retenus'):
+            with st.expander(f"📭 {len(st.session_state.non_retenus)} CV non retenus par le pré-classement sémantique"):
+                for cv in st.session_state.non_retenus:
+                    st.markdown(f"- {cv['filename']} • similarité {cv['similarite']}%")
+        
+        if st.session_state.get('non_evalues'):
+            with st.expander(f"🏁 {len(st.session_state.non_evalues)} CV non évalués (top-K atteint)"):
+                for cv in st.session_state.non_evalues:
+                    st.markdown(f"- {cv['filename']} • pré-score {cv['score_local']}% "
+                                f"• au mieux {cv['score_max']}%")
+        
         # Export buttons
         st.markdown("<br><br>", unsafe_allow_html=True)
         col1, col2 = st.columns(2, gap="medium")
@@ -868,8 +1174,16 @@ def main():
             export_data = {
                 "date_analyse": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 "nombre_candidats": len(st.session_state.results),
-                "resultats": st.session_state.results
+                "resultats": st.session_state.results,
+                "non_evalues": st.session_state.get('non_evalues', []),
+                "mesures": st.session_state.get('mesures', PipelineMetrics()).to_dict()
             }
+            if st.session_state.get('consommation'):
+                batch_usage = st.session_state.consommation
+                export_data["consommation"] = {
+                    "lot": batch_usage.totals(),
+                    "offre": token_ledger.totals(offer_id=batch_usage.offer_id)
+                }
             st.download_button(
                 label="📥 EXPORTER EN JSON",
                 data=json.dumps(export_data, indent=2, ensure_ascii=False),
@@ -879,10 +1193,28 @@ def main():
             )
         
         with col2:
-            pdf_data = generate_pdf_report(st.session_state.results, st.session_state.get('job_description', ''))
+            # Le PDF n'est construit qu'au clic, une seule fois pour ces résultats, cette offre et cette variante
+            report_builder = init_report_builder()
+            results = st.session_state.results
+            job_description = st.session_state.get('job_description', '')
+            detail_limit = st.number_input(
+                "Candidats détaillés dans le PDF (0 = tous)",
+                min_value=0,
+                value=PDF_DETAIL_LIMIT if len(results) > PDF_DETAIL_LIMIT else 0,
+                help="Au-delà, le rapport ne contient que le classement compact (rapport plus léger et plus rapide)"
+            ) or None
+            report_key = make_report_key(results, job_description, f"top-{detail_limit or 'tous'}")
+            report_path = report_builder.report_path(report_key)
+            report_metrics = st.session_state.setdefault('mesures', PipelineMetrics())
+            
+            def render_report():
+                with report_metrics.timer("rendu_ms"):
+                    return write_pdf_report(results, job_description, report_path, detail_limit)
+            
             st.download_button(
                 label="📄 EXPORTER EN PDF",
-                data=pdf_data,
+                data=lambda: report_builder.read(report_key, render_report),
+                help="Rapport prêt" if report_builder.is_ready(report_key) else "Le rapport est généré au premier clic",
                 file_name=f"heck_cv_rapport_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
                 mime="application/pdf",
                 use_container_width=True
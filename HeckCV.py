@@ -9,9 +9,18 @@ import streamlit as st
 import os
 from mistralai import Mistral
 import json
-from typing import List, Dict
-import io
+from typing import Dict, Optional
 from datetime import datetime
+from analysis_cache import AnalysisCache
+from batch_journal import make_batch_id, make_cv_key
+from batch_waves import DEFAULT_WAVE_SIZE, ResultSpool, iter_waves, load_wave
+from extraction_cache import ExtractionCache
+from mistral_client import LoopAsyncHttpClient, RateLimitedClient
+from cv_context import DEFAULT_TOKEN_BUDGET, build_cv_context
+from cv_pipeline import analyze_cvs_async, distill_offer
+from job_distillation import open_offer_cache
+from text_extraction import extract_text, extractor_version
+from token_ledger import BatchUsage, TokenLedger, make_offer_id
 
 # Configuration de la page
 st.set_page_config(
@@ -76,99 +85,61 @@ def init_mistral():
     if not api_key:
         st.error("⚠️ Clé API Mistral non trouvée. Veuillez configurer MISTRAL_API_KEY dans le fichier .env")
         st.stop()
-    return Mistral(api_key=api_key)
+    # Client partagé par toutes les sessions : un seul seau à jetons pour le quota de l'API
+    # Analyses asynchrones : une boucle asyncio par vague, d'où un client HTTP asynchrone par boucle
+    return RateLimitedClient(Mistral(api_key=api_key, async_client=LoopAsyncHttpClient()))
+
+@st.cache_resource
+def init_analysis_cache():
+    """Ouvre le cache persistant des analyses"""
+    return AnalysisCache()
+
+@st.cache_resource
+def init_offer_cache():
+    """Ouvre le cache persistant des synthèses d'offres"""
+    return open_offer_cache()
+
+@st.cache_resource
+def init_token_ledger():
+    """Ouvre le registre de consommation de tokens (partagé avec CHeckCV_pro et la CLI)"""
+    return TokenLedger()
+
+@st.cache_resource
+def init_extraction_cache():
+    """Ouvre le cache persistant des textes extraits"""
+    return ExtractionCache()
 
 def extract_text_from_file(uploaded_file) -> str:
-    """Extrait le texte d'un fichier uploadé"""
+    """Extrait le texte d'un fichier uploadé (mis en cache par empreinte du contenu)"""
+    data = uploaded_file.getvalue()
+    extraction_cache = init_extraction_cache()
+    version = extractor_version(uploaded_file.type)
+    cached = extraction_cache.get(data, version)
+    if cached is not None:
+        return cached
+    
     try:
-        if uploaded_file.type == "text/plain":
-            return uploaded_file.getvalue().decode("utf-8")
-        elif uploaded_file.type == "application/pdf":
-            import PyPDF2
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(uploaded_file.getvalue()))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-            return text
-        elif uploaded_file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-            import docx
-            doc = docx.Document(io.BytesIO(uploaded_file.getvalue()))
-            return "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        else:
-            return uploaded_file.getvalue().decode("utf-8")
+        text = extract_text(data, uploaded_file.type)
     except Exception as e:
         st.error(f"Erreur lors de la lecture du fichier {uploaded_file.name}: {str(e)}")
         return ""
-
-def analyze_cv_with_mistral(client: Mistral, job_description: str, cv_content: str, cv_name: str) -> Dict:
-    """Analyse un CV avec Mistral AI"""
     
-    prompt = f"""Tu es un expert en recrutement. Analyse ce CV par rapport à l'offre d'emploi et réponds UNIQUEMENT avec un JSON valide (sans markdown, sans backticks).
-
-Offre d'emploi:
-{job_description}
-
-CV du candidat ({cv_name}):
-{cv_content}
+    extraction_cache.put(data, version, text)
+    return text
 
-Analyse le CV et fournis:
-1. Un score de 0 à 100 représentant l'adéquation du candidat avec le poste
-2. 3 à 5 points forts du candidat
-3. 3 à 5 points à améliorer
-4. 3 à 5 recommandations concrètes pour améliorer le CV
+def summarize_job_offer(client: Mistral, job_description: str, ledger: Optional[BatchUsage] = None) -> str:
+    """Synthétise l'offre en exigences compactes (un seul appel Mistral par offre, mis en cache)"""
+    return distill_offer(client, job_description, init_offer_cache(), ledger)
 
-Format de réponse (JSON strict, sans texte avant ou après):
-{{
-  "score": <nombre entre 0 et 100>,
-  "points_forts": ["point1", "point2", "point3"],
-  "points_amelioration": ["point1", "point2", "point3"],
-  "recommandations": ["rec1", "rec2", "rec3"]
-}}"""
-
-    try:
-        response = client.chat.complete(
-            model="mistral-large-latest",
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.3,
-            max_tokens=1500
-        )
-        
-        # Extraction du contenu
-        content = response.choices[0].message.content
-        
-        # Nettoyage du contenu (enlever les balises markdown si présentes)
-        content = content.strip()
-        if content.startswith("```json"):
-            content = content.replace("```json", "").replace("```", "").strip()
-        elif content.startswith("```"):
-            content = content.replace("```", "").strip()
-        
-        # Parse le JSON
-        result = json.loads(content)
-        
-        return {
-            "score": result.get("score", 0),
-            "points_forts": result.get("points_forts", []),
-            "points_amelioration": result.get("points_amelioration", []),
-            "recommandations": result.get("recommandations", [])
-        }
-        
-    except json.JSONDecodeError as e:
-        st.warning(f"Erreur de parsing JSON pour {cv_name}. Utilisation de valeurs par défaut.")
-        return {
-            "score": 50,
-            "points_forts": ["Profil intéressant"],
-            "points_amelioration": ["CV à approfondir"],
-            "recommandations": ["Détailler davantage les expériences"]
-        }
-    except Exception as e:
-        st.error(f"Erreur lors de l'analyse de {cv_name}: {str(e)}")
-        return None
+def build_result(filename: str, analysis: Dict) -> Dict:
+    """Construit l'entrée de résultat d'un candidat à partir de son analyse"""
+    return {
+        'name': filename,
+        'score': analysis['score'],
+        'points_forts': analysis['points_forts'],
+        'points_amelioration': analysis['points_amelioration'],
+        'recommandations': analysis['recommandations']
+    }
 
 def get_score_badge(score: int) -> str:
     """Retourne le badge HTML selon le score"""
@@ -195,13 +166,15 @@ def main():
     
     # Initialisation du client Mistral
     client = init_mistral()
+    analysis_cache = init_analysis_cache()
+    token_ledger = init_token_ledger()
     
     # Sidebar pour les instructions
     with st.sidebar:
         st.header("📋 Instructions")
         st.markdown("""
         1. **Importez l'offre d'emploi** (TXT, PDF, DOCX)
-        2. **Importez les CV** (jusqu'à 100 fichiers)
+        2. **Importez les CV** (sans limite, analysés par vagues)
         3. **Cliquez sur "Analyser"** pour lancer l'analyse
         4. **Consultez les résultats** classés par score
         """)
@@ -209,6 +182,25 @@ def main():
         st.markdown("---")
         st.markdown("### ⚙️ Configuration")
         st.info("Clé API Mistral chargée depuis .env")
+        concurrency = st.slider(
+            "Requêtes simultanées",
+            min_value=1,
+            max_value=64,
+            value=16,
+            help="Nombre maximal de requêtes Mistral en vol pendant l'analyse"
+        )
+        token_budget = st.number_input(
+            "Budget de tokens par CV",
+            min_value=0,
+            max_value=32000,
+            value=DEFAULT_TOKEN_BUDGET,
+            step=250,
+            help="Les passages du CV les plus pertinents pour l'offre sont conservés dans cette limite (0 = CV complet)"
+        )
+        cache_stats = st.empty()
+        cache_stats.caption(analysis_cache.summary())
+        ledger_stats = st.empty()
+        ledger_stats.caption(token_ledger.summary())
         
         st.markdown("---")
         st.markdown("### 📊 Statistiques")
@@ -247,18 +239,16 @@ def main():
     with col2:
         st.markdown("### 👥 CV des candidats")
         cv_files = st.file_uploader(
-            "Importez les CV (max 100)",
+            "Importez les CV",
             type=["txt", "pdf", "docx"],
             accept_multiple_files=True,
             key="cv_upload",
             help="Formats acceptés: TXT, PDF, DOCX"
         )
         
+        # Seul le nombre de CV est conservé : les fichiers restent dans l'uploader
+        st.session_state['cv_count'] = len(cv_files) if cv_files else 0
         if cv_files:
-            if len(cv_files) > 100:
-                st.error("⚠️ Maximum 100 CV autorisés")
-                cv_files = cv_files[:100]
-            st.session_state['cv_files'] = cv_files
             st.success(f"✅ {len(cv_files)} CV chargés")
     
     # Bouton d'analyse
@@ -269,14 +259,12 @@ def main():
             "🚀 Analyser les CV",
             type="primary",
             use_container_width=True,
-            disabled=not (st.session_state.get('job_description') and st.session_state.get('cv_files'))
+            disabled=not (st.session_state.get('job_description') and st.session_state.get('cv_count'))
         )
     
     # Analyse
     if analyze_button:
         job_description = st.session_state.get('job_description')
-        cv_files = st.session_state.get('cv_files')
-        
         if not job_description or not cv_files:
             st.error("⚠️ Veuillez charger une offre d'emploi et au moins un CV")
             return
@@ -284,30 +272,50 @@ def main():
         st.markdown("---")
         st.markdown("### 🔄 Analyse en cours...")
         
-        results = []
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        for idx, cv_file in enumerate(cv_files):
-            status_text.text(f"Analyse de {cv_file.name}... ({idx + 1}/{len(cv_files)})")
+        # Tokens facturés de chaque appel, enregistrés par lot et par offre
+        batch_usage = token_ledger.batch(
+            make_batch_id(job_description, [make_cv_key(cv_file.getvalue()) for cv_file in cv_files], token_budget),
+            make_offer_id(job_description)
+        )
+        
+        # L'offre est synthétisée une seule fois ; chaque prompt de CV ne porte que sa forme compacte
+        status_text.text("Synthèse des exigences de l'offre...")
+        job_requirements = summarize_job_offer(client, job_description, batch_usage)
+        
+        # Chaque résultat est écrit sur disque dès qu'il est disponible
+        spool = ResultSpool()
+        done_before = 0
+        
+        # Vagues de CV : extraction dans le thread du script, puis analyses de la vague dans une boucle asyncio
+        for wave in iter_waves(cv_files, DEFAULT_WAVE_SIZE):
+            status_text.text(f"Lecture de {len(wave)} CV...")
+            cv_items = load_wave(wave, lambda cv_file: (cv_file.name, extract_text_from_file(cv_file)))
             
-            cv_content = extract_text_from_file(cv_file)
-            if cv_content:
-                analysis = analyze_cv_with_mistral(client, job_description, cv_content, cv_file.name)
+            def on_cv_done(idx, analysis, done):
                 if analysis:
-                    results.append({
-                        'name': cv_file.name,
-                        'score': analysis['score'],
-                        'points_forts': analysis['points_forts'],
-                        'points_amelioration': analysis['points_amelioration'],
-                        'recommandations': analysis['recommandations']
-                    })
+                    spool.add(build_result(cv_items[idx][0], analysis), done_before + idx)
+                status_text.text(f"Analyse de {cv_items[idx][0]} terminée ({done_before + done}/{len(cv_files)})")
+                progress_bar.progress(min(1.0, (done_before + done) / len(cv_files)))
             
-            progress_bar.progress((idx + 1) / len(cv_files))
+            # Contexte CV borné : les blocs les plus pertinents pour l'offre, dans la limite du budget
+            cv_items = [(name, build_cv_context(content, job_requirements, token_budget)) for name, content in cv_items]
+            # Toutes les requêtes de la vague sont pilotées depuis le thread du script (chat.complete_async)
+            analyze_cvs_async(client, job_requirements, cv_items, concurrency, on_cv_done, analysis_cache,
+                              on_error=lambda name, e: st.error(f"Erreur lors de l'analyse de {name}: {str(e)}"),
+                              ledger=batch_usage)
+            cache_stats.caption(analysis_cache.summary())
+            ledger_stats.caption(token_ledger.summary())
+            # Les textes de la vague sont libérés avant de lire la suivante
+            done_before += len(wave)
+            del cv_items
         
+        spool.close()
+        progress_bar.progress(1.0)
         # Tri par score décroissant
-        results.sort(key=lambda x: x['score'], reverse=True)
-        st.session_state['results'] = results
+        st.session_state['results'] = spool.ranked()
         
         status_text.text("✅ Analyse terminée!")
         st.balloons()
@@ -0,0 +1,116 @@
+"""
+CHECK CV - Cache persistant des analyses Mistral
+Les analyses déjà calculées sont conservées dans une base SQLite locale,
+indexées par une empreinte du contenu (offre, CV, modèle, version du prompt, température).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional
+
+# Dossier local des caches (peut être surchargé par la variable d'environnement)
+CACHE_DIR = os.getenv("CHECKCV_CACHE_DIR", ".checkcv_cache")
+
+def normalize_text(text: str) -> str:
+    """Normalise un texte avant hachage (Unicode NFC, espaces compactés)"""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+def make_analysis_key(job_text: str, cv_text: str, model: str, prompt_version: str, temperature: float) -> str:
+    """Calcule la clé de cache d'une analyse à partir de son contenu"""
+    payload = json.dumps(
+        [normalize_text(job_text), normalize_text(cv_text), model, prompt_version, float(temperature)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    """Cache SQLite des analyses, partagé entre threads.
+
+    L'éviction supprime les entrées plus anciennes que max_age_days puis,
+    si la base dépasse max_entries, les entrées les moins récemment lues.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 10000, max_age_days: float = 30):
+        self.path = path or os.path.join(CACHE_DIR, "analyses.sqlite3")
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+        self.evict()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Renvoie l'analyse en cache ou None"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE analyses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict) -> None:
+        """Enregistre une analyse dans le cache"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._conn.commit()
+            self._writes += 1
+            evict_now = self._writes % 100 == 0
+        if evict_now:
+            self.evict()
+
+    def evict(self) -> int:
+        """Applique la politique d'éviction et renvoie le nombre d'entrées supprimées"""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM analyses WHERE created_at < ?",
+                (time.time() - self.max_age_days * 86400,)
+            ).rowcount
+            count = self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+            if count > self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM analyses WHERE key IN (SELECT key FROM analyses ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+    def clear(self) -> None:
+        """Vide le cache"""
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses")
+            self._conn.commit()
+
+    def summary(self) -> str:
+        """Résumé lisible des statistiques du cache"""
+        return f"💾 Cache d'analyses : {self.hits} hits • {self.misses} miss • {len(self)} entrées"
@@ -0,0 +1,129 @@
+"""
+CHECK CV - Journal de reprise des lots
+Chaque analyse terminée est ajoutée à un journal JSONL synchronisé sur disque (fsync),
+identifié par l'ID du lot et indexé par l'empreinte de chaque CV. Relancer le même lot
+après une coupure (rerun Streamlit, onglet fermé, erreur Mistral) saute les CV déjà traités.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from analysis_cache import CACHE_DIR, normalize_text
+
+T = TypeVar("T")
+
+def make_cv_key(data: bytes) -> str:
+    """Empreinte d'un CV (octets du fichier ou texte encodé)"""
+    return hashlib.sha256(data).hexdigest()
+
+def make_batch_id(job_text: str, cv_keys: Iterable[str], *settings) -> str:
+    """ID d'un lot : offre normalisée, ensemble des CV et paramètres qui changent les résultats"""
+    payload = json.dumps([normalize_text(job_text), sorted(cv_keys), list(settings)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+def load_keyed_wave(wave: Sequence[Tuple[str, T]], load) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Lit une vague de couples (empreinte, source) : renvoie les empreintes et les CV lisibles alignés"""
+    keys, items = [], []
+    for key, source in wave:
+        item = load(source)
+        if item and item[1]:
+            keys.append(key)
+            items.append(item)
+    return keys, items
+
+class BatchJournal:
+    """Journal append-only des résultats d'un lot, une ligne JSON par CV terminé.
+
+    Chaque entrée garde la position du CV dans l'entrée du lot : à score égal, le classement
+    suit cet ordre, quels que soient l'ordre de fin des analyses et les reprises.
+    Une ligne incomplète (arrêt brutal pendant l'écriture) est tronquée à l'ouverture.
+    Les journaux de plus de max_age_days jours sont supprimés.
+    """
+
+    def __init__(self, batch_id: str, directory: Optional[str] = None, max_age_days: int = 30):
+        self.batch_id = batch_id
+        self.directory = directory or os.path.join(CACHE_DIR, "journaux")
+        self.path = os.path.join(self.directory, f"{batch_id}.jsonl")
+        self._lock = threading.Lock()
+        self._done: Dict[str, Dict] = {}
+        self._positions: Dict[str, int] = {}
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._prune(max_age_days)
+        self._replay()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _prune(self, max_age_days: int) -> None:
+        limit = time.time() - max_age_days * 86400
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if path != self.path and name.endswith(".jsonl") and os.path.getmtime(path) < limit:
+                os.remove(path)
+
+    def _replay(self) -> None:
+        """Relit les entrées déjà journalisées et tronque une éventuelle fin incomplète"""
+        if not os.path.exists(self.path):
+            return
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                self._done[entry["cv"]] = entry["resultat"]
+                # Journaux antérieurs sans position : ordre du journal
+                self._positions[entry["cv"]] = entry.get("position", len(self._positions))
+                valid_size += len(line)
+        if os.path.getsize(self.path) > valid_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_size)
+
+    def __contains__(self, cv_key: str) -> bool:
+        return cv_key in self._done
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def record(self, cv_key: str, result: Dict, position: int, sync: bool = True) -> None:
+        """Ajoute le résultat d'un CV (position : son rang dans l'entrée du lot) ; avec sync,
+        il est sur disque au retour"""
+        line = json.dumps({"cv": cv_key, "position": position, "resultat": result}, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._done[cv_key] = result
+            self._positions[cv_key] = position
+            if sync:
+                self._sync()
+
+    def sync(self) -> None:
+        """Force l'écriture sur disque des entrées ajoutées sans sync"""
+        with self._lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    def results(self) -> List[Dict]:
+        """Tous les résultats du lot (repris et nouveaux), dans l'ordre du journal"""
+        return list(self._done.values())
+
+    def entries(self) -> List[Tuple[int, Dict]]:
+        """Couples (position dans l'entrée, résultat), dans l'ordre du journal"""
+        return [(self._positions[key], result) for key, result in self._done.items()]
+
+    def ranked(self) -> List[Dict]:
+        """Résultats triés par score décroissant, puis par position dans l'entrée"""
+        return [result for _, result in sorted(self.entries(), key=lambda entry: (-entry[1]['score'], entry[0]))]
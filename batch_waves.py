@@ -0,0 +1,133 @@
+"""
+CHECK CV - Traitement des gros lots par vagues
+Les CV sont lus, analysés puis libérés par vagues de taille fixe, et chaque résultat est
+écrit sur disque au fil de l'eau : la mémoire occupée dépend de la taille d'une vague,
+pas du nombre total de candidatures.
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from analysis_cache import CACHE_DIR
+from semantic_ranking import rank_by_similarity
+
+# Nombre de CV lus et analysés ensemble (surchargeable par variable d'environnement)
+DEFAULT_WAVE_SIZE = int(os.getenv("CHECKCV_WAVE_SIZE", "25"))
+
+T = TypeVar("T")
+CvItem = Tuple[str, str]
+
+def iter_waves(items: Sequence[T], wave_size: int) -> Iterator[Sequence[T]]:
+    """Découpe une séquence en vagues consécutives d'au plus wave_size éléments"""
+    wave_size = max(1, wave_size)
+    for start in range(0, len(items), wave_size):
+        yield items[start:start + wave_size]
+
+def iter_prefetched_waves(items: Sequence[T], wave_size: int,
+                          prefetch: Optional[Callable[[Sequence[T]], None]] = None) -> Iterator[Sequence[T]]:
+    """Comme iter_waves, mais prefetch(vague suivante) est appelé avant de rendre chaque vague.
+
+    L'extraction (en parallèle) de la vague suivante avance ainsi pendant l'analyse de la vague courante.
+    """
+    waves = iter_waves(items, wave_size)
+    wave = next(waves, None)
+    if wave is not None and prefetch:
+        prefetch(wave)
+    while wave is not None:
+        following = next(waves, None)
+        if following is not None and prefetch:
+            prefetch(following)
+        yield wave
+        wave = following
+
+def load_wave(sources: Sequence[T], load: Callable[[T], Optional[CvItem]]) -> List[CvItem]:
+    """Lit les CV d'une vague ; load(source) renvoie (nom, texte) ou None si illisible"""
+    items = []
+    for source in sources:
+        item = load(source)
+        if item and item[1]:
+            items.append(item)
+    return items
+
+def preselect_in_waves(job_description: str, sources: Sequence[T], load: Callable[[T], Optional[CvItem]],
+                       top_k: int, embedder, wave_size: int = DEFAULT_WAVE_SIZE,
+                       on_wave: Optional[Callable[[List[CvItem]], None]] = None,
+                       prefetch: Optional[Callable[[Sequence[T]], None]] = None) -> Tuple[List[T], List[Dict]]:
+    """Pré-sélection sémantique sans garder les textes en mémoire.
+
+    Les sources sont lues vague par vague et seule la similarité de chacune avec
+    l'offre est conservée. Renvoie les top_k sources (de la plus proche à la moins
+    proche) et les CV écartés avec leur similarité en pourcentage. on_wave(items)
+    reçoit les CV lus de chaque vague (ex. pour alimenter le vivier) ; prefetch(vague)
+    peut lancer à l'avance l'extraction de la vague suivante.
+    """
+    scored = []
+    for wave in iter_prefetched_waves(sources, wave_size, prefetch):
+        named = []
+        for source in wave:
+            item = load(source)
+            if item and item[1]:
+                named.append((source, item))
+        if not named:
+            continue
+        if on_wave:
+            on_wave([item for _, item in named])
+        for idx, similarity in rank_by_similarity(job_description, [item[1] for _, item in named], embedder):
+            scored.append((similarity, len(scored), named[idx][0], named[idx][1][0]))
+    scored.sort(key=lambda entry: (-entry[0], entry[1]))
+    selected = [source for _, _, source, _ in scored[:top_k]]
+    rejected = [
+        {'filename': filename, 'similarite': round(similarity * 100, 1)}
+        for similarity, _, _, filename in scored[top_k:]
+    ]
+    return selected, rejected
+
+class ResultSpool:
+    """Résultats d'un lot, ajoutés un par un à un fichier JSONL.
+
+    Chaque ligne porte la position du CV dans l'entrée ("ordre") : le fichier est dans
+    l'ordre de fin des analyses, mais le classement départage les scores égaux comme
+    un traitement séquentiel.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.jsonl"
+            path = os.path.join(CACHE_DIR, "lots", name)
+        self.path = path
+        self.count = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def add(self, result: Dict, index: Optional[int] = None) -> None:
+        """Écrit un résultat sur disque dès qu'il est disponible.
+
+        index est la position du CV dans l'entrée (par défaut, l'ordre d'ajout).
+        """
+        line = dict(result, ordre=self.count if index is None else index)
+        self._file.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.count += 1
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __iter__(self) -> Iterator[Dict]:
+        if not self._file.closed:
+            self._file.flush()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def ranked(self) -> List[Dict]:
+        """Relit tous les résultats analysés, triés par score décroissant puis par ordre
+        d'entrée (les CV non évalués, sans score, sont ignorés)"""
+        analyzed = sorted((line for line in self if 'score' in line), key=lambda x: (-x['score'], x.get('ordre', 0)))
+        return [{key: value for key, value in line.items() if key != 'ordre'} for line in analyzed]
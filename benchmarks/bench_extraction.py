@@ -0,0 +1,89 @@
+"""
+CHECK CV - Banc d'essai des moteurs d'extraction
+Compare, pour chaque fichier du corpus, tous les moteurs installés : pages par seconde et
+caractères récupérés (hors espaces). Par défaut, le corpus est le PDF fourni avec le dépôt.
+
+Exemple :
+    python benchmarks/bench_extraction.py
+    python benchmarks/bench_extraction.py cvs/ "archives/**/*.docx" --repeat 5
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from checkcv_batch import collect_cv_paths  # noqa: E402
+from text_extraction import MIME_TYPES, backends_for, pdf_backends  # noqa: E402
+
+DEFAULT_CORPUS = [os.path.join(ROOT, "CHECK_CV_final (1).pdf")]
+
+def count_pages(data: bytes, mime_type: str) -> int:
+    """Pages d'un PDF (1 pour les autres formats, comptés comme un document d'une page)"""
+    if mime_type != MIME_TYPES[".pdf"]:
+        return 1
+    for backend in pdf_backends():
+        try:
+            return backend.page_count(data)
+        except Exception:
+            continue
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare les moteurs d'extraction sur un corpus de fichiers")
+    parser.add_argument("corpus", nargs="*", default=DEFAULT_CORPUS,
+                        help="Dossiers, fichiers ou motifs glob (txt, pdf, docx)")
+    parser.add_argument("--repeat", type=int, default=3, help="Mesures par fichier et par moteur (la meilleure est gardée)")
+    args = parser.parse_args(argv)
+
+    paths = collect_cv_paths(args.corpus)
+    if not paths:
+        print("Aucun fichier à mesurer", file=sys.stderr)
+        return 1
+
+    totals = defaultdict(lambda: {"pages": 0, "seconds": 0.0, "chars": 0, "errors": 0})
+    print(f"{'Fichier':<40} {'Moteur':<12} {'Pages':>5} {'ms':>9} {'pages/s':>9} {'caractères':>11}")
+    for path in paths:
+        mime_type = MIME_TYPES[os.path.splitext(path)[1].lower()]
+        with open(path, "rb") as f:
+            data = f.read()
+        pages = count_pages(data, mime_type)
+        for name, extract in backends_for(mime_type):
+            total = totals[(mime_type, name)]
+            best = None
+            try:
+                # Premier passage non mesuré : imports et initialisation du moteur
+                text = extract(data)
+                for _ in range(max(1, args.repeat)):
+                    started = time.perf_counter()
+                    text = extract(data)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+            except Exception as e:
+                total["errors"] += 1
+                print(f"{os.path.basename(path)[:40]:<40} {name:<12} erreur : {str(e)}")
+                continue
+            chars = sum(1 for char in text if not char.isspace())
+            total["pages"] += pages
+            total["seconds"] += best
+            total["chars"] += chars
+            print(f"{os.path.basename(path)[:40]:<40} {name:<12} {pages:>5} {best * 1000:>9.1f} "
+                  f"{pages / best if best else 0:>9.1f} {chars:>11}")
+
+    print()
+    print(f"{'Total par moteur':<40} {'Moteur':<12} {'Pages':>5} {'ms':>9} {'pages/s':>9} {'caractères':>11}")
+    for (mime_type, name), total in sorted(totals.items()):
+        speed = total["pages"] / total["seconds"] if total["seconds"] else 0
+        errors = f"  ({total['errors']} erreurs)" if total["errors"] else ""
+        label = next(ext for ext, mime in MIME_TYPES.items() if mime == mime_type)
+        print(f"{label:<40} {name:<12} {total['pages']:>5} {total['seconds'] * 1000:>9.1f} "
+              f"{speed:>9.1f} {total['chars']:>11}{errors}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+CHECK CV - Banc d'essai de bout en bout contre un faux serveur Mistral
+Génère un corpus de CV (PDF, DOCX, TXT), démarre un faux serveur Mistral local (latence,
+erreurs 5xx et 429 réglables) et fait passer chaque taille de lot par le vrai pipeline :
+extraction → contexte du CV → analyze_cv → classement → rapport PDF. Chaque taille tourne
+dans un processus neuf pour mesurer son pic de mémoire. Le lot passe par les mêmes fonctions
+que checkcv_batch.py (vagues avec prefetch, analyses concurrentes, journal, spool JSONL) ;
+la synthèse de l'offre est mesurée à part (étape synthese_ms).
+
+Rapporte CV/s, latence par CV (p50/p95 : extraction + analyse, reprises comprises) et pic
+RSS. --output enregistre les mesures (avec le détail par étape de pipeline_metrics),
+--baseline les compare à une référence et sort en erreur en cas de régression.
+
+Exemple :
+    python benchmarks/bench_pipeline.py --sizes 10 100 1000 --latency-ms 300 --rate-429 0.02
+    python benchmarks/bench_pipeline.py --output reference.json
+    python benchmarks/bench_pipeline.py --baseline reference.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_mistral import FakeMistralServer  # noqa: E402
+from pipeline_metrics import PipelineMetrics, percentile  # noqa: E402
+
+JOB_OFFER = """Data engineer Python confirmé (H/F)
+Missions : concevoir les pipelines de données, industrialiser les modèles, encadrer deux juniors.
+Compétences : Python, SQL, Spark, Airflow, Docker, Kubernetes, AWS, tests automatisés.
+Profil : 5 ans d'expérience minimum, anglais courant, esprit d'équipe."""
+
+SKILLS = ["Python", "SQL", "Spark", "Airflow", "Docker", "Kubernetes", "AWS", "GCP", "Java", "Scala",
+          "React", "Power BI", "Excel", "Pandas", "TensorFlow", "Kafka", "PostgreSQL", "Git", "Linux", "Terraform"]
+COMPANIES = ["Orange", "Capgemini", "Société Générale", "Thales", "Doctolib", "OVHcloud", "Decathlon", "SNCF"]
+
+# Corpus : 50 % de PDF, 30 % de DOCX, 20 % de TXT
+FORMATS = [".pdf"] * 5 + [".docx"] * 3 + [".txt"] * 2
+
+# --- Corpus ---------------------------------------------------------------------------
+
+def make_cv_text(rng: random.Random, idx: int) -> List[str]:
+    """Lignes d'un CV synthétique (une à deux pages)"""
+    lines = [f"Candidat Numéro{idx}", f"candidat{idx}@exemple.fr • 06 00 00 {idx % 100:02d} {idx % 97:02d}", "",
+             "COMPÉTENCES", ", ".join(rng.sample(SKILLS, 8)), "", "EXPÉRIENCES"]
+    for year in range(2024, 2024 - rng.randint(3, 9), -1):
+        company = rng.choice(COMPANIES)
+        lines.append(f"{year - 1}-{year} : Ingénieur données chez {company}")
+        lines.extend(f"- Mise en place de {rng.choice(SKILLS)} pour {rng.choice(['la facturation', 'le reporting', 'la logistique', 'le marketing'])}"
+                     for _ in range(rng.randint(2, 5)))
+    lines += ["", "FORMATION", f"Master informatique, promotion {2010 + idx % 12}", "",
+              "LANGUES", "Anglais courant, espagnol notions"]
+    return lines
+
+def write_pdf(path: str, lines: List[str]) -> None:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    pdf = canvas.Canvas(path, pagesize=A4)
+    y = 800
+    for line in lines:
+        if y < 60:
+            pdf.showPage()
+            y = 800
+        pdf.drawString(50, y, line)
+        y -= 16
+    pdf.save()
+
+def write_docx(path: str, lines: List[str]) -> None:
+    """DOCX minimal (sans python-docx) : paragraphes, compétences dans un tableau"""
+    w = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    paragraph = lambda text: f"<w:p><w:r><w:t xml:space=\"preserve\">{escape(text)}</w:t></w:r></w:p>"
+    body = []
+    for line in lines:
+        if ", " in line and line.split(", ")[0] in SKILLS:
+            cells = "".join(f"<w:tc>{paragraph(skill)}</w:tc>" for skill in line.split(", "))
+            body.append(f"<w:tbl><w:tr>{cells}</w:tr></w:tbl>")
+        else:
+            body.append(paragraph(line))
+    document = f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><w:document xmlns:w=\"{w}\"><w:body>{''.join(body)}</w:body></w:document>"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", (
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+            "<Types xmlns=\"http://schemas.openxmlformats.org/package/2006/content-types\">"
+            "<Default Extension=\"rels\" ContentType=\"application/vnd.openxmlformats-package.relationships+xml\"/>"
+            "<Default Extension=\"xml\" ContentType=\"application/xml\"/>"
+            "<Override PartName=\"/word/document.xml\" ContentType=\"application/vnd.openxmlformats-officedocument."
+            "wordprocessingml.document.main+xml\"/></Types>"))
+        archive.writestr("_rels/.rels", (
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+            "<Relationships xmlns=\"http://schemas.openxmlformats.org/package/2006/relationships\">"
+            "<Relationship Id=\"rId1\" Type=\"http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+            "officeDocument\" Target=\"word/document.xml\"/></Relationships>"))
+        archive.writestr("word/document.xml", document)
+
+def build_corpus(directory: str, size: int, seed: int = 0) -> List[str]:
+    """Crée (ou complète) un corpus de `size` CV dans `directory` et renvoie leurs chemins"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for idx in range(size):
+        extension = FORMATS[idx % len(FORMATS)]
+        path = os.path.join(directory, f"cv_{idx:05d}{extension}")
+        if not os.path.exists(path):
+            lines = make_cv_text(random.Random(seed * 1_000_003 + idx), idx)
+            if extension == ".pdf":
+                write_pdf(path, lines)
+            elif extension == ".docx":
+                write_docx(path, lines)
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(lines))
+        paths.append(path)
+    return paths
+
+# --- Mesure d'une taille de lot (processus enfant) ----------------------------------------
+
+def peak_rss_mb() -> Optional[float]:
+    """Pic de mémoire résidente du processus (None si indisponible, ex. Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_pipeline(args) -> Dict:
+    """Fait passer les `args.run_one` premiers CV du corpus par le pipeline de checkcv_batch :
+    vagues avec prefetch, analyze_cvs_concurrently, journal du lot, spool JSONL et classement"""
+    from mistralai import Mistral
+
+    from batch_journal import BatchJournal, load_keyed_wave, make_batch_id
+    from batch_waves import ResultSpool, iter_prefetched_waves
+    from checkcv_batch import file_key, load_cv, prefetch_cvs
+    from cv_context import build_cv_context
+    from cv_pipeline import CascadePolicy, analyze_cvs_concurrently, build_result, distill_offer
+    from extraction_cache import ExtractionCache
+    from mistral_client import RateLimitedClient, RateLimiter
+    from parallel_extraction import ParallelExtractor
+    from pdf_report import write_pdf_report
+
+    paths = sorted(os.path.join(args.corpus_dir, name) for name in os.listdir(args.corpus_dir))[:args.run_one]
+    client = RateLimitedClient(Mistral(api_key="bench", server_url=args.server_url),
+                               RateLimiter(args.rps, 0))
+    extractor = ParallelExtractor(args.extraction_workers)
+    cascade = CascadePolicy(args.cascade_threshold) if args.cascade else None
+    failures = []
+    metrics = PipelineMetrics()
+    extraction_ms: Dict[str, float] = {}
+    latencies = []
+
+    # Caches, journal et spool neufs : chaque mesure extrait et analyse vraiment tous les CV
+    with tempfile.TemporaryDirectory() as directory:
+        extraction_cache = ExtractionCache(os.path.join(directory, "extractions.sqlite3"))
+
+        def load(path: str):
+            load_started = time.perf_counter()
+            with metrics.timer("extraction_ms", os.path.basename(path)):
+                item = load_cv(path, extraction_cache, extractor)
+            extraction_ms[path] = (time.perf_counter() - load_started) * 1000
+            if item is None:
+                failures.append(path)
+            return item
+
+        prefetch = lambda wave: prefetch_cvs([path for _, path in wave], extraction_cache, extractor)
+        sources = [(file_key(path), path) for path in paths]
+        journal = BatchJournal(make_batch_id(JOB_OFFER, [key for key, _ in sources], "bench"), directory)
+        spool = ResultSpool(os.path.join(directory, "resultats.jsonl"))
+        positions = {key: position for position, (key, _) in enumerate(sources)}
+
+        started = time.perf_counter()
+        with metrics.timer("synthese_ms"):
+            job_requirements = distill_offer(client, JOB_OFFER)
+        for wave in iter_prefetched_waves(sources, args.wave_size, prefetch):
+            cv_keys, cv_items = load_keyed_wave(wave, load)
+            # Latence d'un CV : son extraction puis l'attente et l'appel de son analyse
+            prepared_ms = [extraction_ms[path] for path, _ in cv_items]
+            cv_items = [(os.path.basename(path), build_cv_context(content, job_requirements, args.token_budget))
+                        for path, content in cv_items]
+            wave_started = time.perf_counter()
+
+            def on_cv_done(idx, analysis, done):
+                latencies.append(prepared_ms[idx] + (time.perf_counter() - wave_started) * 1000)
+                if analysis:
+                    result = build_result(cv_items[idx][0], analysis)
+                    journal.record(cv_keys[idx], result, positions[cv_keys[idx]], sync=False)
+                    spool.add(result, positions[cv_keys[idx]])
+
+            analyze_cvs_concurrently(client, job_requirements, cv_items, args.workers, on_cv_done,
+                                     on_error=lambda name, e: failures.append(f"{name}: {e}"),
+                                     metrics=metrics, cascade=cascade)
+            journal.sync()
+        journal.close()
+        spool.close()
+        analyzed = time.perf_counter()
+
+        results = spool.ranked()
+        with metrics.timer("rendu_ms"):
+            write_pdf_report(results, JOB_OFFER, os.path.join(directory, "rapport.pdf"), args.pdf_top or None)
+        finished = time.perf_counter()
+    extractor.shutdown()
+    rss = peak_rss_mb()
+
+    return {
+        "cv": len(paths),
+        "classes": len(results),
+        "echecs": len(failures),
+        "synthese": job_requirements != JOB_OFFER,
+        "duree_s": round(finished - started, 3),
+        "rapport_s": round(finished - analyzed, 3),
+        "cv_par_s": round(len(paths) / (finished - started), 2),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "rss_mo": round(rss, 1) if rss is not None else None,
+        "reprises": client.retries,
+        "etapes": metrics.summary(),
+    }
+
+# --- Orchestration --------------------------------------------------------------------------
+
+def compare(rows: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Régressions par rapport à la référence : débit en baisse, p95 ou mémoire en hausse"""
+    reference = {row["cv"]: row for row in baseline}
+    regressions = []
+    for row in rows:
+        base = reference.get(row["cv"])
+        if not base:
+            continue
+        if row["cv_par_s"] < base["cv_par_s"] * (1 - tolerance):
+            regressions.append(f"{row['cv']} CV : débit {row['cv_par_s']} CV/s < référence {base['cv_par_s']}")
+        if row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{row['cv']} CV : p95 {row['p95_ms']} ms > référence {base['p95_ms']}")
+        if row.get("rss_mo") and base.get("rss_mo") and row["rss_mo"] > base["rss_mo"] * (1 + tolerance):
+            regressions.append(f"{row['cv']} CV : RSS {row['rss_mo']} Mo > référence {base['rss_mo']}")
+    return regressions
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Banc d'essai du pipeline complet contre un faux serveur Mistral")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Tailles de lot mesurées")
+    parser.add_argument("--workers", type=int, default=8, help="Requêtes Mistral simultanées")
+    parser.add_argument("--wave-size", type=int, default=25, help="CV lus et analysés par vague")
+    parser.add_argument("--extraction-workers", type=int, default=1,
+                        help="Processus d'extraction (1 = dans le processus mesuré)")
+    parser.add_argument("--token-budget", type=int, default=1200, help="Budget de tokens par CV (0 = CV complet)")
+    parser.add_argument("--pdf-top", type=int, default=0, help="Candidats détaillés dans le rapport (0 = tous)")
+    parser.add_argument("--cascade", action="store_true", help="Mode cascade (petit puis grand modèle)")
+    parser.add_argument("--cascade-threshold", type=int, default=60, help="Seuil d'approfondissement de la cascade")
+    parser.add_argument("--rps", type=float, default=0, help="Limite de requêtes/s du client (0 = illimité)")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Latence moyenne du faux serveur")
+    parser.add_argument("--small-latency-ms", type=float, help="Latence moyenne des modèles small (cascade)")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="Variation de latence (±)")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Part des réponses 503")
+    parser.add_argument("--rate-429", type=float, default=0.02, help="Part des réponses 429")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After des 429, en secondes")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "checkcv_bench_corpus"),
+                        help="Dossier du corpus généré (réutilisé d'une exécution à l'autre)")
+    parser.add_argument("--output", help="Fichier JSON où enregistrer les mesures")
+    parser.add_argument("--baseline", help="Mesures de référence (JSON) : sortie en erreur en cas de régression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Écart toléré par rapport à la référence")
+    parser.add_argument("--run-one", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--server-url", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    if args.run_one:
+        print(json.dumps(run_pipeline(args)))
+        return 0
+
+    print(f"📄 Corpus : {max(args.sizes)} CV dans {args.corpus_dir}", file=sys.stderr)
+    build_corpus(args.corpus_dir, max(args.sizes))
+    server = FakeMistralServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                               rate_429=args.rate_429, retry_after=args.retry_after,
+                               small_latency_ms=args.small_latency_ms).start()
+    passthrough = ["--workers", str(args.workers), "--wave-size", str(args.wave_size),
+                   "--extraction-workers", str(args.extraction_workers), "--token-budget", str(args.token_budget),
+                   "--pdf-top", str(args.pdf_top), "--rps", str(args.rps), "--corpus-dir", args.corpus_dir,
+                   "--cascade-threshold", str(args.cascade_threshold), "--server-url", server.url]
+    if args.cascade:
+        passthrough.append("--cascade")
+    rows = []
+    try:
+        for size in args.sizes:
+            before = dict(server.stats)
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-one", str(size)] + passthrough,
+                                   capture_output=True, text=True, check=True)
+            row = json.loads(child.stdout.strip().splitlines()[-1])
+            row.update({key: server.stats[key] - before[key] for key in server.stats})
+            rows.append(row)
+            print(f"✅ {size} CV mesurés", file=sys.stderr)
+            if not row["synthese"]:
+                print(f"⚠️ {size} CV : synthèse de l'offre en échec, offre brute utilisée", file=sys.stderr)
+    finally:
+        server.stop()
+
+    print(f"{'CV':>6} {'CV/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'RSS Mo':>8} {'rapport s':>10} "
+          f"{'requêtes':>9} {'429':>5} {'5xx':>5} {'reprises':>9} {'échecs':>7}")
+    for row in rows:
+        rss = f"{row['rss_mo']:>8.1f}" if row["rss_mo"] is not None else f"{'n/d':>8}"
+        print(f"{row['cv']:>6} {row['cv_par_s']:>8.2f} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {rss} "
+              f"{row['rapport_s']:>10.2f} {row['requetes']:>9} {row['429']:>5} {row['erreurs']:>5} "
+              f"{row['reprises']:>9} {row['echecs']:>7}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(rows, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"❌ Régression : {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+CHECK CV - Serveur local imitant l'API chat de Mistral
+Répond à POST /v1/chat/completions (et /v1/embeddings) comme l'API, avec une latence,
+un taux d'erreurs 5xx et un taux de 429 réglables. La réponse d'analyse est un JSON valide
+dont le score dépend du prompt : deux exécutions donnent le même classement. Le prompt de
+synthèse de l'offre reçoit une liste d'exigences, comme celle du vrai modèle.
+
+Exemple (puis Mistral(api_key="x", server_url="http://127.0.0.1:8765")) :
+    python benchmarks/fake_mistral.py --port 8765 --latency-ms 300 --error-rate 0.02 --rate-429 0.05
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+class FakeMistralServer:
+    """Serveur HTTP de test dans un thread de fond ; compte les requêtes, erreurs et 429 servis"""
+
+    def __init__(self, port: int = 0, latency_ms: float = 200, jitter_ms: float = 100,
+                 error_rate: float = 0.0, rate_429: float = 0.0, retry_after: float = 1.0, seed: int = 0,
+                 small_latency_ms: Optional[float] = None):
+        self.latency_ms = latency_ms
+        # Latence des modèles "small" (mode cascade) ; par défaut celle des autres modèles
+        self.small_latency_ms = latency_ms if small_latency_ms is None else small_latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.stats = {"requetes": 0, "erreurs": 0, "429": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeMistralServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-mistral", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def draw(self, model: str = "") -> tuple:
+        """Tire la latence et l'issue (ok, erreur, 429) d'une requête"""
+        base_ms = self.small_latency_ms if "small" in model else self.latency_ms
+        with self._lock:
+            self.stats["requetes"] += 1
+            latency = max(0.0, base_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            roll = self._random.random()
+            if roll < self.rate_429:
+                self.stats["429"] += 1
+                return latency, 429
+            if roll < self.rate_429 + self.error_rate:
+                self.stats["erreurs"] += 1
+                return latency, 503
+            return latency, 200
+
+# Début du prompt de synthèse de l'offre (job_distillation.build_distillation_prompt)
+DISTILLATION_MARKER = "Résume cette offre d'emploi"
+
+def fake_requirements() -> Dict:
+    """Synthèse factice de l'offre, au format attendu par job_distillation"""
+    return {
+        "intitule": "Data engineer Python confirmé",
+        "competences_obligatoires": ["Python", "SQL", "Spark", "Airflow", "Docker"],
+        "competences_souhaitees": ["Kubernetes", "AWS", "tests automatisés"],
+        "experience": "5 ans minimum en ingénierie de données",
+        "formation": "Bac+5 informatique",
+        "langues": ["anglais courant"],
+        "missions": ["concevoir les pipelines de données", "industrialiser les modèles", "encadrer deux juniors"],
+        "autres_criteres": ["esprit d'équipe"]
+    }
+
+def fake_analysis(prompt: str) -> Dict:
+    """Analyse factice mais stable : le score dépend de l'empreinte du prompt"""
+    digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+    return {
+        "nom_complet": f"Candidat {digest[:3].hex().upper()}",
+        "score": digest[3] % 101,
+        "points_forts": ["Expérience solide en Python", "Bonne maîtrise des données", "Autonomie"],
+        "points_amelioration": ["Peu d'expérience managériale", "Anglais à renforcer", "Cloud peu présent"],
+        "recommandations": ["Chiffrer les réalisations", "Mettre en avant les projets", "Ajouter les certifications"]
+    }
+
+def _make_handler(server: FakeMistralServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            latency, status = server.draw(request.get("model", ""))
+            time.sleep(latency)
+            if status == 429:
+                self._send(429, {"message": "Requests rate limit exceeded"},
+                           {"Retry-After": f"{server.retry_after:g}"})
+                return
+            if status != 200:
+                self._send(status, {"message": "Service unavailable"})
+                return
+
+            if self.path.endswith("/embeddings"):
+                inputs = request.get("inputs") or request.get("input") or []
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                data = [{"object": "embedding", "index": idx,
+                         "embedding": [b / 255 for b in hashlib.sha256(text.encode("utf-8")).digest()]}
+                        for idx, text in enumerate(inputs)]
+                tokens = sum(len(text) // 4 for text in inputs)
+                self._send(200, {"id": "emb-bench", "object": "list", "model": request.get("model", ""),
+                                 "data": data, "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+                return
+
+            prompt = "".join(str(message.get("content", "")) for message in request.get("messages", []))
+            answer = fake_requirements() if DISTILLATION_MARKER in prompt else fake_analysis(prompt)
+            content = json.dumps(answer, ensure_ascii=False)
+            prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+            self._send(200, {
+                "id": "chat-bench",
+                "object": "chat.completion",
+                "model": request.get("model", ""),
+                "created": int(time.time()),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            })
+
+    return Handler
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serveur local imitant l'API chat de Mistral")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Latence moyenne d'une réponse")
+    parser.add_argument("--small-latency-ms", type=float, help="Latence moyenne des modèles small (cascade)")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="Variation de latence (±)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Part des réponses en erreur 503")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Part des réponses 429 (avec Retry-After)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After des 429, en secondes")
+    args = parser.parse_args()
+    server = FakeMistralServer(args.port, args.latency_ms, args.jitter_ms, args.error_rate,
+                               args.rate_429, args.retry_after, small_latency_ms=args.small_latency_ms).start()
+    print(f"Faux serveur Mistral sur {server.url} (Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
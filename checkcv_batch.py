@@ -0,0 +1,327 @@
+"""
+CHECK CV - Traitement par lots en ligne de commande
+Analyse un dossier (ou des motifs glob) de CV contre une offre, sans Streamlit : chaque résultat
+est écrit dans un fichier JSONL dès que son analyse est terminée, puis le rapport PDF du
+classement est généré en fin de lot.
+
+Exemple :
+    python checkcv_batch.py offre.pdf cvs/ "archives/**/*.docx" -o resultats.jsonl --pdf rapport.pdf
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from analysis_cache import AnalysisCache
+from batch_journal import BatchJournal, load_keyed_wave, make_batch_id, make_cv_key
+from batch_waves import DEFAULT_WAVE_SIZE, ResultSpool, iter_prefetched_waves, preselect_in_waves
+from cv_context import DEFAULT_TOKEN_BUDGET, build_cv_context
+from cv_pipeline import (DEFAULT_CASCADE_BAND, DEFAULT_CASCADE_THRESHOLD, MISTRAL_MODEL, PROMPT_VERSION,
+                         CascadePolicy, analyze_cvs_concurrently, build_result, distill_offer, estimate_batch_tokens,
+                         estimate_embedding_tokens)
+from extraction_cache import ExtractionCache
+from fast_screening import ScreeningProfile, screen_cvs
+from job_distillation import open_offer_cache
+from mistral_client import RateLimitedClient
+from parallel_extraction import DEFAULT_EXTRACTION_WORKERS, ParallelExtractor
+from pdf_report import write_pdf_report
+from semantic_ranking import HashingEmbedder, MistralEmbedder
+from talent_pool import TalentPool
+from text_extraction import MIME_TYPES, extractor_version
+from top_k_ranking import DEFAULT_PRESCORE_MARGIN, TopKRanking, prescore_in_waves
+from token_ledger import (DEFAULT_BATCH_TOKEN_BUDGET, DEFAULT_DAILY_TOKEN_BUDGET, OVER_BUDGET_REDUCE,
+                          OVER_BUDGET_SCREENING, OVER_BUDGET_STOP, TokenLedger, fit_batch_to_budget, make_offer_id)
+
+def log(message: str) -> None:
+    """Affiche la progression sur la sortie d'erreur (la sortie standard reste libre)"""
+    print(message, file=sys.stderr, flush=True)
+
+def collect_cv_paths(sources: List[str]) -> List[str]:
+    """Liste les CV (txt, pdf, docx) des dossiers, fichiers et motifs glob donnés, sans doublon"""
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            matches = [os.path.join(source, name) for name in sorted(os.listdir(source))]
+        else:
+            matches = sorted(glob.glob(source, recursive=True))
+        paths.extend(
+            path for path in matches
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in MIME_TYPES
+        )
+    return list(dict.fromkeys(paths))
+
+def mime_type_of(path: str) -> str:
+    return MIME_TYPES.get(os.path.splitext(path)[1].lower(), "text/plain")
+
+def read_text(path: str, extraction_cache: ExtractionCache, extractor: ParallelExtractor) -> str:
+    """Extrait le texte d'un fichier (cache d'extraction partagé avec l'application)"""
+    mime_type = mime_type_of(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    text = extraction_cache.get_or_extract(
+        data, extractor_version(mime_type), lambda raw: extractor.extract(raw, mime_type)
+    )
+    # Texte trouvé en cache après le prefetch (autre processus) : l'extraction lancée est abandonnée
+    extractor.discard([(data, mime_type)])
+    return text
+
+def prefetch_cvs(paths: List[str], extraction_cache: ExtractionCache, extractor: ParallelExtractor) -> None:
+    """Lance en parallèle l'extraction des CV absents du cache (les illisibles sont signalés à la lecture)"""
+    for path in paths:
+        mime_type = mime_type_of(path)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        if not extraction_cache.contains(data, extractor_version(mime_type)):
+            extractor.submit(data, mime_type)
+
+def discard_cvs(paths: List[str], extractor: ParallelExtractor) -> None:
+    """Abandonne les extractions lancées par prefetch_cvs pour des CV qui ne seront pas lus"""
+    documents = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                documents.append((f.read(), mime_type_of(path)))
+        except OSError:
+            continue
+    extractor.discard(documents)
+
+def load_cv(path: str, extraction_cache: ExtractionCache,
+            extractor: ParallelExtractor) -> Optional[Tuple[str, str]]:
+    """Lit un CV : (chemin, texte), ou None s'il est illisible ou vide (signalé)"""
+    try:
+        cv_content = read_text(path, extraction_cache, extractor)
+    except Exception as e:
+        log(f"⚠️ Lecture impossible de {path}: {str(e)}")
+        return None
+    if not cv_content.strip():
+        log(f"⚠️ Aucun texte extrait de {path}")
+        return None
+    return path, cv_content
+
+def file_key(path: str) -> str:
+    """Empreinte du contenu d'un fichier (identifie le CV dans le journal du lot)"""
+    with open(path, "rb") as f:
+        return make_cv_key(f.read())
+
+def init_mistral():
+    """Crée le client Mistral AI à partir de MISTRAL_API_KEY (fichier .env accepté)"""
+    from mistralai import Mistral
+    api_key = os.getenv("MISTRAL_API_KEY")
+    if not api_key:
+        raise SystemExit("⚠️ Clé API Mistral non trouvée. Veuillez configurer MISTRAL_API_KEY dans le fichier .env")
+    return RateLimitedClient(Mistral(api_key=api_key))
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    parser = argparse.ArgumentParser(description="Analyse par lots de CV par rapport à une offre d'emploi")
+    parser.add_argument("offre", help="Fichier de l'offre d'emploi (txt, pdf, docx)")
+    parser.add_argument("cvs", nargs="+", help="Dossiers, fichiers ou motifs glob des CV (txt, pdf, docx)")
+    parser.add_argument("-o", "--output", default=f"heck_cv_resultats_{timestamp}.jsonl",
+                        help="Fichier JSONL des résultats, écrit au fil de l'eau")
+    parser.add_argument("--pdf", default=f"heck_cv_rapport_{timestamp}.pdf",
+                        help="Rapport PDF du classement (chaîne vide pour ne pas le générer)")
+    parser.add_argument("--pdf-top", type=int, default=0,
+                        help="Rapport PDF : classement compact de tous les candidats, détail des N premiers (0 = détail de tous)")
+    parser.add_argument("--screening", action="store_true",
+                        help="Criblage rapide local, sans appel Mistral")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Un petit modèle note chaque CV, le grand modèle reprend les meilleurs et les cas limites")
+    parser.add_argument("--cascade-threshold", type=int, default=DEFAULT_CASCADE_THRESHOLD,
+                        help="Cascade : score du petit modèle à partir duquel le CV est repris par le grand modèle")
+    parser.add_argument("--cascade-band", type=int, default=DEFAULT_CASCADE_BAND,
+                        help="Cascade : zone limite, en points sous le seuil, également reprise")
+    parser.add_argument("--workers", type=int, default=4, help="Requêtes Mistral simultanées")
+    parser.add_argument("--top-k", type=int, default=0,
+                        help="Pré-sélection sémantique : seuls les K CV les plus proches sont analysés (0 = tous)")
+    parser.add_argument("--best-k", type=int, default=0,
+                        help="Top-K avec arrêt anticipé : CV analysés par pré-score local décroissant, jusqu'à ce "
+                             "qu'aucun ne puisse plus entrer dans les K meilleurs (0 = tous)")
+    parser.add_argument("--prescore-margin", type=int, default=DEFAULT_PRESCORE_MARGIN,
+                        help="Top-K : points ajoutés au pré-score local pour borner le score Mistral (100 = aucun arrêt)")
+    parser.add_argument("--embeddings", choices=["local", "mistral"], default="local",
+                        help="Embeddings de la pré-sélection")
+    parser.add_argument("--wave-size", type=int, default=DEFAULT_WAVE_SIZE,
+                        help="CV lus et analysés par vague (borne la mémoire utilisée)")
+    parser.add_argument("--extraction-workers", type=int, default=DEFAULT_EXTRACTION_WORKERS,
+                        help="Processus d'extraction des PDF et DOCX (1 = extraction dans le processus principal)")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help="Budget de tokens par CV (0 = CV complet)")
+    parser.add_argument("--budget-tokens", type=int, default=DEFAULT_BATCH_TOKEN_BUDGET,
+                        help="Budget de tokens du lot, estimé avant le lancement (0 = illimité)")
+    parser.add_argument("--daily-budget-tokens", type=int, default=DEFAULT_DAILY_TOKEN_BUDGET,
+                        help="Budget quotidien de tokens, consommation du jour déduite (0 = illimité)")
+    parser.add_argument("--over-budget", choices=[OVER_BUDGET_REDUCE, OVER_BUDGET_SCREENING, OVER_BUDGET_STOP],
+                        default=OVER_BUDGET_REDUCE,
+                        help="Lot hors budget : réduire le contexte des CV, basculer en criblage local ou arrêter")
+    parser.add_argument("--no-pool", action="store_true",
+                        help="Ne pas ajouter les CV au vivier de talents")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+    args = parse_args(argv)
+    started = time.perf_counter()
+    extraction_cache = ExtractionCache()
+    extractor = ParallelExtractor(args.extraction_workers)
+    client = None if args.screening and args.embeddings == "local" else init_mistral()
+
+    job_description = read_text(args.offre, extraction_cache, extractor)
+    paths = collect_cv_paths(args.cvs)
+    log(f"📄 {len(paths)} CV trouvés")
+    if not paths:
+        return 1
+    sources = [(file_key(path), path) for path in paths]
+    load = lambda path: load_cv(path, extraction_cache, extractor)
+    # L'extraction de la vague suivante tourne dans le pool de processus pendant le traitement de la vague courante
+    prefetch = lambda wave: prefetch_cvs([path for _, path in wave], extraction_cache, extractor)
+    # Budget : le lot est estimé localement (contexte des CV borné par --token-budget), avant tout appel ;
+    # la pré-sélection par embeddings Mistral y est comptée, en mode criblage comme en mode IA
+    token_ledger = None if client is None else TokenLedger()
+    cascade = CascadePolicy(args.cascade_threshold, args.cascade_band) if args.cascade and not args.screening else None
+    if token_ledger is not None:
+        cv_count = min(len(sources), args.top_k) if args.top_k else len(sources)
+        preselect_with_mistral = args.embeddings == "mistral" and args.top_k and len(sources) > args.top_k
+        embedding_tokens = estimate_embedding_tokens(job_description, len(sources)) if preselect_with_mistral else 0
+        analyses = not args.screening
+        # En cascade, chaque CV peut coûter deux analyses (petit puis grand modèle)
+        estimate = lambda budget: embedding_tokens + (
+            estimate_batch_tokens(job_description, cv_count, budget, 2 if cascade else 1) if analyses else 0)
+        decision, fitted_budget = fit_batch_to_budget(
+            estimate, args.token_budget, token_ledger.allowance(args.budget_tokens, args.daily_budget_tokens),
+            args.over_budget
+        )
+        if decision == OVER_BUDGET_STOP:
+            log(f"⛔ Lot non lancé : environ {estimate(args.token_budget)} tokens estimés, au-delà du budget")
+            extractor.shutdown()
+            return 2
+        elif decision == OVER_BUDGET_SCREENING:
+            log(f"🪙 Budget dépassé (≈ {estimate(args.token_budget)} tokens) : criblage local sans appel Mistral")
+            args.screening = True
+            args.embeddings = "local"
+            cascade = None
+        elif decision == OVER_BUDGET_REDUCE:
+            log(f"🪙 Budget dépassé : contexte réduit à {fitted_budget} tokens par CV "
+                f"(≈ {estimate(fitted_budget)} tokens pour le lot)")
+            args.token_budget = fitted_budget
+    # Relancer la même commande reprend le lot là où il s'est arrêté
+    journal = BatchJournal(make_batch_id(
+        job_description, [key for key, _ in sources], "criblage" if args.screening else "ia",
+        MISTRAL_MODEL, PROMPT_VERSION, args.token_budget, args.top_k, args.embeddings,
+        cascade.settings() if cascade else None
+    ))
+    batch_usage = None
+    if token_ledger is not None:
+        batch_usage = token_ledger.batch(journal.batch_id, make_offer_id(job_description))
+    talent_pool = None if args.no_pool else TalentPool()
+    pool_pending = talent_pool is not None
+
+    if args.top_k and len(sources) > args.top_k:
+        embedder = MistralEmbedder(client, ledger=batch_usage) if args.embeddings == "mistral" else HashingEmbedder()
+        on_wave = talent_pool.add if talent_pool is not None else None
+        try:
+            sources, rejected = preselect_in_waves(job_description, sources, lambda pair: load(pair[1]),
+                                                   args.top_k, embedder, args.wave_size, on_wave, prefetch)
+        except Exception as e:
+            log(f"⚠️ Embeddings Mistral indisponibles ({str(e)}), utilisation de l'embedder local")
+            sources, rejected = preselect_in_waves(job_description, sources, lambda pair: load(pair[1]),
+                                                   args.top_k, HashingEmbedder(), args.wave_size, on_wave, prefetch)
+        pool_pending = False
+        log(f"🔎 Pré-sélection : {len(sources)} CV retenus, {len(rejected)} écartés")
+
+    # Chaque résultat est ajouté au JSONL dès que son analyse est terminée (les résultats repris d'abord) ;
+    # sa position dans l'entrée départage les scores égaux dans le classement final
+    positions = {key: position for position, (key, _) in enumerate(sources)}
+    spool = ResultSpool(args.output)
+    for position, result in journal.entries():
+        spool.add(result, position)
+    pending = [(key, path) for key, path in sources if key not in journal]
+    done_before = len(sources) - len(pending)
+    if done_before:
+        log(f"♻️ Reprise du lot {journal.batch_id} : {done_before} CV déjà analysés")
+
+    # Mode top-K : les CV partent à l'analyse par pré-score local décroissant, jusqu'à l'arrêt anticipé
+    ranking = None
+    if args.best_k and not args.screening and pending:
+        pending, prescores = prescore_in_waves(job_description, pending, load, args.wave_size,
+                                               talent_pool.add if pool_pending else None, prefetch)
+        pool_pending = False
+        ranking = TopKRanking(args.best_k, prescores, args.prescore_margin)
+        for result in journal.results():
+            ranking.add(result['score'])
+
+    if args.screening:
+        profile = ScreeningProfile(job_description)
+    elif pending:
+        analysis_cache = AnalysisCache()
+        job_requirements = distill_offer(client, job_description, open_offer_cache(), batch_usage)
+
+    for wave in iter_prefetched_waves(pending, args.wave_size, prefetch):
+        if ranking is not None and not ranking.can_enter(wave[0][0]):
+            # Aucun CV restant ne peut entrer dans le top K : les vagues suivantes ne sont pas lues
+            break
+        cv_keys, cv_items = load_keyed_wave(wave, load)
+        if pool_pending:
+            talent_pool.add(cv_items)
+
+        def on_cv_done(idx, analysis, done, sync=True):
+            if analysis:
+                if ranking is not None:
+                    ranking.add(analysis['score'])
+                result = build_result(cv_items[idx][0], analysis)
+                journal.record(cv_keys[idx], result, positions[cv_keys[idx]], sync=sync)
+                spool.add(result, positions[cv_keys[idx]])
+                if 'repli' in analysis:
+                    log(f"↩️ {cv_items[idx][0]} : {analysis['repli']}, analyse rapide gardée")
+            log(f"[{done_before + done}/{len(sources)}] {cv_items[idx][0]}")
+
+        if args.screening:
+            for idx, analysis in enumerate(screen_cvs(job_description, cv_items, profile)):
+                on_cv_done(idx, analysis, idx + 1, sync=False)
+            journal.sync()
+        else:
+            cv_items = [(name, build_cv_context(content, job_requirements, args.token_budget))
+                        for name, content in cv_items]
+            analyze_cvs_concurrently(
+                client, job_requirements, cv_items, args.workers, on_cv_done, analysis_cache,
+                on_error=lambda name, e: log(f"❌ Erreur lors de l'analyse de {name}: {str(e)}"),
+                ledger=batch_usage, cascade=cascade,
+                should_dispatch=(lambda idx: ranking.should_dispatch(cv_keys[idx])) if ranking is not None else None
+            )
+            log(analysis_cache.summary())
+        done_before += len(wave)
+    journal.close()
+    if ranking is not None:
+        # Arrêt anticipé : la vague en cours et la suivante ont pu être lancées par prefetch sans être lues
+        discard_cvs([path for _, path in ranking.skipped(pending)[:2 * args.wave_size]], extractor)
+        # Les CV non évalués restent dans le JSONL, avec leur statut, leur pré-score et leur borne
+        not_evaluated = ranking.not_evaluated([key for key, _ in pending])
+        for entry in not_evaluated:
+            spool.add(entry)
+        if not_evaluated:
+            log(f"🏁 Top {args.best_k} atteint : {len(not_evaluated)} CV non évalués "
+                f"(score envisageable ≤ {ranking.threshold()}%)")
+    spool.close()
+    extractor.shutdown()
+
+    if token_ledger is not None:
+        totals = token_ledger.totals(batch_id=journal.batch_id)
+        log(f"🪙 Lot : {totals['tokens']} tokens ({totals['appels']} appels, {totals['cout']:.2f} $) • "
+            + token_ledger.summary())
+    results = spool.ranked()
+    if args.pdf:
+        write_pdf_report(results, job_description, args.pdf, args.pdf_top or None)
+    log(f"✅ {len(results)} candidats classés en {time.perf_counter() - started:.1f} s → {args.output}"
+        + (f", {args.pdf}" if args.pdf else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
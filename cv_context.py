@@ -0,0 +1,105 @@
+"""
+CHECK CV - Construction du contexte CV sous budget de tokens
+Au lieu de tronquer aveuglément le CV, le texte est découpé en sections et blocs, chaque
+bloc est noté localement par rapport aux exigences du poste, puis les blocs les plus
+pertinents sont assemblés (dans l'ordre du document) jusqu'au budget de tokens.
+"""
+
+import math
+import os
+import re
+from typing import List
+
+from semantic_ranking import HashingEmbedder, cosine_similarities
+
+# Budget par défaut du CV dans un prompt (surchargeable par variable d'environnement)
+DEFAULT_TOKEN_BUDGET = int(os.getenv("CHECKCV_CV_TOKEN_BUDGET", "2000"))
+
+# Estimation grossière du nombre de caractères par token (texte français / anglais)
+CHARS_PER_TOKEN = 3.5
+
+# Marqueur inséré entre deux blocs non contigus du CV
+GAP_MARKER = "[...]"
+
+SECTION_HEADING = re.compile(
+    r"^\s*(exp[ée]riences?|parcours|formations?|[ée]ducation|dipl[ôo]mes?|comp[ée]tences|skills|"
+    r"langues?|languages?|certifications?|projets?|projects?|r[ée]alisations|centres? d'int[ée]r[êe]ts?|"
+    r"loisirs|profil|summary|r[ée]sum[ée]|objectif|work|employment|professional)\b",
+    re.IGNORECASE
+)
+
+_embedder = HashingEmbedder(dim=2048)
+
+def estimate_tokens(text: str) -> int:
+    """Estimation locale du nombre de tokens d'un texte"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _is_heading(line: str) -> bool:
+    stripped = line.strip()
+    if not stripped or len(stripped) > 60:
+        return False
+    return bool(SECTION_HEADING.match(stripped)) or (stripped.isupper() and len(stripped.split()) <= 5)
+
+def split_into_chunks(text: str, max_chunk_tokens: int = 200) -> List[str]:
+    """Découpe un CV en blocs : nouvelle section à chaque titre, blocs bornés à max_chunk_tokens"""
+    max_chars = int(max_chunk_tokens * CHARS_PER_TOKEN)
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+
+    def flush():
+        nonlocal current, size
+        if any(line.strip() for line in current):
+            chunks.append("\n".join(current).strip())
+        current, size = [], 0
+
+    for line in text.splitlines():
+        heading_only = len(current) == 1 and _is_heading(current[0])
+        if _is_heading(line) or (size + len(line) > max_chars and not heading_only):
+            flush()
+        # Une ligne plus longue que le bloc maximal est coupée en morceaux
+        while len(line) > max_chars:
+            cut = line.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            current.append(line[:cut])
+            flush()
+            line = line[cut:].lstrip()
+        current.append(line)
+        size += len(line) + 1
+    flush()
+    return chunks
+
+def build_cv_context(cv_text: str, job_requirements: str, token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """Renvoie le texte du CV réduit aux blocs les plus pertinents dans la limite de token_budget.
+
+    Le premier bloc (identité, contact, titre) est toujours conservé. Un CV qui tient
+    déjà dans le budget est renvoyé tel quel.
+    """
+    if not token_budget or estimate_tokens(cv_text) <= token_budget:
+        return cv_text
+    chunks = split_into_chunks(cv_text)
+    if len(chunks) <= 1:
+        return cv_text[:int(token_budget * CHARS_PER_TOKEN)]
+
+    vectors = _embedder.embed([job_requirements] + chunks)
+    scores = cosine_similarities(vectors[0], vectors[1:])
+    scores[0] = float("inf")
+
+    kept = []
+    used = 0
+    for idx in sorted(range(len(chunks)), key=lambda i: -scores[i]):
+        cost = estimate_tokens(chunks[idx]) + 2
+        if used + cost <= token_budget:
+            kept.append(idx)
+            used += cost
+
+    parts = []
+    previous = -1
+    for idx in sorted(kept):
+        if idx != previous + 1:
+            parts.append(GAP_MARKER)
+        parts.append(chunks[idx])
+        previous = idx
+    if previous != len(chunks) - 1:
+        parts.append(GAP_MARKER)
+    return "\n".join(parts)
@@ -0,0 +1,354 @@
+"""
+CHECK CV - Pipeline d'analyse sans interface
+Synthèse de l'offre, analyse Mistral et résultats : le cœur
+commun à l'application Streamlit (CHeckCV_pro.py) et au traitement par lots (checkcv_batch.py).
+Checkcv.py et HeckCV.py en utilisent la variante asynchrone (une boucle asyncio par vague).
+"""
+
+import asyncio
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from analysis_cache import AnalysisCache, make_analysis_key
+from cv_context import CHARS_PER_TOKEN, estimate_tokens
+from job_distillation import build_distillation_prompt, distill_job_offer
+from json_response import JSON_RESPONSE_FORMAT, decode_analysis, request_analysis, request_analysis_async
+from pipeline_metrics import PipelineMetrics
+from semantic_ranking import MISTRAL_EMBED_MAX_CHARS
+from token_ledger import BatchUsage
+
+# Paramètres des appels Mistral AI
+MISTRAL_MODEL = "mistral-large-latest"
+# Mode cascade : un petit modèle note chaque CV, le grand modèle reprend les meilleurs et les cas limites
+SCREENING_MODEL = os.getenv("CHECKCV_SCREENING_MODEL", "mistral-small-latest")
+DEFAULT_CASCADE_THRESHOLD = int(os.getenv("CHECKCV_CASCADE_THRESHOLD", "60"))
+DEFAULT_CASCADE_BAND = int(os.getenv("CHECKCV_CASCADE_BAND", "10"))
+# Niveau d'analyse enregistré dans chaque résultat
+TIER_SCREENING = "rapide"
+TIER_REFINED = "approfondi"
+TEMPERATURE = 0.3
+MAX_TOKENS = 1500
+# À incrémenter à chaque modification du prompt pour invalider le cache d'analyses
+PROMPT_VERSION = "checkcv-pro-2"
+
+# Estimation du budget d'un lot : tokens de réponse attendus par appel (pas un plafond)
+# et taille supposée d'un CV envoyé en entier (budget de tokens par CV à 0)
+EXPECTED_COMPLETION_TOKENS = 400
+FULL_CV_TOKENS = int(os.getenv("CHECKCV_FULL_CV_TOKENS", "3000"))
+
+ErrorHandler = Callable[[str, Exception], None]
+
+def distill_offer(client, job_description: str, cache: Optional[AnalysisCache] = None,
+                  ledger: Optional[BatchUsage] = None) -> str:
+    """Synthétise l'offre en exigences compactes (un seul appel Mistral par offre)"""
+    def complete(prompt: str) -> str:
+        response = client.chat.complete(
+            model=MISTRAL_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0,
+            max_tokens=MAX_TOKENS,
+            response_format=JSON_RESPONSE_FORMAT
+        )
+        if ledger is not None:
+            ledger.record(MISTRAL_MODEL, response, kind="synthese")
+        return response.choices[0].message.content
+
+    return distill_job_offer(complete, job_description, MISTRAL_MODEL, cache)
+
+def build_analysis_prompt(job_description: str, cv_content: str, cv_name: str) -> str:
+    """Construit le prompt d'analyse d'un CV"""
+    return f"""Tu es un expert en recrutement. Analyse ce CV par rapport à l'offre d'emploi et réponds UNIQUEMENT avec un JSON valide (sans markdown, sans backticks).
+
+Exigences du poste (synthèse de l'offre d'emploi):
+{job_description}
+
+CV du candidat ({cv_name}):
+{cv_content}
+
+Analyse le CV et fournis:
+1. Le NOM et PRÉNOM complet du candidat (extrait du CV)
+2. Un score de 0 à 100 représentant l'adéquation du candidat avec le poste
+3. 3 à 5 points forts du candidat
+4. 3 à 5 points à améliorer
+5. 3 à 5 recommandations concrètes pour améliorer le CV
+
+Format de réponse (JSON strict, sans texte avant ou après):
+{{
+  "nom_complet": "Prénom NOM du candidat",
+  "score": <nombre entre 0 et 100>,
+  "points_forts": ["point1", "point2", "point3"],
+  "points_amelioration": ["point1", "point2", "point3"],
+  "recommandations": ["rec1", "rec2", "rec3"]
+}}"""
+
+def estimate_batch_tokens(job_description: str, cv_count: int, cv_token_budget: int,
+                          calls_per_cv: int = 1) -> int:
+    """Estimation locale des tokens d'un lot : synthèse de l'offre puis calls_per_cv analyses par CV
+    (2 en mode cascade, si tous les CV étaient repris par le grand modèle).
+
+    L'offre complète majore sa synthèse ; le contexte de chaque CV est borné par cv_token_budget.
+    Les analyses déjà en cache sont comptées : l'estimation est pessimiste.
+    """
+    distillation = estimate_tokens(build_distillation_prompt(job_description)) + EXPECTED_COMPLETION_TOKENS
+    per_cv = (estimate_tokens(build_analysis_prompt(job_description, "", "")) + (cv_token_budget or FULL_CV_TOKENS)
+              + EXPECTED_COMPLETION_TOKENS)
+    return distillation + cv_count * calls_per_cv * per_cv
+
+def estimate_embedding_tokens(job_description: str, cv_count: int,
+                              max_chars: int = MISTRAL_EMBED_MAX_CHARS) -> int:
+    """Estimation locale des tokens d'une pré-sélection par embeddings Mistral : l'offre puis chaque CV,
+    tronqués à max_chars caractères (un CV est compté pour FULL_CV_TOKENS au plus)"""
+    per_cv = min(FULL_CV_TOKENS, int(max_chars / CHARS_PER_TOKEN))
+    return estimate_tokens(job_description[:max_chars]) + cv_count * per_cv
+
+def analyze_cv(client, job_description: str, cv_content: str, cv_name: str,
+               cache: Optional[AnalysisCache] = None, on_error: Optional[ErrorHandler] = None,
+               metrics: Optional[PipelineMetrics] = None, ledger: Optional[BatchUsage] = None,
+               model: str = MISTRAL_MODEL) -> Optional[Dict]:
+    """Analyse un CV avec Mistral AI (ou le renvoie depuis le cache).
+
+    En cas d'erreur d'appel ou de réponse irréparable même après relance, on_error(nom du CV,
+    exception) est appelé et None est renvoyé : aucune analyse n'est inventée. Seules les
+    réponses lues sans réparation sont mises en cache.
+    metrics reçoit la taille du prompt, la durée de l'appel, les tokens facturés et le temps de parsing ;
+    ledger enregistre les tokens facturés dans le registre de consommation.
+    """
+    cache_key = make_analysis_key(job_description, cv_content, model, PROMPT_VERSION, TEMPERATURE)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    metrics = metrics if metrics is not None else PipelineMetrics()
+    prompt = build_analysis_prompt(job_description, cv_content, cv_name)
+    metrics.record("prompt_caracteres", len(prompt), cv_name)
+    metrics.record("prompt_tokens", estimate_tokens(prompt), cv_name)
+
+    def complete(messages: List[Dict]) -> str:
+        with metrics.timer("llm_ms", cv_name):
+            response = client.chat.complete(model=model, messages=messages, temperature=TEMPERATURE,
+                                            max_tokens=MAX_TOKENS, response_format=JSON_RESPONSE_FORMAT)
+        return read_analysis_response(response, model, cv_name, metrics, ledger)
+
+    repaired = False
+
+    def parse(content: str) -> Dict:
+        nonlocal repaired
+        with metrics.timer("parsing_ms", cv_name):
+            analysis, repaired = decode_analysis(content)
+            return analysis
+
+    try:
+        # Réponse réparée localement si besoin ; une seule relance ciblée si elle est irréparable
+        analysis = request_analysis(complete, prompt, parse)
+    except Exception as e:
+        if on_error:
+            on_error(cv_name, e)
+        return None
+    # Une analyse réparée (réponse tronquée ou mal formée) est utilisée, mais jamais mise en cache
+    if cache is not None and not repaired:
+        cache.put(cache_key, analysis)
+    return analysis
+
+def read_analysis_response(response, model: str, cv_name: str, metrics: PipelineMetrics,
+                           ledger: Optional[BatchUsage] = None) -> str:
+    """Enregistre les tokens facturés d'une réponse d'analyse et renvoie son texte"""
+    if ledger is not None:
+        ledger.record(model, response)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.record("tokens_entree", getattr(usage, "prompt_tokens", 0) or 0, cv_name)
+        metrics.record("tokens_sortie", getattr(usage, "completion_tokens", 0) or 0, cv_name)
+    return response.choices[0].message.content
+
+async def analyze_cv_async(client, job_description: str, cv_content: str, cv_name: str,
+                           cache: Optional[AnalysisCache] = None, on_error: Optional[ErrorHandler] = None,
+                           metrics: Optional[PipelineMetrics] = None, ledger: Optional[BatchUsage] = None,
+                           model: str = MISTRAL_MODEL) -> Optional[Dict]:
+    """Comme analyze_cv, avec le client asynchrone (chat.complete_async) : même prompt, même cache"""
+    cache_key = make_analysis_key(job_description, cv_content, model, PROMPT_VERSION, TEMPERATURE)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    metrics = metrics if metrics is not None else PipelineMetrics()
+    prompt = build_analysis_prompt(job_description, cv_content, cv_name)
+    metrics.record("prompt_caracteres", len(prompt), cv_name)
+    metrics.record("prompt_tokens", estimate_tokens(prompt), cv_name)
+
+    async def complete(messages: List[Dict]) -> str:
+        with metrics.timer("llm_ms", cv_name):
+            response = await client.chat.complete_async(model=model, messages=messages, temperature=TEMPERATURE,
+                                                        max_tokens=MAX_TOKENS, response_format=JSON_RESPONSE_FORMAT)
+        return read_analysis_response(response, model, cv_name, metrics, ledger)
+
+    repaired = False
+
+    def parse(content: str) -> Dict:
+        nonlocal repaired
+        with metrics.timer("parsing_ms", cv_name):
+            analysis, repaired = decode_analysis(content)
+            return analysis
+
+    try:
+        analysis = await request_analysis_async(complete, prompt, parse)
+    except Exception as e:
+        if on_error:
+            on_error(cv_name, e)
+        return None
+    if cache is not None and not repaired:
+        cache.put(cache_key, analysis)
+    return analysis
+
+def analyze_cvs_async(client, job_description: str, cv_items: List[Tuple[str, str]], max_concurrency: int,
+                      on_done: Optional[Callable[[int, Optional[Dict], int], None]] = None,
+                      cache: Optional[AnalysisCache] = None, on_error: Optional[ErrorHandler] = None,
+                      metrics: Optional[PipelineMetrics] = None,
+                      ledger: Optional[BatchUsage] = None) -> List[Optional[Dict]]:
+    """Analyse une vague de CV dans une seule boucle asyncio, sans thread d'analyse.
+
+    Une boucle par appel (asyncio.run) : au plus max_concurrency requêtes sont en vol, toutes
+    pilotées depuis le thread appelant, où on_done(index, analyse, nb_terminés) et on_error
+    sont aussi appelés. Les analyses sont renvoyées dans l'ordre d'entrée. Avec un
+    RateLimitedClient, les connexions HTTP de la boucle sont fermées avant sa fin.
+    """
+    async def run_wave() -> List[Optional[Dict]]:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def analyze_one(idx: int, name: str, content: str) -> Tuple[int, Optional[Dict]]:
+            async with semaphore:
+                return idx, await analyze_cv_async(client, job_description, content, name, cache, on_error,
+                                                   metrics, ledger)
+
+        analyses: List[Optional[Dict]] = [None] * len(cv_items)
+        try:
+            tasks = [analyze_one(idx, name, content) for idx, (name, content) in enumerate(cv_items)]
+            for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+                idx, analyses[idx] = await task
+                if on_done:
+                    on_done(idx, analyses[idx], done)
+        finally:
+            close_loop = getattr(client, "close_loop", None)
+            if close_loop is not None:
+                await close_loop()
+        return analyses
+
+    return asyncio.run(run_wave())
+
+class CascadePolicy:
+    """Réglages du mode cascade : un CV noté au moins threshold - band par le petit modèle
+    (au-dessus du seuil ou dans la zone limite) est repris par le grand modèle"""
+
+    def __init__(self, threshold: int = DEFAULT_CASCADE_THRESHOLD, band: int = DEFAULT_CASCADE_BAND,
+                 screening_model: str = SCREENING_MODEL, refine_model: str = MISTRAL_MODEL):
+        self.threshold = threshold
+        self.band = band
+        self.screening_model = screening_model
+        self.refine_model = refine_model
+
+    def needs_refinement(self, score: float) -> bool:
+        return score >= self.threshold - self.band
+
+    def settings(self) -> Tuple:
+        """Réglages qui changent les résultats (pour l'ID du lot)"""
+        return (self.screening_model, self.refine_model, self.threshold, self.band)
+
+def analyze_cv_cascade(client, job_description: str, cv_content: str, cv_name: str,
+                       cache: Optional[AnalysisCache] = None, on_error: Optional[ErrorHandler] = None,
+                       metrics: Optional[PipelineMetrics] = None, ledger: Optional[BatchUsage] = None,
+                       policy: Optional[CascadePolicy] = None) -> Optional[Dict]:
+    """Analyse en deux temps : le petit modèle note le CV, le grand modèle le reprend si besoin.
+
+    L'analyse renvoyée porte son niveau ("niveau", "modele") et, si elle a été reprise, le
+    score du petit modèle ("score_rapide"). Seul l'échec de l'analyse rapide passe par on_error :
+    si la reprise échoue, l'analyse rapide est gardée et la cause du repli est notée dans "repli".
+    """
+    policy = policy or CascadePolicy()
+    screening = analyze_cv(client, job_description, cv_content, cv_name, cache, on_error, metrics, ledger,
+                           model=policy.screening_model)
+    if screening is None:
+        return None
+    screening = dict(screening, niveau=TIER_SCREENING, modele=policy.screening_model)
+    if not policy.needs_refinement(screening['score']):
+        return screening
+    refine_errors = []
+    refined = analyze_cv(client, job_description, cv_content, cv_name, cache,
+                         lambda name, e: refine_errors.append(e), metrics, ledger, model=policy.refine_model)
+    if refined is None:
+        reason = str(refine_errors[0]) if refine_errors else "analyse indisponible"
+        return dict(screening, repli=f"reprise par {policy.refine_model} en échec : {reason}")
+    return dict(refined, niveau=TIER_REFINED, modele=policy.refine_model, score_rapide=screening['score'])
+
+def analyze_cvs_concurrently(client, job_description: str, cv_items: List[Tuple[str, str]], max_workers: int,
+                             on_done: Optional[Callable[[int, Optional[Dict], int], None]] = None,
+                             cache: Optional[AnalysisCache] = None, on_error: Optional[ErrorHandler] = None,
+                             initializer: Optional[Callable[[], None]] = None,
+                             metrics: Optional[PipelineMetrics] = None,
+                             ledger: Optional[BatchUsage] = None,
+                             cascade: Optional[CascadePolicy] = None,
+                             should_dispatch: Optional[Callable[[int], bool]] = None) -> List[Optional[Dict]]:
+    """Analyse plusieurs CV en gardant au plus max_workers requêtes Mistral en vol.
+
+    cv_items est une liste de tuples (nom du fichier, contenu). Le résultat est
+    renvoyé dans l'ordre d'entrée ; on_done(index, analyse, nb_terminés) est appelé
+    dans le thread appelant à chaque CV terminé. Avec cascade, chaque CV passe par
+    analyze_cv_cascade.
+
+    Avec should_dispatch, les CV sont envoyés dans l'ordre, au fil des analyses terminées :
+    should_dispatch(index) est appelé dans le thread appelant avant chaque envoi, et un refus
+    arrête l'envoi des CV suivants (leur analyse reste à None).
+    """
+    analyses: List[Optional[Dict]] = [None] * len(cv_items)
+    # Sans should_dispatch, tous les CV sont soumis d'emblée au pool
+    window = max_workers if should_dispatch else len(cv_items)
+    next_idx = 0
+    stopped = False
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=initializer) as executor:
+        if cascade:
+            analyze = partial(analyze_cv_cascade, policy=cascade)
+        else:
+            analyze = analyze_cv
+        futures = {}
+
+        def dispatch() -> None:
+            nonlocal next_idx, stopped
+            while not stopped and next_idx < len(cv_items) and len(futures) < window:
+                if should_dispatch and not should_dispatch(next_idx):
+                    stopped = True
+                    return
+                name, content = cv_items[next_idx]
+                futures[executor.submit(analyze, client, job_description, content, name, cache, on_error, metrics,
+                                        ledger)] = next_idx
+                next_idx += 1
+
+        dispatch()
+        done = 0
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                idx = futures.pop(future)
+                analyses[idx] = future.result()
+                done += 1
+                if on_done:
+                    on_done(idx, analyses[idx], done)
+            dispatch()
+    return analyses
+
+def build_result(filename: str, analysis: Dict) -> Dict:
+    """Construit l'entrée de résultat d'un candidat à partir de son analyse"""
+    result = {
+        'filename': filename,
+        'nom_complet': analysis['nom_complet'],
+        'score': analysis['score'],
+        'points_forts': analysis['points_forts'],
+        'points_amelioration': analysis['points_amelioration'],
+        'recommandations': analysis['recommandations']
+    }
+    # Mode cascade : niveau d'analyse et modèle qui ont produit le résultat (et cause d'un repli sur l'analyse rapide)
+    for key in ('niveau', 'modele', 'score_rapide', 'repli'):
+        if key in analysis:
+            result[key] = analysis[key]
+    return result
@@ -0,0 +1,103 @@
+"""
+CHECK CV - Cache persistant des textes extraits
+Le texte extrait d'un fichier est indexé par le SHA-256 de ses octets et la version
+de l'extracteur : un LRU en mémoire est placé devant une base SQLite locale.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from analysis_cache import CACHE_DIR
+
+def make_extraction_key(data: bytes, extractor_version: str) -> str:
+    """Calcule la clé de cache d'un fichier pour une version d'extracteur donnée"""
+    return f"{hashlib.sha256(data).hexdigest()}:{extractor_version}"
+
+class ExtractionCache:
+    """Cache à deux niveaux (LRU mémoire + SQLite) des textes extraits, partagé entre threads"""
+
+    def __init__(self, path: Optional[str] = None, memory_size: int = 256, max_entries: int = 50000):
+        self.path = path or os.path.join(CACHE_DIR, "extractions.sqlite3")
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS extractions (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    def _remember(self, key: str, text: str) -> None:
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, data: bytes, extractor_version: str) -> Optional[str]:
+        """Renvoie le texte déjà extrait de ces octets, ou None"""
+        key = make_extraction_key(data, extractor_version)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            row = self._conn.execute("SELECT text FROM extractions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE extractions SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self._remember(key, row[0])
+            self.hits += 1
+        return row[0]
+
+    def contains(self, data: bytes, extractor_version: str) -> bool:
+        """Vrai si le texte de ces octets est en cache (sans compter de hit ni de miss)"""
+        key = make_extraction_key(data, extractor_version)
+        with self._lock:
+            if key in self._memory:
+                return True
+            return self._conn.execute("SELECT 1 FROM extractions WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, data: bytes, extractor_version: str, text: str) -> None:
+        """Enregistre le texte extrait de ces octets"""
+        key = make_extraction_key(data, extractor_version)
+        with self._lock:
+            self._remember(key, text)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, text, accessed_at) VALUES (?, ?, ?)",
+                (key, text, time.time())
+            )
+            self._writes += 1
+            if self._writes % 500 == 0:
+                self._conn.execute(
+                    "DELETE FROM extractions WHERE key NOT IN "
+                    "(SELECT key FROM extractions ORDER BY accessed_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def get_or_extract(self, data: bytes, extractor_version: str, extract: Callable[[bytes], str]) -> str:
+        """Renvoie le texte en cache ou l'extrait avec extract(data) puis le mémorise"""
+        text = self.get(data, extractor_version)
+        if text is None:
+            text = extract(data)
+            self.put(data, extractor_version, text)
+        return text
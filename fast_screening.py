@@ -0,0 +1,248 @@
+"""
+CHECK CV - Criblage rapide sans LLM
+Les compétences et mots-clés sont extraits de l'offre puis recherchés dans chaque CV en
+une seule passe par un automate d'Aho-Corasick sur les mots (accents et synonymes
+normalisés). Le résultat a la même forme que l'analyse Mistral (score, points_forts, ...).
+"""
+
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from semantic_ranking import STOPWORDS
+
+# Compétences connues : forme canonique -> variantes (synonymes, traductions, abréviations).
+# Seules les variantes sont recherchées : pas de mot courant isolé (« vue », « tableau », « node »,
+# « go »...), qui ferait d'une phrase ordinaire de l'offre une compétence, mais des formes
+# composées ou avec leur contexte (« vue.js », « power bi », « spring boot »).
+SKILL_SYNONYMS = {
+    "Python": ["python", "python3"],
+    "Java": ["java", "j2ee", "jee"],
+    "JavaScript": ["javascript", "js", "ecmascript"],
+    "TypeScript": ["typescript"],
+    "C++": ["c++", "cpp"],
+    "C#": ["c#", "csharp", ".net", "dotnet", "asp.net"],
+    "PHP": ["php", "symfony", "laravel"],
+    "Go": ["golang"],
+    "Rust": ["rust"],
+    "SQL": ["sql", "mysql", "postgresql", "postgres", "oracle", "sql server", "mariadb", "sqlite"],
+    "NoSQL": ["nosql", "mongodb", "cassandra", "redis", "elasticsearch"],
+    "React": ["react", "reactjs", "react.js"],
+    "Angular": ["angular", "angularjs"],
+    "Vue.js": ["vuejs", "vue.js"],
+    "Node.js": ["nodejs", "node.js"],
+    "Django": ["django"],
+    "Flask": ["flask"],
+    "FastAPI": ["fastapi"],
+    "Spring": ["spring boot", "springboot", "spring framework", "spring mvc"],
+    "HTML/CSS": ["html/css", "html", "css", "html5", "css3", "sass"],
+    "Docker": ["docker", "conteneurisation", "containerisation", "containers"],
+    "Kubernetes": ["kubernetes", "k8s", "openshift"],
+    "AWS": ["aws", "amazon web services"],
+    "Azure": ["azure", "microsoft azure"],
+    "GCP": ["gcp", "google cloud"],
+    "Cloud": ["cloud", "cloud computing"],
+    "DevOps": ["devops", "ci/cd", "ci cd", "integration continue", "jenkins", "gitlab ci", "github actions"],
+    "Git": ["git", "github", "gitlab"],
+    "Linux": ["linux", "unix", "bash", "shell script", "scripts shell", "scripting shell"],
+    "Machine Learning": ["machine learning", "apprentissage automatique", "scikit-learn", "sklearn"],
+    "Deep Learning": ["deep learning", "apprentissage profond", "tensorflow", "pytorch", "keras"],
+    "Intelligence artificielle": ["intelligence artificielle", "artificial intelligence", "ia", "llm", "nlp"],
+    "Data Science": ["data science", "science des donnees", "data scientist"],
+    "Data Engineering": ["data engineering", "data engineer", "etl", "spark", "hadoop", "airflow", "kafka"],
+    "Business Intelligence": ["business intelligence", "power bi", "powerbi", "tableau software", "tableau desktop",
+                              "qlik", "qlikview", "looker"],
+    "Statistiques": ["statistiques", "statistics", "statistique", "econometrie"],
+    "Excel": ["excel", "vba", "tableur"],
+    "SAP": ["sap"],
+    "Salesforce": ["salesforce", "crm"],
+    "Gestion de projet": ["gestion de projet", "project management", "chef de projet", "project manager", "pmp", "prince2"],
+    "Méthodes agiles": ["methodes agiles", "agile", "agilite", "scrum", "kanban", "scrum master"],
+    "Management": ["management", "manager", "encadrement", "gestion d'equipe", "team lead", "leadership"],
+    "Communication": ["communication", "relationnel", "presentation orale"],
+    "Marketing digital": ["marketing digital", "digital marketing", "seo", "growth hacking", "google ads"],
+    "Vente": ["vente", "ingenieur commercial", "technico commercial", "business development", "prospection", "sales"],
+    "Comptabilité": ["comptabilite", "accounting", "comptable", "ifrs", "fiscalite"],
+    "Finance": ["finance", "controle de gestion", "audit", "analyse financiere"],
+    "Ressources humaines": ["ressources humaines", "rh", "human resources", "recrutement", "paie"],
+    "Cybersécurité": ["cybersecurite", "cybersecurity", "securite informatique", "pentest", "iso 27001"],
+    "Réseaux": ["reseaux", "networking", "tcp/ip", "cisco"],
+    "UX/UI": ["ux/ui", "ux", "ui", "figma", "design d'interface", "ergonomie"],
+    "Anglais": ["anglais", "english", "toeic", "toefl", "bilingue"],
+    "Français": ["francais", "french"],
+    "Espagnol": ["espagnol", "spanish"],
+    "Allemand": ["allemand", "german"],
+}
+
+# Indices qu'une exigence de l'offre est souhaitée plutôt qu'obligatoire
+OPTIONAL_MARKERS = re.compile(r"souhait|apprecie|un plus|ideal|serait|bonus|nice to have|preferred|atout")
+
+# Mots fréquents des offres qui ne sont pas des critères
+JOB_STOPWORDS = STOPWORDS | frozenset("""
+poste profil candidat candidate mission missions entreprise societe equipe equipes travail
+experience experiences competences competence connaissance connaissances capacite capacites
+maitrise bonne bonnes tres plus etc ans annee annees niveau sein cadre afin ainsi egalement
+nous vous votre notre offre recherche recherchons cdi cdd stage temps plein job will work team
+requis requise requises serait courant courante maitrisant maitriser souhaite souhaitee apprecie
+idealement minimum obligatoire indispensable aujourd
+""".split())
+
+# Mots qui ne font jamais partie d'un nom de candidat
+NAME_EXCLUSIONS = frozenset(["curriculum", "vitae", "cv", "resume", "contact", "adresse", "email", "telephone"])
+
+# Mots : « / » et l'apostrophe séparent (« Python/Django », « SQL/NoSQL »), « + », « # » et le point
+# restent dans le mot (« c++ », « c# », « node.js », « .net »)
+TOKEN_PATTERN = re.compile(r"\.?[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9+#]+")
+
+# Élisions françaises retirées avant le découpage (« l'anglais », « d'Excel », « qu'un »)
+ELISION_PATTERN = re.compile(r"\b(?:[cdjlmnst]|qu|jusqu|lorsqu|puisqu)'")
+
+def normalize(text: str) -> str:
+    """Minuscules, sans accents (décomposition Unicode), apostrophes typographiques remplacées par « ' »"""
+    text = text.lower().replace("\u2019", "'").replace("\u2018", "'")
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte normalisé en mots, sans les élisions"""
+    return TOKEN_PATTERN.findall(ELISION_PATTERN.sub(" ", normalize(text)))
+
+class AhoCorasick:
+    """Automate d'Aho-Corasick dont l'alphabet est le mot : une passe sur le texte trouve
+    toutes les expressions (une ou plusieurs mots) d'un dictionnaire, aux frontières de mots."""
+
+    def __init__(self, patterns: Iterable[Tuple[str, str]]):
+        # patterns : (expression, étiquette) ; plusieurs expressions peuvent partager une étiquette
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for expression, label in patterns:
+            words = tokenize(expression)
+            if not words:
+                continue
+            state = 0
+            for word in words:
+                nxt = self._goto[state].get(word)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][word] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            if label not in self._out[state]:
+                self._out[state].append(label)
+
+        # Liens d'échec par parcours en largeur
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for word, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._goto[fallback].get(word, 0)
+                self._fail[nxt] = candidate if candidate != nxt else 0
+                self._out[nxt] = self._out[nxt] + [l for l in self._out[self._fail[nxt]] if l not in self._out[nxt]]
+
+    def find_tokens(self, tokens: Iterable[str]) -> Counter:
+        """Compte les étiquettes trouvées dans une suite de mots déjà normalisés"""
+        found: Counter = Counter()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for word in tokens:
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def find(self, text: str) -> Counter:
+        """Compte les étiquettes trouvées dans un texte brut"""
+        return self.find_tokens(tokenize(text))
+
+# Toutes les variantes connues, normalisées
+_ALL_VARIANTS = frozenset(normalize(v) for variants in SKILL_SYNONYMS.values() for v in variants)
+
+# Automate de toutes les compétences connues, utilisé pour lire l'offre
+_SKILLS_AUTOMATON = AhoCorasick(
+    (variant, skill) for skill, variants in SKILL_SYNONYMS.items() for variant in variants
+)
+
+class ScreeningProfile:
+    """Critères extraits d'une offre : compétences obligatoires, souhaitées et mots-clés"""
+
+    def __init__(self, job_text: str, max_keywords: int = 15):
+        self.required: List[str] = []
+        self.desired: List[str] = []
+        for line in job_text.splitlines():
+            optional = bool(OPTIONAL_MARKERS.search(normalize(line)))
+            for skill in _SKILLS_AUTOMATON.find(line):
+                if optional and skill not in self.required and skill not in self.desired:
+                    self.desired.append(skill)
+                elif not optional and skill not in self.required:
+                    self.required.append(skill)
+                    if skill in self.desired:
+                        self.desired.remove(skill)
+
+        # Mots-clés fréquents de l'offre qui ne sont pas déjà couverts par une compétence
+        covered = {tokenize(v)[0] for s in self.required + self.desired for v in SKILL_SYNONYMS[s] if tokenize(v)}
+        counts = Counter(
+            w for w in tokenize(job_text)
+            if len(w) > 3 and w not in JOB_STOPWORDS and w not in covered and not w.isdigit()
+        )
+        self.keywords = [w for w, _ in counts.most_common(max_keywords)]
+
+        patterns = [(v, s) for s in self.required + self.desired for v in SKILL_SYNONYMS[s]]
+        patterns += [(w, f"mot:{w}") for w in self.keywords]
+        self.automaton = AhoCorasick(patterns)
+
+def guess_candidate_name(cv_text: str) -> str:
+    """Devine le nom du candidat dans les premières lignes du CV"""
+    for line in [l.strip() for l in cv_text.splitlines() if l.strip()][:6]:
+        words = line.replace(",", " ").split()
+        if 2 <= len(words) <= 4 and all(re.fullmatch(r"[^\W\d_](?:[^\W\d_]|['\-.])*", w) and w[0].isupper() for w in words):
+            normalized = [normalize(w) for w in words]
+            if not any(w in JOB_STOPWORDS or w in _ALL_VARIANTS or w in NAME_EXCLUSIONS for w in normalized):
+                return line
+    return "Nom non trouvé"
+
+def screen_cv(profile: ScreeningProfile, cv_text: str) -> Dict:
+    """Note un CV localement contre le profil de l'offre (même forme que l'analyse Mistral)"""
+    found = profile.automaton.find(cv_text)
+    required_hits = [s for s in profile.required if s in found]
+    desired_hits = [s for s in profile.desired if s in found]
+    keyword_hits = [w for w in profile.keywords if f"mot:{w}" in found]
+
+    # Pondération : obligatoire 3, souhaitée 1.5, mot-clé 0.5
+    total = 3 * len(profile.required) + 1.5 * len(profile.desired) + 0.5 * len(profile.keywords)
+    obtained = 3 * len(required_hits) + 1.5 * len(desired_hits) + 0.5 * len(keyword_hits)
+    score = round(100 * obtained / total) if total else 0
+
+    missing_required = [s for s in profile.required if s not in found]
+    missing_desired = [s for s in profile.desired if s not in found]
+
+    points_forts = [f"Compétence requise présente : {s}" for s in required_hits]
+    points_forts += [f"Compétence appréciée présente : {s}" for s in desired_hits]
+    if keyword_hits:
+        points_forts.append("Mots-clés de l'offre retrouvés : " + ", ".join(keyword_hits[:8]))
+    points_amelioration = [f"Compétence requise absente du CV : {s}" for s in missing_required]
+    points_amelioration += [f"Compétence appréciée absente du CV : {s}" for s in missing_desired]
+    recommandations = [f"Mettre en évidence une expérience concrète en {s} si elle existe" for s in missing_required[:3]]
+    if not recommandations and missing_desired:
+        recommandations.append(f"Valoriser une éventuelle pratique de {missing_desired[0]}")
+    recommandations.append("Résultat de criblage automatique : à confirmer par une analyse IA ou un entretien")
+
+    return {
+        "nom_complet": guess_candidate_name(cv_text),
+        "score": score,
+        "points_forts": points_forts or ["Aucune compétence clé de l'offre détectée"],
+        "points_amelioration": points_amelioration or ["Toutes les compétences clés de l'offre sont présentes"],
+        "recommandations": recommandations
+    }
+
+def screen_cvs(job_text: str, cv_items: List[Tuple[str, str]], profile: Optional[ScreeningProfile] = None) -> List[Dict]:
+    """Crible un lot de CV (nom du fichier, texte) et renvoie les analyses dans l'ordre d'entrée"""
+    profile = profile or ScreeningProfile(job_text)
+    return [screen_cv(profile, content) for _, content in cv_items]
@@ -0,0 +1,99 @@
+"""
+CHECK CV - Synthèse de l'offre d'emploi
+L'offre est résumée une seule fois par lot en une liste compacte d'exigences (un appel LLM,
+mis en cache par empreinte de l'offre) ; cette forme compacte remplace le texte brut
+dans chaque prompt d'analyse de CV.
+"""
+
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Optional, Tuple
+
+from analysis_cache import CACHE_DIR, AnalysisCache, normalize_text
+from json_response import decode_json_object
+
+# À incrémenter à chaque modification du prompt de synthèse pour invalider le cache
+DISTILLATION_VERSION = "offre-1"
+
+# Champs de la synthèse et libellés utilisés dans les prompts d'analyse
+REQUIREMENT_FIELDS = [
+    ("intitule", "Poste"),
+    ("competences_obligatoires", "Compétences obligatoires"),
+    ("competences_souhaitees", "Compétences souhaitées"),
+    ("experience", "Expérience"),
+    ("formation", "Formation"),
+    ("langues", "Langues"),
+    ("missions", "Missions principales"),
+    ("autres_criteres", "Autres critères"),
+]
+
+def make_offer_key(job_text: str, model: str) -> str:
+    """Clé de cache d'une offre (texte normalisé, modèle, version du prompt de synthèse)"""
+    payload = json.dumps([normalize_text(job_text), model, DISTILLATION_VERSION], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def build_distillation_prompt(job_text: str) -> str:
+    """Construit le prompt de synthèse de l'offre"""
+    return f"""Tu es un expert en recrutement. Résume cette offre d'emploi en une liste compacte d'exigences et réponds UNIQUEMENT avec un JSON valide (sans markdown, sans backticks).
+N'omets aucune exigence : chaque compétence, diplôme, durée d'expérience, langue ou critère éliminatoire doit apparaître, en quelques mots.
+
+Offre d'emploi:
+{job_text}
+
+Format de réponse (JSON strict, sans texte avant ou après):
+{{
+  "intitule": "intitulé du poste",
+  "competences_obligatoires": ["compétence1", "compétence2"],
+  "competences_souhaitees": ["compétence1", "compétence2"],
+  "experience": "durée et type d'expérience attendus",
+  "formation": "diplôme ou niveau attendu",
+  "langues": ["langue1"],
+  "missions": ["mission1", "mission2"],
+  "autres_criteres": ["critère1"]
+}}"""
+
+def parse_requirements(content: str) -> Tuple[Dict, bool]:
+    """Parse la synthèse JSON renvoyée par le modèle, réparée si besoin : (exigences, réparée).
+    Lève ValueError si elle est invalide."""
+    return decode_json_object(content)
+
+def format_requirements(requirements: Dict) -> str:
+    """Met en forme la synthèse en quelques lignes pour les prompts d'analyse"""
+    lines = []
+    for field, label in REQUIREMENT_FIELDS:
+        value = requirements.get(field)
+        if isinstance(value, list):
+            value = "; ".join(str(v) for v in value if v)
+        if value:
+            lines.append(f"{label} : {value}")
+    return "\n".join(lines)
+
+def distill_job_offer(complete: Callable[[str], str], job_text: str, model: str,
+                      cache: Optional[AnalysisCache] = None) -> str:
+    """Renvoie la forme compacte de l'offre, calculée une seule fois par offre.
+
+    complete(prompt) doit renvoyer le contenu texte de la réponse du modèle. En cas
+    d'échec de la synthèse, le texte brut de l'offre est renvoyé (rien n'est perdu)
+    et rien n'est mis en cache.
+    """
+    key = make_offer_key(job_text, model)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached["compact"]
+    try:
+        requirements, repaired = parse_requirements(complete(build_distillation_prompt(job_text)))
+        compact = format_requirements(requirements)
+    except Exception:
+        return job_text
+    if not compact:
+        return job_text
+    # Une synthèse réparée (réponse tronquée) sert pour ce lot, mais n'est pas mise en cache
+    if cache is not None and not repaired:
+        cache.put(key, {"requirements": requirements, "compact": compact})
+    return compact
+
+def open_offer_cache() -> AnalysisCache:
+    """Cache persistant des synthèses d'offres (séparé de celui des analyses de CV)"""
+    return AnalysisCache(os.path.join(CACHE_DIR, "offres.sqlite3"))
@@ -0,0 +1,178 @@
+"""
+CHECK CV - Réponses JSON du modèle
+Les requêtes demandent le format de réponse JSON de l'API ; la réponse est ensuite lue
+par un parseur tolérant (balises Markdown, texte autour, virgules finales, réponse coupée
+à max_tokens) puis validée par rapport au schéma de l'analyse. Seule une réponse
+irréparable ou incomplète déclenche une relance ciblée : jamais de score inventé. Une réponse
+réparée est utilisable mais n'est jamais mise en cache.
+"""
+
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+# Format de réponse JSON de l'API chat de Mistral
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+# Champs de liste d'une analyse de CV
+ANALYSIS_LIST_FIELDS = ("points_forts", "points_amelioration", "recommandations")
+
+REASK_PROMPT = """Ta réponse précédente est inutilisable ({error}).
+Renvoie UNIQUEMENT l'objet JSON complet demandé, sans texte autour, avec les clés "nom_complet",
+"score" (entier de 0 à 100), "points_forts", "points_amelioration" et "recommandations" (listes de
+phrases courtes, pour rester dans la limite de longueur)."""
+
+_DANGLING_KEY = re.compile(r'"(?:[^"\\]|\\.)*"\s*:\s*$')
+_OBJECT_KEY = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*$')
+_PARTIAL_SCALAR = re.compile(r'([:\[,])\s*(?:-?[\d.eE+-]+|t|tr|tru|true|f|fa|fal|fals|false|n|nu|nul|null)$')
+_SCORE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*(?:%|/\s*100)?\s*$")
+
+class ResponseParseError(ValueError):
+    """Réponse du modèle illisible ou non conforme, même après réparation"""
+
+def repair_json(text: str) -> str:
+    """Répare localement un objet JSON : texte autour, virgules finales, sauts de ligne bruts
+    dans les chaînes, réponse tronquée (le dernier élément incomplet est retiré, puis les
+    chaînes, tableaux et objets ouverts sont refermés)."""
+    start = text.find("{")
+    if start < 0:
+        return text
+    out: List[str] = []
+    closers: List[str] = []
+    in_string = escaped = False
+    string_start = 0
+    for char in text[start:]:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            out.append(char)
+            continue
+        if char == '"':
+            in_string = True
+            string_start = len(out)
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]":
+            while out and (out[-1].isspace() or out[-1] == ","):
+                out.pop()
+            if closers:
+                closers.pop()
+            out.append(char)
+            if not closers:
+                # Fin de l'objet : le texte qui suit est ignoré
+                return "".join(out)
+            continue
+        out.append(char)
+
+    # Réponse tronquée : la chaîne en cours et les éléments incomplets sont retirés
+    if in_string:
+        del out[string_start:]
+    repaired = "".join(out).rstrip()
+    if repaired.endswith(","):
+        # Le dernier élément est suivi d'une virgule : il est complet
+        repaired = repaired[:-1]
+    else:
+        # Un nombre ou un littéral en fin de texte a pu être coupé (85 → 8) : il est retiré
+        repaired = _PARTIAL_SCALAR.sub(r"\1", repaired)
+    previous = None
+    while repaired != previous:
+        previous = repaired
+        repaired = _DANGLING_KEY.sub("", repaired).rstrip().rstrip(",").rstrip()
+        if closers and closers[-1] == "}":
+            repaired = _OBJECT_KEY.sub(r"\1", repaired)
+    return repaired + "".join(reversed(closers))
+
+def decode_json_object(content: str) -> Tuple[Dict, bool]:
+    """Lit un objet JSON dans une réponse du modèle, réparé si nécessaire : (objet, réparé).
+    Lève ResponseParseError si la réponse est irréparable."""
+    content = (content or "").strip()
+    repaired = False
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        try:
+            data = json.loads(repair_json(content))
+        except json.JSONDecodeError as e:
+            raise ResponseParseError(f"JSON irréparable : {e.msg}") from e
+        repaired = True
+    if not isinstance(data, dict):
+        raise ResponseParseError("la réponse n'est pas un objet JSON")
+    return data, repaired
+
+def load_json_object(content: str) -> Dict:
+    """Lit un objet JSON dans une réponse du modèle, réparé si nécessaire (lève ResponseParseError)"""
+    return decode_json_object(content)[0]
+
+def _string_list(value: Any) -> List[str]:
+    if isinstance(value, str):
+        value = [value]
+    return [str(item).strip() for item in value if isinstance(item, (str, int, float)) and str(item).strip()]
+
+def validate_analysis(data: Dict) -> Dict:
+    """Valide et normalise une analyse de CV (lève ResponseParseError sans score exploitable
+    ou s'il manque une des listes)"""
+    score = data.get("score")
+    if isinstance(score, str):
+        match = _SCORE.match(score)
+        score = float(match.group(1).replace(",", ".")) if match else None
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        raise ResponseParseError("score absent ou non numérique")
+    name = data.get("nom_complet")
+    analysis = {
+        "nom_complet": name.strip() if isinstance(name, str) and name.strip() else "Nom non trouvé",
+        "score": int(round(min(100, max(0, score))))
+    }
+    for field in ANALYSIS_LIST_FIELDS:
+        value = data.get(field)
+        if not isinstance(value, (list, str)):
+            # Champ perdu par une réponse tronquée : une relance vaut mieux qu'une liste vide
+            raise ResponseParseError(f"champ {field} absent ou invalide")
+        analysis[field] = _string_list(value)
+    return analysis
+
+def decode_analysis(content: str) -> Tuple[Dict, bool]:
+    """Parse et valide la réponse d'analyse d'un CV : (analyse, réparée).
+    Lève ResponseParseError si elle est irréparable ou incomplète."""
+    data, repaired = decode_json_object(content)
+    return validate_analysis(data), repaired
+
+def parse_analysis(content: str) -> Dict:
+    """Parse et valide la réponse d'analyse d'un CV (lève ResponseParseError si irréparable)"""
+    return decode_analysis(content)[0]
+
+def reask_messages(messages: List[Dict], content: str, error: Exception) -> List[Dict]:
+    """Conversation de la relance ciblée : la réponse fautive suivie de la consigne de correction"""
+    return messages + [
+        {"role": "assistant", "content": content or ""},
+        {"role": "user", "content": REASK_PROMPT.format(error=error)}
+    ]
+
+def request_analysis(complete: Callable[[List[Dict]], str], prompt: str,
+                     parse: Callable[[str], Dict] = parse_analysis) -> Dict:
+    """Demande une analyse : complete(messages) renvoie le texte de la réponse.
+
+    Une réponse irréparable est relancée une seule fois ; ResponseParseError est levée
+    si la seconde réponse l'est aussi.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    content = complete(messages)
+    try:
+        return parse(content)
+    except ResponseParseError as e:
+        return parse(complete(reask_messages(messages, content, e)))
+
+async def request_analysis_async(complete: Callable[[List[Dict]], Awaitable[str]], prompt: str,
+                                 parse: Callable[[str], Dict] = parse_analysis) -> Dict:
+    """Comme request_analysis, avec complete(messages) asynchrone"""
+    messages = [{"role": "user", "content": prompt}]
+    content = await complete(messages)
+    try:
+        return parse(content)
+    except ResponseParseError as e:
+        return parse(await complete(reask_messages(messages, content, e)))
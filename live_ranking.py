@@ -0,0 +1,37 @@
+"""
+CHECK CV - Classement incrémental des candidats
+Chaque résultat est inséré à sa place dès qu'il arrive, pour afficher un classement
+toujours trié pendant que le reste du lot est encore en cours d'analyse.
+"""
+
+from bisect import bisect_right
+from typing import Callable, Dict, Iterator, List
+
+class LiveRanking:
+    """Liste de résultats maintenue triée par score décroissant.
+
+    À score égal, le premier arrivé reste devant (comme un tri stable).
+    """
+
+    def __init__(self, key: Callable[[Dict], float] = lambda r: r['score']):
+        self.key = key
+        self._keys: List[float] = []
+        self._results: List[Dict] = []
+
+    def add(self, result: Dict) -> int:
+        """Insère un résultat et renvoie son rang (0 = premier)"""
+        key = -self.key(result)
+        position = bisect_right(self._keys, key)
+        self._keys.insert(position, key)
+        self._results.insert(position, result)
+        return position
+
+    def top(self, n: int) -> List[Dict]:
+        """Les n meilleurs résultats reçus jusqu'ici"""
+        return self._results[:n]
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self._results)
@@ -0,0 +1,270 @@
+"""
+CHECK CV - Client Mistral partagé avec limitation de débit
+Toutes les requêtes passent par un seau à jetons commun (requêtes par seconde et tokens
+par minute). Les réponses 429 et 5xx sont réessayées avec un délai exponentiel aléatoire,
+en respectant l'en-tête Retry-After : les lots concurrents tournent au débit maximal
+soutenable au lieu d'alterner rafales et candidats perdus.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import httpx
+
+from cv_context import estimate_tokens
+
+# Limites par défaut (surchargeables par variables d'environnement, 0 = illimité)
+DEFAULT_REQUESTS_PER_SECOND = float(os.getenv("CHECKCV_MISTRAL_RPS", "5"))
+DEFAULT_TOKENS_PER_MINUTE = float(os.getenv("CHECKCV_MISTRAL_TPM", "500000"))
+DEFAULT_MAX_RETRIES = int(os.getenv("CHECKCV_MISTRAL_MAX_RETRIES", "6"))
+
+# Points d'entrée limités : client >= 1.0 (chat.complete...) et ancien client (chat, embeddings)
+LIMITED_ENDPOINTS = {"chat", "chat.complete", "chat.complete_async", "embeddings", "embeddings.create"}
+
+class RateLimiter:
+    """Double seau à jetons (requêtes/s et tokens/min), partagé entre threads et boucles asyncio.
+
+    reserve() débite immédiatement le seau, quitte à le rendre négatif, et renvoie
+    l'attente nécessaire : les appelants concurrents sont ainsi espacés régulièrement.
+    """
+
+    def __init__(self, requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE):
+        self.requests_per_second = requests_per_second
+        self.tokens_per_second = tokens_per_minute / 60
+        self._requests = max(1.0, requests_per_second)
+        self._tokens = tokens_per_minute
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_second:
+            self._requests = min(max(1.0, self.requests_per_second), self._requests + elapsed * self.requests_per_second)
+        if self.tokens_per_second:
+            self._tokens = min(self.tokens_per_second * 60, self._tokens + elapsed * self.tokens_per_second)
+
+    def reserve(self, tokens: int) -> float:
+        """Réserve une requête de `tokens` tokens et renvoie l'attente (en secondes) avant de l'envoyer"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._blocked_until - now)
+            if self.requests_per_second:
+                self._requests -= 1
+                wait = max(wait, -self._requests / self.requests_per_second)
+            if self.tokens_per_second:
+                # Une requête plus grosse que le seau passe dès que le seau est plein
+                self._tokens -= min(tokens, self.tokens_per_second * 60)
+                wait = max(wait, -self._tokens / self.tokens_per_second)
+            return wait
+
+    def refund(self, tokens: int) -> None:
+        """Rend des tokens réservés mais non consommés (estimation trop haute, requête rejetée)"""
+        if self.tokens_per_second and tokens:
+            with self._lock:
+                self._tokens = min(self.tokens_per_second * 60, self._tokens + tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Suspend toutes les requêtes pendant `seconds` (après un 429)"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+def estimate_request_tokens(kwargs: Dict[str, Any]) -> int:
+    """Estimation locale des tokens d'une requête : messages ou textes à vectoriser, plus max_tokens"""
+    texts = []
+    for message in kwargs.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+        texts.append(content if isinstance(content, str) else str(content or ""))
+    inputs = kwargs.get("inputs", kwargs.get("input"))
+    if isinstance(inputs, str):
+        texts.append(inputs)
+    elif inputs:
+        texts.extend(str(text) for text in inputs)
+    return sum(estimate_tokens(text) for text in texts) + int(kwargs.get("max_tokens") or 0)
+
+def used_tokens(response) -> Optional[int]:
+    """Tokens réellement consommés d'après response.usage, si disponible"""
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+def status_code(error: Exception) -> Optional[int]:
+    """Code HTTP d'une erreur du client Mistral (>= 1.0 : status_code, ancien client : http_status)"""
+    status = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    return int(status) if status else None
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Délai demandé par l'en-tête Retry-After (secondes ou date HTTP), si présent"""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "raw_response", None), "headers", None)
+    value = (headers.get("retry-after") or headers.get("Retry-After")) if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error: Exception) -> bool:
+    """429, erreurs 5xx et coupures réseau sont réessayées ; les autres erreurs remontent"""
+    status = status_code(error)
+    if status is not None:
+        return status == 429 or 500 <= status < 600
+    return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in (
+        "ConnectError", "ConnectTimeout", "ReadTimeout", "RemoteProtocolError", "NoResponseError"
+    )
+
+class RateLimitedClient:
+    """Enveloppe d'un client Mistral : mêmes appels, mais limités en débit et réessayés.
+
+    Les attributs non concernés sont transmis tels quels au client d'origine.
+    """
+
+    def __init__(self, client, limiter: Optional[RateLimiter] = None, max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self._client = client
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def __getattr__(self, name: str):
+        return _limited(getattr(self._client, name), name, self)
+
+    def _backoff(self, error: Exception, attempt: int) -> Optional[float]:
+        """Délai avant la prochaine tentative, ou None si l'erreur ne doit pas être réessayée"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        self.retries += 1
+        delay = retry_after(error)
+        if delay is None:
+            # Délai exponentiel avec gigue (entre la moitié et la totalité du plafond courant)
+            ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay = random.uniform(ceiling / 2, ceiling)
+        if status_code(error) == 429:
+            # Le quota est commun : tous les appels en cours attendent, pas seulement celui-ci
+            self.limiter.pause(delay)
+        return delay
+
+    def call(self, func, args, kwargs):
+        cost = estimate_request_tokens(kwargs)
+        attempt = 0
+        while True:
+            time.sleep(self.limiter.reserve(cost))
+            try:
+                response = func(*args, **kwargs)
+            except Exception as e:
+                self.limiter.refund(cost)
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            used = used_tokens(response)
+            if used is not None:
+                self.limiter.refund(cost - used)
+            return response
+
+    async def call_async(self, func, args, kwargs):
+        cost = estimate_request_tokens(kwargs)
+        attempt = 0
+        while True:
+            await asyncio.sleep(self.limiter.reserve(cost))
+            try:
+                response = await func(*args, **kwargs)
+            except Exception as e:
+                self.limiter.refund(cost)
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            used = used_tokens(response)
+            if used is not None:
+                self.limiter.refund(cost - used)
+            return response
+
+    async def close_loop(self) -> None:
+        """Ferme les connexions HTTP ouvertes par la boucle asyncio courante (à appeler avant sa fin)"""
+        async_client = getattr(getattr(self._client, "sdk_configuration", None), "async_client", None)
+        if isinstance(async_client, LoopAsyncHttpClient):
+            await async_client.aclose()
+
+class LoopAsyncHttpClient:
+    """Client HTTP asynchrone du SDK Mistral : un httpx.AsyncClient par boucle asyncio.
+
+    Les connexions d'un httpx.AsyncClient restent liées à la boucle qui les a ouvertes, or
+    l'analyse asynchrone lance une boucle par vague avec un client partagé entre sessions.
+    À passer en async_client : Mistral(api_key=..., async_client=LoopAsyncHttpClient()).
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("follow_redirects", True)
+        self._kwargs = kwargs
+        # Sert uniquement à construire les requêtes (en-têtes et délais par défaut), sans connexion
+        self._template = httpx.AsyncClient(**kwargs)
+        self._clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._lock = threading.Lock()
+
+    def _current(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Clients des boucles terminées sans aclose() : abandonnés
+            for closed in [other for other in self._clients if other.is_closed()]:
+                del self._clients[closed]
+            client = self._clients.get(loop)
+            if client is None:
+                client = self._clients[loop] = httpx.AsyncClient(**self._kwargs)
+            return client
+
+    def build_request(self, *args, **kwargs) -> httpx.Request:
+        return self._template.build_request(*args, **kwargs)
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        return await self._current().send(request, **kwargs)
+
+    async def aclose(self) -> None:
+        """Ferme le client de la boucle courante"""
+        with self._lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+def _limited(attr, path: str, owner: RateLimitedClient):
+    """Enveloppe un attribut du client s'il mène à un point d'entrée limité"""
+    if any(endpoint == path or endpoint.startswith(path + ".") for endpoint in LIMITED_ENDPOINTS):
+        return _Endpoint(attr, path, owner)
+    return attr
+
+class _Endpoint:
+    """Attribut du client menant à un point d'entrée limité (chat, chat.complete...)"""
+
+    def __init__(self, target, path: str, owner: RateLimitedClient):
+        self._target = target
+        self._path = path
+        self._owner = owner
+
+    def __getattr__(self, name: str):
+        return _limited(getattr(self._target, name), f"{self._path}.{name}", self._owner)
+
+    def __call__(self, *args, **kwargs):
+        if self._path not in LIMITED_ENDPOINTS:
+            return self._target(*args, **kwargs)
+        if self._path.endswith("_async"):
+            return self._owner.call_async(self._target, args, kwargs)
+        return self._owner.call(self._target, args, kwargs)
@@ -0,0 +1,170 @@
+"""
+CHECK CV - Extraction de texte en parallèle
+Le décodage des PDF (PyPDF2, pur Python) et des DOCX est réparti sur un pool de processus :
+une tâche par fichier, et les longs PDF sont découpés en blocs de pages. Les textes sont
+rendus dans l'ordre des fichiers et identiques à ceux de text_extraction.extract_text.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from extraction_cache import make_extraction_key
+from text_extraction import MIME_TYPES, extract_text, join_pages, pdf_backends
+
+# Processus d'extraction (surchargeable par variable d'environnement, 0 ou 1 = pas de pool)
+DEFAULT_EXTRACTION_WORKERS = int(os.getenv("CHECKCV_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+# Pages par tâche pour les longs PDF (0 = un PDF par tâche)
+PAGES_PER_TASK = int(os.getenv("CHECKCV_PAGES_PER_TASK", "8"))
+
+Document = Tuple[bytes, str]
+
+def extract_pdf_pages(data: bytes, start: int, stop: int) -> str:
+    """Texte des pages [start, stop) d'un PDF avec le moteur préféré (même assemblage que extract_text)"""
+    return join_pages(pdf_backends()[0].extract_pages(data, start, stop))
+
+def pdf_page_count(data: bytes) -> Optional[int]:
+    """Nombre de pages d'un PDF, ou None s'il est illisible (l'erreur remonte à l'extraction)"""
+    try:
+        return pdf_backends()[0].page_count(data)
+    except Exception:
+        return None
+
+class PendingText:
+    """Texte en cours d'extraction : un ou plusieurs blocs de pages, dans l'ordre"""
+
+    def __init__(self, futures: List[Future]):
+        self._futures = futures
+        self.split = len(futures) > 1
+
+    def done(self) -> bool:
+        return all(future.done() for future in self._futures)
+
+    def result(self) -> str:
+        """Attend et renvoie le texte (lève l'exception de l'extraction si le fichier est illisible)"""
+        return join_pages([future.result() for future in self._futures])
+
+    def cancel(self) -> None:
+        """Annule les blocs pas encore démarrés"""
+        for future in self._futures:
+            future.cancel()
+
+class ParallelExtractor:
+    """Pool de processus d'extraction partagé entre threads.
+
+    submit() et prefetch() lancent les extractions sans attendre ; extract() renvoie
+    le texte d'un fichier en réutilisant une extraction déjà lancée pour les mêmes octets.
+    Une extraction lancée mais jamais lue (texte trouvé en cache entre-temps, arrêt anticipé
+    du lot) doit être abandonnée avec discard(), sans quoi elle reste en mémoire.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_EXTRACTION_WORKERS, pages_per_task: int = PAGES_PER_TASK):
+        self.max_workers = max_workers
+        self.pages_per_task = pages_per_task
+        self._executor = self._new_executor()
+        self._pending: Dict[str, PendingText] = {}
+        # Réentrant : submit() tient le verrou pendant _run(), qui le reprend pour recréer le pool
+        self._lock = threading.RLock()
+
+    def _new_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.max_workers <= 1:
+            return None
+        # spawn : les processus ne copient pas les threads du serveur Streamlit
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _run(self, func, *args, local: bool = False) -> Future:
+        if local or self._executor is None:
+            future = Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        executor = self._executor
+        try:
+            return executor.submit(func, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                # Un processus a planté (fichier malformé) : le pool est recréé une seule fois,
+                # même si plusieurs threads constatent la panne en même temps
+                if self._executor is executor:
+                    self._executor = self._new_executor()
+                    executor.shutdown(wait=False)
+                return self._executor.submit(func, *args)
+
+    def _tasks(self, data: bytes, mime_type: str) -> List[Future]:
+        if mime_type == MIME_TYPES[".txt"]:
+            # Un fichier texte se décode sur place : l'envoyer à un processus coûterait plus cher
+            return [self._run(extract_text, data, mime_type, local=True)]
+        if mime_type == MIME_TYPES[".pdf"] and self._executor is not None and self.pages_per_task:
+            pages = pdf_page_count(data)
+            if pages and pages > self.pages_per_task:
+                return [
+                    self._run(extract_pdf_pages, data, start, min(start + self.pages_per_task, pages))
+                    for start in range(0, pages, self.pages_per_task)
+                ]
+        return [self._run(extract_text, data, mime_type)]
+
+    def submit(self, data: bytes, mime_type: str) -> PendingText:
+        """Lance l'extraction d'un fichier (sans effet si elle est déjà en cours)"""
+        key = make_extraction_key(data, mime_type)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = PendingText(self._tasks(data, mime_type))
+                self._pending[key] = pending
+        return pending
+
+    def prefetch(self, documents: Iterable[Document]) -> None:
+        """Lance l'extraction de plusieurs fichiers (octets, type MIME) sans attendre"""
+        for data, mime_type in documents:
+            self.submit(data, mime_type)
+
+    def discard(self, documents: Iterable[Document]) -> None:
+        """Abandonne les extractions lancées pour des fichiers (octets, type MIME) qui ne seront
+        pas lus ; les blocs pas encore démarrés sont annulés"""
+        with self._lock:
+            for data, mime_type in documents:
+                pending = self._pending.pop(make_extraction_key(data, mime_type), None)
+                if pending is not None:
+                    pending.cancel()
+
+    def extract(self, data: bytes, mime_type: str) -> str:
+        """Texte d'un fichier (lève une exception si illisible, comme extract_text)"""
+        key = make_extraction_key(data, mime_type)
+        try:
+            pending = self.submit(data, mime_type)
+            try:
+                text = pending.result()
+            except (BrokenProcessPool, CancelledError):
+                # Pool cassé par un autre fichier, ou extraction abandonnée par discard() pendant
+                # qu'on l'attendait : une seconde tentative
+                with self._lock:
+                    self._pending.pop(key, None)
+                pending = self.submit(data, mime_type)
+                text = pending.result()
+            except Exception:
+                if not pending.split:
+                    raise
+                text = ""
+            if pending.split and not text.strip():
+                # Découpage par pages avec le moteur préféré en échec : extraction complète avec replis
+                return extract_text(data, mime_type)
+            return text
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def map(self, documents: Iterable[Document]) -> Iterator[str]:
+        """Textes de plusieurs fichiers, extraits en parallèle et rendus dans l'ordre"""
+        documents = list(documents)
+        self.prefetch(documents)
+        for data, mime_type in documents:
+            yield self.extract(data, mime_type)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
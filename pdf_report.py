@@ -0,0 +1,238 @@
+"""
+CHECK CV - Rapport PDF des résultats
+Rapport partagé par l'application Streamlit et le traitement par lots en ligne de commande.
+Les éléments du rapport sont produits à la demande pendant le rendu et le PDF est écrit
+dans un fichier : la mémoire ne dépend pas du nombre de candidats.
+"""
+
+import os
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+
+# Lignes par tableau du classement (un tableau par bloc, rendu au fil de l'eau)
+RANKING_CHUNK_ROWS = 40
+
+def _report_styles() -> Dict:
+    styles = getSampleStyleSheet()
+    return {
+        'normal': styles['Normal'],
+        # Style personnalisé pour le titre
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#00b4db'),
+            spaceAfter=30,
+            alignment=1  # Centré
+        ),
+        # Style pour les en-têtes
+        'header': ParagraphStyle(
+            'CustomHeader',
+            parent=styles['Heading2'],
+            fontSize=16,
+            textColor=colors.HexColor('#0083b0'),
+            spaceAfter=12,
+            spaceBefore=12
+        ),
+    }
+
+def _score_counts(results: Iterable[Dict]) -> Dict[str, int]:
+    """Répartition des scores en une seule passe sur les résultats"""
+    counts = {'total': 0, 'excellent': 0, 'bon': 0, 'moyen': 0, 'faible': 0}
+    for result in results:
+        counts['total'] += 1
+        score = result['score']
+        counts['excellent' if score >= 80 else 'bon' if score >= 60 else 'moyen' if score >= 40 else 'faible'] += 1
+    return counts
+
+def _clip(text: str, length: int) -> str:
+    text = str(text)
+    return text if len(text) <= length else text[:length - 1] + "…"
+
+def _ranking_tables(results: Iterable[Dict]) -> Iterator[Table]:
+    """Classement compact de tous les candidats, par tableaux de RANKING_CHUNK_ROWS lignes"""
+    header = ['Rang', 'Nom', 'Fichier', 'Score']
+    style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0083b0')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+        ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f0f9ff')]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#00b4db'))
+    ])
+    rows = [header]
+    for rank, result in enumerate(results, start=1):
+        rows.append([str(rank), _clip(result['nom_complet'], 38), _clip(result['filename'], 34), f"{result['score']}%"])
+        if len(rows) > RANKING_CHUNK_ROWS:
+            yield Table(rows, colWidths=[1.5*cm, 7*cm, 6*cm, 2*cm], style=style)
+            rows = [header]
+    if len(rows) > 1:
+        yield Table(rows, colWidths=[1.5*cm, 7*cm, 6*cm, 2*cm], style=style)
+
+def iter_report_flowables(results: Iterable[Dict], job_description: str,
+                          detail_limit: Optional[int] = None) -> Iterator:
+    """Produit les éléments du rapport un par un.
+
+    results doit être triée par score décroissant et pouvoir être parcourue plusieurs
+    fois (liste, ResultSpool...). Avec detail_limit, le rapport contient le classement
+    compact de tous les candidats puis le détail des detail_limit premiers seulement.
+    """
+    styles = _report_styles()
+    normal, header_style = styles['normal'], styles['header']
+    counts = _score_counts(results)
+
+    # Titre du rapport
+    yield Paragraph("🎯 CHECK CV - RAPPORT D'ANALYSE", styles['title'])
+    yield Paragraph(f"Date: {datetime.now().strftime('%d/%m/%Y %H:%M')}", normal)
+    yield Spacer(1, 0.5*cm)
+
+    # Résumé
+    yield Paragraph("RÉSUMÉ DE L'ANALYSE", header_style)
+    summary_data = [
+        ['Nombre de candidats analysés:', str(counts['total'])],
+        ['Excellent (80%+):', str(counts['excellent'])],
+        ['Bon (60-79%):', str(counts['bon'])],
+        ['Moyen (40-59%):', str(counts['moyen'])],
+        ['Faible (<40%):', str(counts['faible'])],
+    ]
+
+    summary_table = Table(summary_data, colWidths=[12*cm, 4*cm])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f0f9ff')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#00b4db'))
+    ]))
+
+    yield summary_table
+    yield Spacer(1, 1*cm)
+
+    if detail_limit is not None:
+        # Classement compact de tous les candidats, détail des premiers seulement
+        yield Paragraph("CLASSEMENT DES CANDIDATS", header_style)
+        yield from _ranking_tables(results)
+        if detail_limit > 0:
+            yield PageBreak()
+            yield Paragraph(f"DÉTAIL DES {min(detail_limit, counts['total'])} PREMIERS CANDIDATS", header_style)
+
+    # Détails des candidats
+    for idx, result in enumerate(results):
+        if detail_limit is not None and idx >= detail_limit:
+            break
+        if idx > 0:
+            yield PageBreak()
+
+        # Rang et nom
+        yield Paragraph(f"CANDIDAT #{idx + 1}", header_style)
+        yield Paragraph(f"<b>Nom:</b> {result['nom_complet']}", normal)
+        yield Paragraph(f"<b>Fichier:</b> {result['filename']}", normal)
+        yield Spacer(1, 0.3*cm)
+
+        # Score
+        score_color = '#28a745' if result['score'] >= 80 else '#17a2b8' if result['score'] >= 60 else '#ffc107' if result['score'] >= 40 else '#dc3545'
+        score_text = f"<b>Score d'adéquation: <font color='{score_color}'>{result['score']}%</font></b>"
+        yield Paragraph(score_text, normal)
+        yield Spacer(1, 0.5*cm)
+
+        # Points forts
+        yield Paragraph("✅ <b>POINTS FORTS</b>", header_style)
+        for point in result['points_forts']:
+            yield Paragraph(f"• {point}", normal)
+        yield Spacer(1, 0.3*cm)
+
+        # Points à améliorer
+        yield Paragraph("⚠️ <b>POINTS À AMÉLIORER</b>", header_style)
+        for point in result['points_amelioration']:
+            yield Paragraph(f"• {point}", normal)
+        yield Spacer(1, 0.3*cm)
+
+        # Recommandations
+        yield Paragraph("💡 <b>RECOMMANDATIONS</b>", header_style)
+        for rec in result['recommandations']:
+            yield Paragraph(f"• {rec}", normal)
+        yield Spacer(1, 0.5*cm)
+
+class LazyStory:
+    """Liste d'éléments alimentée à la demande par un itérateur, pour SimpleDocTemplate.build.
+
+    ReportLab consomme les éléments par l'avant de la liste (lecture, suppression,
+    réinsertion des morceaux découpés) : seuls `lookahead` éléments sont en mémoire.
+    """
+
+    def __init__(self, flowables: Iterable, lookahead: int = 64):
+        self._source = iter(flowables)
+        self._buffer = []
+        self._lookahead = lookahead
+
+    def _fill(self, size: int) -> None:
+        while self._source is not None and len(self._buffer) < size:
+            try:
+                self._buffer.append(next(self._source))
+            except StopIteration:
+                self._source = None
+
+    def __len__(self) -> int:
+        self._fill(self._lookahead)
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.stop is not None and index.stop > 0:
+                self._fill(index.stop)
+        elif index >= 0:
+            self._fill(index + 1)
+        return self._buffer[index]
+
+    def __setitem__(self, index, value) -> None:
+        self._buffer[index] = value
+
+    def __delitem__(self, index) -> None:
+        del self._buffer[index]
+
+    def insert(self, index: int, value) -> None:
+        self._buffer.insert(index, value)
+
+def write_pdf_report(results: Iterable[Dict], job_description: str, path: str,
+                     detail_limit: Optional[int] = None) -> str:
+    """Écrit le rapport PDF dans `path` en flux et renvoie ce chemin.
+
+    Le rendu se fait dans un fichier temporaire du même dossier, renommé à la fin :
+    un rapport interrompu ne remplace jamais un rapport existant.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        doc = SimpleDocTemplate(tmp_path, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm,
+                                topMargin=2*cm, bottomMargin=2*cm, pageCompression=1)
+        doc.build(LazyStory(iter_report_flowables(results, job_description, detail_limit)))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+def generate_pdf_report(results: Iterable[Dict], job_description: str,
+                        detail_limit: Optional[int] = None) -> bytes:
+    """Génère un rapport PDF des résultats"""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    try:
+        write_pdf_report(results, job_description, path, detail_limit)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
@@ -0,0 +1,87 @@
+"""
+CHECK CV - Mesures par étape du pipeline
+Chaque CV enregistre le coût de ses étapes (extraction, taille du prompt, appel Mistral,
+tokens facturés, parsing de la réponse) et le rapport PDF son temps de rendu. Les agrégats
+(somme, p50, p95) montrent d'où vient la lenteur d'un lot.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Étapes mesurées et leur libellé, dans l'ordre du pipeline
+STAGES = {
+    "extraction_ms": "Extraction (ms)",
+    "prompt_caracteres": "Prompt (caractères)",
+    "prompt_tokens": "Prompt (tokens estimés)",
+    "llm_ms": "Appel Mistral (ms)",
+    "tokens_entree": "Tokens facturés (entrée)",
+    "tokens_sortie": "Tokens facturés (sortie)",
+    "parsing_ms": "Parsing JSON (ms)",
+    "rendu_ms": "Rendu PDF (ms)",
+}
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentile q (0-100) par interpolation linéaire"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+class PipelineMetrics:
+    """Valeurs mesurées par étape et par CV (partagées entre les threads d'analyse)"""
+
+    def __init__(self):
+        self._values: Dict[str, List[float]] = defaultdict(list)
+        self._per_cv: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, value: float, cv_name: Optional[str] = None) -> None:
+        """Ajoute une mesure ; cv_name la rattache aussi au détail du CV"""
+        with self._lock:
+            self._values[stage].append(value)
+            if cv_name is not None:
+                per_cv = self._per_cv[cv_name]
+                per_cv[stage] = per_cv.get(stage, 0) + value
+
+    @contextmanager
+    def timer(self, stage: str, cv_name: Optional[str] = None) -> Iterator[None]:
+        """Mesure en millisecondes la durée du bloc"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - started) * 1000, cv_name)
+
+    def __bool__(self) -> bool:
+        return bool(self._values)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Agrégats par étape : nombre de mesures, somme, p50 et p95"""
+        with self._lock:
+            values = {stage: list(stage_values) for stage, stage_values in self._values.items()}
+        ordered = [stage for stage in STAGES if stage in values] + [stage for stage in values if stage not in STAGES]
+        return {
+            stage: {
+                "n": len(values[stage]),
+                "somme": round(sum(values[stage]), 1),
+                "p50": round(percentile(values[stage], 50), 1),
+                "p95": round(percentile(values[stage], 95), 1),
+            }
+            for stage in ordered
+        }
+
+    def per_cv(self) -> Dict[str, Dict[str, float]]:
+        """Mesures cumulées de chaque CV"""
+        with self._lock:
+            return {name: {stage: round(value, 1) for stage, value in stages.items()}
+                    for name, stages in self._per_cv.items()}
+
+    def to_dict(self) -> Dict:
+        """Agrégats et détail par CV, pour l'export JSON"""
+        return {"etapes": self.summary(), "par_cv": self.per_cv()}
@@ -0,0 +1,115 @@
+"""
+CHECK CV - Construction paresseuse et mémoïsée des rapports
+Un rapport n'est construit qu'à la demande (clic sur le bouton de téléchargement), dans
+un thread de fond, et une seule fois par contenu : l'empreinte des résultats et de l'offre
+sert de clé, si bien que les reruns Streamlit ne reconstruisent jamais le même rapport.
+Un rapport peut être gardé en octets ou dans un fichier (gros lots), supprimé quand il est oublié.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
+
+from analysis_cache import CACHE_DIR
+
+def make_report_key(results: List[Dict], job_description: str = "", variant: str = "") -> str:
+    """Empreinte d'un rapport : résultats, offre et variante du rapport"""
+    payload = json.dumps([results, job_description, variant], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ReportBuilder:
+    """Rapports construits en arrière-plan et gardés en mémoire (LRU de max_reports rapports).
+
+    Deux demandes simultanées du même rapport (double clic, deux sessions) partagent
+    la même construction. Une construction peut renvoyer les octets du rapport ou le
+    chemin d'un fichier (voir report_path) ; les fichiers de plus de max_age_hours
+    heures laissés par une exécution précédente sont supprimés.
+    """
+
+    def __init__(self, max_reports: int = 8, max_workers: int = 2,
+                 directory: Optional[str] = None, max_age_hours: int = 24):
+        self.max_reports = max_reports
+        self.directory = directory or os.path.join(CACHE_DIR, "rapports")
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rapport")
+        self._reports: "OrderedDict[str, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._prune(max_age_hours)
+
+    def _prune(self, max_age_hours: int) -> None:
+        limit = time.time() - max_age_hours * 3600
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path) and os.path.getmtime(path) < limit:
+                os.remove(path)
+
+    def report_path(self, key: str, suffix: str = ".pdf") -> str:
+        """Fichier où écrire le rapport `key`"""
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def submit(self, key: str, build: Callable[[], Union[bytes, str]]) -> Future:
+        """Lance la construction du rapport s'il n'est ni prêt ni en cours"""
+        with self._lock:
+            future = self._reports.get(key)
+            if future is None:
+                future = self._executor.submit(build)
+                self._reports[key] = future
+            self._reports.move_to_end(key)
+            self._evict()
+        return future
+
+    def _evict(self) -> None:
+        """Oublie les rapports terminés les moins récemment demandés au-delà de max_reports"""
+        for key in list(self._reports):
+            if len(self._reports) <= self.max_reports:
+                break
+            future = self._reports[key]
+            if future.done():
+                del self._reports[key]
+                _remove_report_file(future)
+
+    def get(self, key: str, build: Callable[[], Union[bytes, str]]) -> Union[bytes, str]:
+        """Renvoie le rapport, en attendant sa construction si nécessaire.
+
+        Une construction en échec n'est pas mémorisée : la demande suivante la relance.
+        """
+        future = self.submit(key, build)
+        try:
+            return future.result()
+        except Exception:
+            with self._lock:
+                if self._reports.get(key) is future:
+                    del self._reports[key]
+            raise
+
+    def read(self, key: str, build: Callable[[], Union[bytes, str]]) -> bytes:
+        """Comme get, mais renvoie toujours les octets (un rapport en fichier est relu)"""
+        report = self.get(key, build)
+        if isinstance(report, str) and not os.path.exists(report):
+            # Fichier supprimé entre-temps : le rapport est reconstruit
+            with self._lock:
+                self._reports.pop(key, None)
+            report = self.get(key, build)
+        if isinstance(report, bytes):
+            return report
+        with open(report, "rb") as f:
+            return f.read()
+
+    def is_ready(self, key: str) -> bool:
+        """Vrai si le rapport est déjà construit"""
+        with self._lock:
+            future = self._reports.get(key)
+        return future is not None and future.done() and future.exception() is None
+
+def _remove_report_file(future: Future) -> None:
+    """Supprime le fichier d'un rapport oublié (sans effet pour un rapport en octets)"""
+    if future.exception() is None and isinstance(future.result(), str):
+        try:
+            os.remove(future.result())
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,132 @@
+"""
+CHECK CV - Pré-classement sémantique des CV
+L'offre et les CV sont convertis en vecteurs (embeddings) puis classés par similarité
+cosinus : seuls les K meilleurs candidats sont envoyés à l'analyse Mistral.
+"""
+
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from token_ledger import BatchUsage
+
+# Mots vides français / anglais ignorés par l'embedder local
+STOPWORDS = frozenset("""
+a au aux avec ce ces dans de des du elle en et eux il je la le les leur lui ma mais me meme mes moi mon
+ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre
+vous c d j l m n s t y ete etre avoir est sont the of and to in for on with at by an be is are as or from
+this that it its we you your our will
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+
+# Longueur maximale (caractères) d'un texte envoyé à mistral-embed
+MISTRAL_EMBED_MAX_CHARS = 16000
+
+def strip_accents(text: str) -> str:
+    """Met en minuscules et supprime les accents"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte en mots normalisés, sans mots vides"""
+    return [t for t in TOKEN_PATTERN.findall(strip_accents(text)) if t not in STOPWORDS]
+
+class HashingEmbedder:
+    """Embeddings locaux hors-ligne par hachage des mots, bigrammes de mots et trigrammes de caractères.
+
+    Les vecteurs sont déterministes d'un processus à l'autre (CRC32), ce qui permet
+    de les persister et de les comparer à ceux d'une exécution précédente.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 4096):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = tokenize(text)
+        features = list(words)
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"<{word}>"
+            features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Renvoie une matrice float32 (len(texts), dim) de vecteurs normalisés"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = Counter(self._features(text))
+            if not counts:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in counts), dtype=np.uint64, count=len(counts))
+            weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            columns = (hashes % self.dim).astype(np.intp)
+            signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), -1.0, 1.0)
+            matrix[row] = np.bincount(columns, weights=signs * weights, minlength=self.dim)
+        # Pondération sous-linéaire des fréquences puis normalisation L2
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        return normalize_rows(matrix)
+
+class MistralEmbedder:
+    """Embeddings via l'API Mistral (modèle mistral-embed)"""
+
+    name = "mistral-embed"
+
+    def __init__(self, client, model: str = "mistral-embed", batch_size: int = 16,
+                 max_chars: int = MISTRAL_EMBED_MAX_CHARS, ledger: Optional[BatchUsage] = None):
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size
+        self.max_chars = max_chars
+        # Chaque appel d'embeddings est inscrit au registre des tokens du lot
+        self.ledger = ledger
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Renvoie une matrice float32 (len(texts), dim) de vecteurs normalisés"""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = [t[:self.max_chars] or " " for t in texts[start:start + self.batch_size]]
+            if callable(getattr(self.client.embeddings, "create", None)):
+                response = self.client.embeddings.create(model=self.model, inputs=batch)
+            else:
+                # Ancien client (mistralai < 1.0)
+                response = self.client.embeddings(model=self.model, input=batch)
+            if self.ledger is not None:
+                self.ledger.record(self.model, response, kind="embedding")
+            vectors += [item.embedding for item in response.data]
+        return normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normalise chaque ligne en norme L2 (les lignes nulles restent nulles)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def cosine_similarities(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Similarité cosinus entre un vecteur et chaque ligne d'une matrice"""
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    return normalize_rows(matrix) @ query
+
+def top_k_indices(scores: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """Indices des k meilleurs scores, du meilleur au moins bon (tous si k est vide)"""
+    if not k or k >= scores.size:
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+def rank_by_similarity(job_text: str, cv_texts: List[str], embedder, top_k: Optional[int] = None) -> List[Tuple[int, float]]:
+    """Classe les CV par similarité avec l'offre.
+
+    Renvoie la liste (index du CV, similarité) des top_k meilleurs candidats,
+    triée par similarité décroissante.
+    """
+    if not cv_texts:
+        return []
+    vectors = embedder.embed([job_text] + list(cv_texts))
+    scores = cosine_similarities(vectors[0], vectors[1:])
+    return [(int(i), float(scores[i])) for i in top_k_indices(scores, top_k)]
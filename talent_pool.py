@@ -0,0 +1,223 @@
+"""
+CHECK CV - Vivier de talents persistant
+Chaque CV extrait est vectorisé et ajouté à un index sur disque : une matrice float32
+lue en memory-map (vectors.f32) et une table de métadonnées SQLite (pool.sqlite3).
+Une nouvelle offre peut ainsi être comparée à tout l'historique en une seule requête top-K.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+
+from analysis_cache import CACHE_DIR, normalize_text
+from semantic_ranking import HashingEmbedder, normalize_rows, top_k_indices
+
+@contextmanager
+def exclusive_file_lock(path: str) -> Iterator[None]:
+    """Verrou exclusif entre processus, porté par un fichier de verrou"""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class TalentPool:
+    """Index vectoriel persistant des CV déjà reçus, partagé entre threads et entre processus.
+
+    Les vecteurs sont ajoutés (et synchronisés sur disque) avant les métadonnées :
+    les vecteurs orphelins d'un ajout interrompu sont tronqués. Réparation et ajouts
+    se font sous un verrou de fichier (pool.lock), pour que l'app et la CLI puissent
+    alimenter le même vivier : le numéro de ligne d'un CV est lu dans la taille du
+    fichier de vecteurs sous ce verrou.
+    """
+
+    def __init__(self, directory: Optional[str] = None, embedder=None, block_rows: int = 65536):
+        self.directory = directory or os.path.join(CACHE_DIR, "talent_pool")
+        self.embedder = embedder or HashingEmbedder()
+        self.block_rows = block_rows
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.lock_path = os.path.join(self.directory, "pool.lock")
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.directory, "pool.sqlite3"), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS cvs (
+                    row INTEGER PRIMARY KEY,
+                    text_hash TEXT UNIQUE NOT NULL,
+                    filename TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    added_at REAL NOT NULL
+                )
+            """)
+            self._conn.commit()
+            info = dict(self._conn.execute("SELECT key, value FROM info").fetchall())
+        if info and info["embedder"] != self.embedder.name:
+            raise ValueError(
+                f"Le vivier {self.directory} a été construit avec l'embedder {info['embedder']}, "
+                f"pas {self.embedder.name}"
+            )
+        self.dim = int(info["dim"]) if info else None
+        with self._exclusive():
+            self._repair()
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Verrou des écritures : entre threads de ce processus, puis entre processus"""
+        with self._lock, exclusive_file_lock(self.lock_path):
+            yield
+
+    def _repair(self) -> None:
+        """Tronque les vecteurs écrits sans métadonnées (ajout interrompu). Appelé sous _exclusive()"""
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM cvs").fetchone()[0]
+        expected = count * self.dim * 4
+        if os.path.getsize(self.vectors_path) > expected:
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(expected)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cvs").fetchone()[0]
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+    def add(self, items: List[Tuple[str, str]]) -> int:
+        """Ajoute des CV (nom du fichier, texte) au vivier et renvoie le nombre de nouveaux CV.
+
+        Les CV déjà présents (même texte normalisé) sont ignorés.
+        """
+        new_items = {}
+        for filename, text in items:
+            if text.strip():
+                new_items.setdefault(self.text_hash(text), (filename, text))
+        if not new_items:
+            return 0
+        with self._lock:
+            placeholders = ",".join("?" * len(new_items))
+            known = {
+                row[0] for row in self._conn.execute(
+                    f"SELECT text_hash FROM cvs WHERE text_hash IN ({placeholders})", list(new_items)
+                )
+            }
+        for text_hash in known:
+            del new_items[text_hash]
+        if not new_items:
+            return 0
+
+        vectors = np.ascontiguousarray(self.embedder.embed([text for _, text in new_items.values()]), dtype=np.float32)
+        now = time.time()
+        with self._exclusive():
+            # Un autre processus a pu créer le vivier, ajouter ces CV ou être interrompu depuis
+            info = dict(self._conn.execute("SELECT key, value FROM info").fetchall())
+            if info:
+                self.dim = int(info["dim"])
+            else:
+                self.dim = vectors.shape[1]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+                    [("embedder", self.embedder.name), ("dim", str(self.dim))]
+                )
+            self._repair()
+            placeholders = ",".join("?" * len(new_items))
+            known = {
+                row[0] for row in self._conn.execute(
+                    f"SELECT text_hash FROM cvs WHERE text_hash IN ({placeholders})", list(new_items)
+                )
+            }
+            keep = [i for i, text_hash in enumerate(new_items) if text_hash not in known]
+            if not keep:
+                return 0
+            start = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors[keep].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            entries = list(new_items.items())
+            self._conn.executemany(
+                "INSERT INTO cvs (row, text_hash, filename, text, added_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (start + offset, entries[i][0], entries[i][1][0], entries[i][1][1], now)
+                    for offset, i in enumerate(keep)
+                ]
+            )
+            self._conn.commit()
+        return len(keep)
+
+    def _vectors(self) -> Optional[np.memmap]:
+        count = len(self)
+        if count and self.dim is None:
+            # Vivier créé par un autre processus depuis l'ouverture
+            with self._lock:
+                info = dict(self._conn.execute("SELECT key, value FROM info").fetchall())
+            self.dim = int(info["dim"]) if info else None
+        if not count or self.dim is None:
+            return None
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+
+    def search_vector(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Top-K exact par produit matriciel bloc par bloc sur la matrice memory-mappée"""
+        vectors = self._vectors()
+        if vectors is None:
+            return []
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, vectors.shape[0], self.block_rows):
+            scores = np.asarray(vectors[start:start + self.block_rows]) @ query
+            block_best = top_k_indices(scores, k)
+            best_rows = np.concatenate([best_rows, block_best + start])
+            best_scores = np.concatenate([best_scores, scores[block_best]])
+            keep = top_k_indices(best_scores, k)
+            best_rows, best_scores = best_rows[keep], best_scores[keep]
+        return [(int(row), float(score)) for row, score in zip(best_rows, best_scores)]
+
+    def search(self, job_text: str, k: int = 20) -> List[Dict]:
+        """Renvoie les k CV du vivier les plus proches de l'offre, du plus proche au moins proche"""
+        matches = self.search_vector(self.embedder.embed([job_text])[0], k)
+        if not matches:
+            return []
+        with self._lock:
+            placeholders = ",".join("?" * len(matches))
+            rows = {
+                row[0]: row for row in self._conn.execute(
+                    f"SELECT row, filename, text, added_at FROM cvs WHERE row IN ({placeholders})",
+                    [row for row, _ in matches]
+                )
+            }
+        return [
+            {
+                'filename': rows[row][1],
+                'text': rows[row][2],
+                'added_at': rows[row][3],
+                'similarite': round(score * 100, 1),
+            }
+            for row, score in matches
+        ]
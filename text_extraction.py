@@ -0,0 +1,303 @@
+"""
+CHECK CV - Extraction du texte des CV et des offres
+Module unique d'extraction partagé par toutes les applications et le traitement par lots.
+Chaque format a des moteurs interchangeables, du plus rapide au plus répandu : le premier
+moteur installé qui lit le fichier est utilisé, les suivants servent de repli.
+"""
+
+import importlib.util
+import io
+import os
+import zipfile
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+# À incrémenter à chaque modification de l'extraction pour invalider le cache d'extraction
+EXTRACTOR_VERSION = "checkcv-extract-1"
+
+# Types MIME reconnus à partir de l'extension
+MIME_TYPES = {
+    ".txt": "text/plain",
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+# Moteur PDF imposé (ex. "pypdf2"), sinon le premier installé dans l'ordre de PDF_BACKENDS
+FORCED_PDF_BACKEND = os.getenv("CHECKCV_PDF_BACKEND", "").lower()
+
+class PdfBackend(ABC):
+    """Moteur d'extraction PDF : nombre de pages et texte d'une plage de pages.
+
+    Un moteur incomplet ne peut pas être instancié : l'erreur survient dès son ajout à PDF_BACKENDS.
+    """
+
+    name = ""
+    module = ""
+
+    def available(self) -> bool:
+        return importlib.util.find_spec(self.module) is not None
+
+    @abstractmethod
+    def page_count(self, data: bytes) -> int:
+        """Nombre de pages du PDF"""
+
+    @abstractmethod
+    def extract_pages(self, data: bytes, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Texte des pages start à stop (exclue ; None = jusqu'à la fin), une chaîne par page"""
+
+class PyMuPdfBackend(PdfBackend):
+    """PyMuPDF (MuPDF en C) : le plus rapide et le plus fidèle sur les mises en page en colonnes"""
+
+    name = "pymupdf"
+    module = "fitz"
+
+    def page_count(self, data: bytes) -> int:
+        import fitz
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            return doc.page_count
+
+    def extract_pages(self, data: bytes, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        import fitz
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            return [doc[idx].get_text() for idx in range(start, doc.page_count if stop is None else stop)]
+
+class PdfiumBackend(PdfBackend):
+    """pypdfium2 (PDFium de Chrome, en C)"""
+
+    name = "pypdfium2"
+    module = "pypdfium2"
+
+    def page_count(self, data: bytes) -> int:
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(data)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+    def extract_pages(self, data: bytes, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        import pypdfium2
+        pdf = pypdfium2.PdfDocument(data)
+        try:
+            return [pdf[idx].get_textpage().get_text_range() for idx in range(start, len(pdf) if stop is None else stop)]
+        finally:
+            pdf.close()
+
+class PypdfBackend(PdfBackend):
+    """pypdf (successeur maintenu de PyPDF2, pur Python)"""
+
+    name = "pypdf"
+    module = "pypdf"
+
+    def _reader(self, data: bytes):
+        import pypdf
+        return pypdf.PdfReader(io.BytesIO(data))
+
+    def page_count(self, data: bytes) -> int:
+        return len(self._reader(data).pages)
+
+    def extract_pages(self, data: bytes, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        pages = self._reader(data).pages
+        return [pages[idx].extract_text() or "" for idx in range(start, len(pages) if stop is None else stop)]
+
+class PyPdf2Backend(PypdfBackend):
+    """PyPDF2 (dépendance du projet, toujours disponible)"""
+
+    name = "pypdf2"
+    module = "PyPDF2"
+
+    def _reader(self, data: bytes):
+        import PyPDF2
+        return PyPDF2.PdfReader(io.BytesIO(data))
+
+# Du plus rapide au plus répandu
+PDF_BACKENDS: List[PdfBackend] = [PyMuPdfBackend(), PdfiumBackend(), PypdfBackend(), PyPdf2Backend()]
+
+def pdf_backends() -> List[PdfBackend]:
+    """Moteurs PDF installés, dans l'ordre de préférence (le moteur imposé en tête)"""
+    backends = [backend for backend in PDF_BACKENDS if backend.available()]
+    return sorted(backends, key=lambda backend: backend.name != FORCED_PDF_BACKEND)
+
+def join_pages(pages: List[str]) -> str:
+    """Texte d'un document à partir du texte de ses pages (une page par bloc de lignes)"""
+    return "\n".join(pages)
+
+def extract_pdf(data: bytes) -> Tuple[str, str]:
+    """Texte d'un PDF et nom du moteur utilisé.
+
+    Un moteur en erreur, ou qui ne trouve aucun texte, passe la main au suivant ;
+    l'erreur du premier moteur est levée si aucun ne lit le fichier.
+    """
+    first_error = None
+    text, used = "", ""
+    for backend in pdf_backends():
+        try:
+            text, used = join_pages(backend.extract_pages(data)), backend.name
+        except Exception as e:
+            first_error = first_error or e
+            continue
+        if text.strip():
+            return text, used
+    if used:
+        return text, used
+    raise first_error or RuntimeError("Aucun moteur PDF installé (PyPDF2 requis)")
+
+def docx_lines(parent) -> List[str]:
+    """Lignes d'un corps de document python-docx : paragraphes et lignes de tableaux, dans l'ordre.
+
+    Chaque ligne de tableau donne une ligne « cellule | cellule » (cellules vides et
+    cellules fusionnées ignorées) ; les tableaux imbriqués sont développés à leur place.
+    """
+    from docx.oxml.ns import qn
+    from docx.text.paragraph import Paragraph
+
+    lines = []
+    for child in parent.iterchildren():
+        if child.tag == qn("w:p"):
+            lines.append(Paragraph(child, None).text)
+        elif child.tag == qn("w:tbl"):
+            for row in child.iterchildren(qn("w:tr")):
+                cells = []
+                for cell in row.iterchildren(qn("w:tc")):
+                    cell_text = "\n".join(line for line in docx_lines(cell) if line.strip())
+                    if cell_text:
+                        cells.append(cell_text)
+                if cells:
+                    lines.append(" | ".join(cells))
+    return lines
+
+def extract_docx_python_docx(data: bytes) -> str:
+    """DOCX lu avec python-docx (arbre complet du document, zones de texte ignorées) : moteur de repli"""
+    import docx
+    document = docx.Document(io.BytesIO(data))
+    return "\n".join(docx_lines(document.element.body))
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+# Éléments de run et leur équivalent texte (comme python-docx) ; w:br est traité à part
+_RUN_TEXT = {_W + "tab": "\t", _W + "ptab": "\t", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+
+def extract_docx_xml(data: bytes) -> str:
+    """DOCX lu en flux : word/document.xml est décompressé et parcouru par iterparse.
+
+    Même assemblage que docx_lines (paragraphes, lignes de tableaux « cellule | cellule »),
+    sans construire l'arbre du document. Le texte des zones de texte est aussi récupéré
+    (à la fin de leur paragraphe d'ancrage), et la variante de repli mc:Fallback ignorée
+    pour ne pas le dupliquer.
+    """
+    lines: List[str] = []
+    containers = [lines]    # lignes du document, puis de chaque cellule de tableau ouverte
+    rows: List[List[str]] = []  # cellules de la ligne en cours de chaque tableau ouvert
+    paragraphs: List[List[str]] = []  # morceaux du paragraphe en cours (zones de texte imbriquées)
+    boxes: List[List[str]] = []  # lignes des zones de texte ancrées dans chaque paragraphe
+    fallback_depth = 0
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive, archive.open("word/document.xml") as xml:
+        for event, elem in ElementTree.iterparse(xml, events=("start", "end")):
+            tag = elem.tag
+            if tag == _MC_FALLBACK:
+                fallback_depth += 1 if event == "start" else -1
+                if event == "end":
+                    elem.clear()
+                continue
+            if fallback_depth:
+                if event == "end":
+                    elem.clear()
+                continue
+
+            if event == "start":
+                if tag == _W + "p":
+                    paragraphs.append([])
+                    boxes.append([])
+                elif tag == _W + "tbl":
+                    rows.append([])
+                elif tag == _W + "tr":
+                    rows[-1] = []
+                elif tag == _W + "tc":
+                    containers.append([])
+                elif tag == _W + "txbxContent":
+                    containers.append(boxes[-1] if boxes else [])
+                continue
+
+            if tag == _W + "t":
+                if paragraphs:
+                    paragraphs[-1].append(elem.text or "")
+            elif tag in _RUN_TEXT:
+                if paragraphs:
+                    paragraphs[-1].append(_RUN_TEXT[tag])
+            elif tag == _W + "br":
+                if paragraphs and elem.get(_W + "type", "textWrapping") == "textWrapping":
+                    paragraphs[-1].append("\n")
+            elif tag == _W + "p":
+                containers[-1].append("".join(paragraphs.pop()))
+                containers[-1].extend(boxes.pop())
+            elif tag == _W + "tc":
+                cell_text = "\n".join(line for line in containers.pop() if line.strip())
+                if cell_text:
+                    rows[-1].append(cell_text)
+            elif tag == _W + "tr":
+                if rows[-1]:
+                    containers[-1].append(" | ".join(rows[-1]))
+            elif tag == _W + "tbl":
+                rows.pop()
+            elif tag == _W + "txbxContent":
+                containers.pop()
+            # Les éléments lus sont vidés : la mémoire reste bornée quelle que soit la taille du document
+            elem.clear()
+    return "\n".join(lines)
+
+# Moteurs DOCX (nom, module requis, extraction), du plus rapide au plus répandu
+DOCX_BACKENDS: List[Tuple[str, str, Callable[[bytes], str]]] = [
+    ("docx-xml", "zipfile", extract_docx_xml),
+    ("python-docx", "docx", extract_docx_python_docx),
+]
+
+def docx_backends() -> List[Tuple[str, Callable[[bytes], str]]]:
+    """Moteurs DOCX installés, dans l'ordre de préférence"""
+    return [(name, extract) for name, module, extract in DOCX_BACKENDS if importlib.util.find_spec(module) is not None]
+
+def extract_docx(data: bytes) -> Tuple[str, str]:
+    """Texte d'un DOCX (paragraphes et tableaux) et nom du moteur utilisé ; repli sur le suivant en cas d'erreur"""
+    first_error = None
+    for name, extract in docx_backends():
+        try:
+            return extract(data), name
+        except Exception as e:
+            first_error = first_error or e
+    raise first_error or RuntimeError("Aucun moteur DOCX installé (python-docx requis)")
+
+def extract_plain_text(data: bytes) -> Tuple[str, str]:
+    """Texte brut : UTF-8 (BOM accepté), sinon Windows-1252 des fichiers produits sous Windows"""
+    try:
+        return data.decode("utf-8-sig"), "utf-8"
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace"), "cp1252"
+
+EXTRACTORS: Dict[str, Callable[[bytes], Tuple[str, str]]] = {
+    MIME_TYPES[".txt"]: extract_plain_text,
+    MIME_TYPES[".pdf"]: extract_pdf,
+    MIME_TYPES[".docx"]: extract_docx,
+}
+
+def backends_for(mime_type: str) -> List[Tuple[str, Callable[[bytes], str]]]:
+    """Moteurs installés pour un type de fichier, sans repli (pour les comparer entre eux)"""
+    if mime_type == MIME_TYPES[".pdf"]:
+        return [(backend.name, lambda data, backend=backend: join_pages(backend.extract_pages(data)))
+                for backend in pdf_backends()]
+    if mime_type == MIME_TYPES[".docx"]:
+        return docx_backends()
+    return [("texte", lambda data: extract_plain_text(data)[0])]
+
+def extract_text_with_backend(data: bytes, mime_type: str) -> Tuple[str, str]:
+    """Texte d'un fichier et nom du moteur qui l'a lu (lève une exception si illisible)"""
+    return EXTRACTORS.get(mime_type, extract_plain_text)(data)
+
+def extract_text(data: bytes, mime_type: str) -> str:
+    """Extrait le texte des octets d'un fichier (lève une exception si illisible)"""
+    return extract_text_with_backend(data, mime_type)[0]
+
+def extractor_version(mime_type: str) -> str:
+    """Version d'extraction d'un type de fichier pour le cache : change avec le moteur préféré"""
+    backends = backends_for(mime_type)
+    return f"{EXTRACTOR_VERSION}:{mime_type}:{backends[0][0] if backends else ''}"
@@ -0,0 +1,197 @@
+"""
+CHECK CV - Registre de consommation de tokens
+Chaque appel Mistral (synthèse d'une offre, analyse d'un CV) est enregistré dans une base
+SQLite locale avec les tokens facturés (response.usage) et son coût estimé : totaux par lot,
+par offre et par jour. Le budget d'un lot est vérifié avant son lancement, sur une
+estimation locale de ses prompts.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from analysis_cache import CACHE_DIR, normalize_text
+
+# Prix en dollars par million de tokens (entrée, sortie), à tenir à jour avec la grille Mistral
+MODEL_PRICES = {
+    "mistral-large-latest": (2.0, 6.0),
+    "mistral-medium-latest": (0.4, 2.0),
+    "mistral-small-latest": (0.1, 0.3),
+    "mistral-embed": (0.1, 0.0),
+}
+
+# Budgets par défaut, en tokens (0 = illimité ; surchargeables par variable d'environnement)
+DEFAULT_BATCH_TOKEN_BUDGET = int(os.getenv("CHECKCV_BATCH_TOKEN_BUDGET", "0"))
+DEFAULT_DAILY_TOKEN_BUDGET = int(os.getenv("CHECKCV_DAILY_TOKEN_BUDGET", "0"))
+
+# Plus petit contexte CV accepté quand le budget oblige à réduire les prompts
+MIN_CV_TOKEN_BUDGET = 300
+
+# Décisions possibles pour un lot qui dépasse son budget
+OVER_BUDGET_REDUCE = "reduire"
+OVER_BUDGET_SCREENING = "criblage"
+OVER_BUDGET_STOP = "arreter"
+WITHIN_BUDGET = "ia"
+
+def make_offer_id(job_text: str) -> str:
+    """Identifiant d'une offre dans le registre (texte normalisé, indépendant du modèle)"""
+    return hashlib.sha256(normalize_text(job_text).encode("utf-8")).hexdigest()[:16]
+
+def usage_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Coût estimé d'un appel en dollars (0 pour un modèle absent de MODEL_PRICES)"""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+def fit_batch_to_budget(estimate: Callable[[int], int], cv_token_budget: int, allowance: Optional[int],
+                        policy: str = OVER_BUDGET_REDUCE) -> Tuple[str, int]:
+    """Décide du sort d'un lot avant son lancement.
+
+    estimate(budget de tokens par CV) renvoie les tokens estimés du lot et allowance les
+    tokens encore autorisés (None = illimité). Renvoie (décision, budget par CV) : WITHIN_BUDGET
+    si le lot tient, sinon selon policy OVER_BUDGET_REDUCE (plus grand budget par CV qui tient,
+    au moins MIN_CV_TOKEN_BUDGET, arrêt sinon), OVER_BUDGET_SCREENING ou OVER_BUDGET_STOP.
+    """
+    if allowance is None or estimate(cv_token_budget) <= allowance:
+        return WITHIN_BUDGET, cv_token_budget
+    if policy != OVER_BUDGET_REDUCE:
+        return policy, cv_token_budget
+    if estimate(MIN_CV_TOKEN_BUDGET) > allowance:
+        return OVER_BUDGET_STOP, cv_token_budget
+    # L'estimation croît avec le budget par CV : recherche dichotomique du plus grand budget qui tient
+    low, high = MIN_CV_TOKEN_BUDGET, cv_token_budget or estimate_ceiling(estimate, allowance)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate(middle) <= allowance:
+            low = middle
+        else:
+            high = middle - 1
+    return OVER_BUDGET_REDUCE, low
+
+def estimate_ceiling(estimate: Callable[[int], int], allowance: int) -> int:
+    """Borne haute de la recherche quand le CV est envoyé en entier (budget par CV à 0)"""
+    high = MIN_CV_TOKEN_BUDGET
+    while estimate(high * 2) <= allowance:
+        high *= 2
+    return high * 2
+
+class TokenLedger:
+    """Registre SQLite des appels Mistral, partagé entre threads.
+
+    Les appels plus anciens que max_age_days sont supprimés à l'ouverture.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age_days: float = 400):
+        self.path = path or os.path.join(CACHE_DIR, "consommation.sqlite3")
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS appels (
+                    created_at REAL NOT NULL,
+                    day TEXT NOT NULL,
+                    batch_id TEXT NOT NULL,
+                    offer_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_tokens INTEGER NOT NULL,
+                    completion_tokens INTEGER NOT NULL,
+                    cost REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS appels_day ON appels (day)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS appels_batch ON appels (batch_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS appels_offer ON appels (offer_id)")
+            self._conn.execute("DELETE FROM appels WHERE created_at < ?",
+                               (time.time() - self.max_age_days * 86400,))
+            self._conn.commit()
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int,
+               batch_id: str = "", offer_id: str = "", kind: str = "analyse") -> None:
+        """Enregistre un appel (kind : "analyse", "synthese" ou "embedding")"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO appels VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (now, time.strftime("%Y-%m-%d", time.localtime(now)), batch_id, offer_id, kind, model,
+                 prompt_tokens, completion_tokens, usage_cost(model, prompt_tokens, completion_tokens))
+            )
+            self._conn.commit()
+
+    def totals(self, batch_id: Optional[str] = None, offer_id: Optional[str] = None,
+               day: Optional[str] = None) -> Dict:
+        """Totaux (appels, tokens, coût) filtrés par lot, offre et/ou jour (AAAA-MM-JJ)"""
+        filters = [(column, value) for column, value in
+                   (("batch_id", batch_id), ("offer_id", offer_id), ("day", day)) if value is not None]
+        where = " AND ".join(f"{column} = ?" for column, _ in filters) or "1"
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0), "
+                f"COALESCE(SUM(cost), 0) FROM appels WHERE {where}",
+                [value for _, value in filters]
+            ).fetchone()
+        return {"appels": row[0], "tokens_entree": row[1], "tokens_sortie": row[2],
+                "tokens": row[1] + row[2], "cout": round(row[3], 4)}
+
+    def by_day(self, days: int = 7) -> List[Dict]:
+        """Totaux des derniers jours, du plus récent au plus ancien"""
+        since = time.strftime("%Y-%m-%d", time.localtime(time.time() - (days - 1) * 86400))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(cost) FROM appels "
+                "WHERE day >= ? GROUP BY day ORDER BY day DESC",
+                (since,)
+            ).fetchall()
+        return [{"jour": day, "appels": calls, "tokens_entree": prompt, "tokens_sortie": completion,
+                 "tokens": prompt + completion, "cout": round(cost, 4)}
+                for day, calls, prompt, completion, cost in rows]
+
+    def spent_today(self) -> int:
+        """Tokens consommés aujourd'hui"""
+        return self.totals(day=time.strftime("%Y-%m-%d"))["tokens"]
+
+    def allowance(self, batch_budget: int = DEFAULT_BATCH_TOKEN_BUDGET,
+                  daily_budget: int = DEFAULT_DAILY_TOKEN_BUDGET) -> Optional[int]:
+        """Tokens encore autorisés pour un nouveau lot (None si aucun budget n'est fixé)"""
+        limits = []
+        if batch_budget:
+            limits.append(batch_budget)
+        if daily_budget:
+            limits.append(max(0, daily_budget - self.spent_today()))
+        return min(limits) if limits else None
+
+    def batch(self, batch_id: str, offer_id: str) -> "BatchUsage":
+        """Enregistreur lié à un lot et à une offre, à passer aux fonctions d'analyse"""
+        return BatchUsage(self, batch_id, offer_id)
+
+    def summary(self) -> str:
+        """Résumé lisible de la consommation du jour"""
+        today = self.totals(day=time.strftime("%Y-%m-%d"))
+        tokens = f"{today['tokens']:,}".replace(",", " ")
+        return f"🪙 Aujourd'hui : {tokens} tokens • {today['appels']} appels • {today['cout']:.2f} $"
+
+class BatchUsage:
+    """Enregistre dans le registre les tokens facturés de chaque réponse d'un lot"""
+
+    def __init__(self, ledger: TokenLedger, batch_id: str, offer_id: str):
+        self.ledger = ledger
+        self.batch_id = batch_id
+        self.offer_id = offer_id
+
+    def record(self, model: str, response, kind: str = "analyse") -> None:
+        """Lit response.usage (ignoré si absent)"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        self.ledger.record(model, getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0,
+                           self.batch_id, self.offer_id, kind)
+
+    def totals(self) -> Dict:
+        """Totaux du lot"""
+        return self.ledger.totals(batch_id=self.batch_id)
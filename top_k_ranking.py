@@ -0,0 +1,106 @@
+"""
+CHECK CV - Classement top-K avec arrêt anticipé
+Quand seuls les K meilleurs candidats intéressent, les CV sont d'abord pré-notés localement
+(criblage des compétences de l'offre, même échelle 0-100 que l'analyse Mistral) puis envoyés
+à l'analyse par pré-score décroissant. Un tas garde les K meilleurs scores obtenus : dès qu'un
+CV ne peut plus y entrer, même avec la marge accordée à son pré-score, l'envoi s'arrête et
+les CV restants sont signalés comme non évalués.
+"""
+
+import heapq
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from batch_waves import DEFAULT_WAVE_SIZE, iter_prefetched_waves
+from fast_screening import ScreeningProfile, screen_cv
+
+# Points ajoutés au pré-score local pour borner le score Mistral d'un CV (100 = jamais d'arrêt anticipé)
+DEFAULT_PRESCORE_MARGIN = int(os.getenv("CHECKCV_PRESCORE_MARGIN", "30"))
+
+# Statut des CV que l'arrêt anticipé n'a pas envoyés à l'analyse
+STATUS_NOT_EVALUATED = "non évalué"
+
+T = TypeVar("T")
+CvItem = Tuple[str, str]
+
+def prescore_in_waves(job_description: str, sources: Sequence[Tuple[str, T]],
+                      load: Callable[[T], Optional[CvItem]], wave_size: int = DEFAULT_WAVE_SIZE,
+                      on_wave: Optional[Callable[[List[CvItem]], None]] = None,
+                      prefetch: Optional[Callable[[Sequence[Tuple[str, T]]], None]] = None
+                      ) -> Tuple[List[Tuple[str, T]], Dict[str, Tuple[str, int]]]:
+    """Pré-note localement des couples (empreinte, source), vague par vague, sans garder les textes.
+
+    Renvoie les couples lisibles triés par pré-score décroissant (ordre d'entrée à égalité)
+    et, par empreinte, le nom du fichier et son pré-score. on_wave(items) reçoit les CV lus
+    de chaque vague ; prefetch(vague) peut lancer à l'avance l'extraction de la suivante.
+    """
+    profile = ScreeningProfile(job_description)
+    ordered = []
+    prescores: Dict[str, Tuple[str, int]] = {}
+    for wave in iter_prefetched_waves(sources, wave_size, prefetch):
+        items = []
+        for key, source in wave:
+            item = load(source)
+            if item and item[1]:
+                items.append(item)
+                prescores[key] = (item[0], screen_cv(profile, item[1])['score'])
+                ordered.append((key, source))
+        if items and on_wave:
+            on_wave(items)
+    ordered.sort(key=lambda pair: -prescores[pair[0]][1])
+    return ordered, prescores
+
+class TopKRanking:
+    """Les K meilleurs scores obtenus (tas min) et la décision d'envoyer ou non le CV suivant.
+
+    Les CV doivent être proposés par pré-score décroissant : le premier refusé arrête
+    définitivement l'envoi, aucun des suivants ne pouvant faire mieux.
+    """
+
+    def __init__(self, k: int, prescores: Dict[str, Tuple[str, int]], margin: int = DEFAULT_PRESCORE_MARGIN):
+        self.k = k
+        self.prescores = prescores
+        self.margin = margin
+        self.stopped = False
+        self._heap: List[int] = []
+        self._dispatched = set()
+
+    def add(self, score: int) -> None:
+        """Prend en compte le score d'un CV analysé (ou repris du journal)"""
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, score)
+        elif score > self._heap[0]:
+            heapq.heapreplace(self._heap, score)
+
+    def threshold(self) -> Optional[int]:
+        """Score du K-ième meilleur candidat (None tant que moins de K CV sont analysés)"""
+        return self._heap[0] if len(self._heap) >= self.k else None
+
+    def upper_bound(self, cv_key: str) -> int:
+        """Meilleur score Mistral envisageable pour ce CV : pré-score plus la marge"""
+        return min(100, self.prescores[cv_key][1] + self.margin) if cv_key in self.prescores else 100
+
+    def can_enter(self, cv_key: str) -> bool:
+        """Le CV peut-il encore entrer dans le top K ?"""
+        threshold = self.threshold()
+        return not self.stopped and (threshold is None or self.upper_bound(cv_key) > threshold)
+
+    def should_dispatch(self, cv_key: str) -> bool:
+        """Comme can_enter, mais un refus arrête l'envoi de tous les CV suivants"""
+        if not self.can_enter(cv_key):
+            self.stopped = True
+            return False
+        self._dispatched.add(cv_key)
+        return True
+
+    def skipped(self, sources: Sequence[Tuple[str, T]]) -> List[Tuple[str, T]]:
+        """Couples (empreinte, source) jamais envoyés à l'analyse, dans l'ordre de sources"""
+        return [(key, source) for key, source in sources if key in self.prescores and key not in self._dispatched]
+
+    def not_evaluated(self, cv_keys: Sequence[str]) -> List[Dict]:
+        """CV jamais envoyés à l'analyse parmi cv_keys, avec leur pré-score et leur borne"""
+        return [
+            {'filename': self.prescores[key][0], 'statut': STATUS_NOT_EVALUATED,
+             'score_local': self.prescores[key][1], 'score_max': self.upper_bound(key)}
+            for key in cv_keys if key in self.prescores and key not in self._dispatched
+        ]